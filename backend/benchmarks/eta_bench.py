@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Cost of an order ETA: learning from history on every order versus the
+incrementally refreshed model in eta.py.
+
+Seeds a memory store with finished orders, then times estimates both ways,
+and how long one incremental refresh takes after a batch of new orders.
+
+    cd backend
+    python benchmarks/eta_bench.py
+    python benchmarks/eta_bench.py --history 5000 --estimates 500
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from eta import EtaEstimator, KitchenModel  # noqa: E402
+from settings import Settings  # noqa: E402
+from storage import create_storage  # noqa: E402
+from storage_bench import make_order  # noqa: E402
+
+MENU = [f"item-{n}" for n in range(60)]
+
+
+def finished_order(now: datetime) -> dict:
+    order = make_order(now)
+    created = datetime.fromisoformat(order["created_at"])
+    depth = random.randint(0, 10)
+    cooking = created + timedelta(minutes=1 + 2.5 * depth + random.random())
+    order.update({
+        "items": [{"menu_item_id": item, "quantity": 1, "price": 120.0} for item in random.sample(MENU, 3)],
+        "status": "served",
+        "queue_depth": depth,
+        "cooking_at": cooking.isoformat(),
+        "ready_at": (cooking + timedelta(minutes=random.uniform(8, 25))).isoformat(),
+    })
+    return order
+
+
+async def timed(label: str, count: int, fn):
+    start = time.perf_counter()
+    for _ in range(count):
+        await fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {count / elapsed:>10.0f} ops/s   {elapsed / count * 1000:>8.3f} ms/op")
+
+
+async def bench(history: int, estimates: int):
+    storage = create_storage(Settings(storage_backend="memory"))
+    await storage.connect()
+    now = datetime.now(timezone.utc)
+    # make_order spreads orders over 30 days; keep them all inside the learning window
+    await storage.orders.insert_many([finished_order(now) for _ in range(history)])
+    estimator = EtaEstimator(storage, refresh_interval=3600, history_days=31, max_samples=history)
+    items = random.sample(MENU, 4)
+    print(f"{history} finished orders")
+
+    async def per_request():
+        model = KitchenModel()
+        model.add(await storage.orders.find({"restaurant_id": "default", "ready_at": {"$exists": True}},
+                                            sort=[("ready_at", 1)]))
+        model.fit(estimator.min_samples)
+        model.estimate(items, {}, 5, estimator.kitchen_capacity)
+
+    async def incremental():
+        await estimator.estimate("default", items, {}, 5)
+
+    await timed("learn on every order", max(estimates // 10, 1), per_request)
+    await timed("incremental model", estimates, incremental)
+
+    await storage.orders.insert_many([finished_order(now + timedelta(days=1)) for _ in range(50)])
+    model = await estimator.model("default")
+    start = time.perf_counter()
+    await estimator._refresh("default", model)
+    print(f"  refresh after 50 new orders  {(time.perf_counter() - start) * 1000:>8.1f} ms ({model.samples} kept)")
+    await estimator.close()
+    await storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", type=int, default=2000)
+    parser.add_argument("--estimates", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(bench(args.history, args.estimates))
+
+
+if __name__ == "__main__":
+    main()
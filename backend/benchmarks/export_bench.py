@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Peak memory and throughput of the streaming order export.
+
+The same month-sized and year-sized exports are run through the code behind
+GET /api/export/orders; peak memory should stay flat while the row count grows.
+
+    cd backend
+    python benchmarks/export_bench.py                        # sqlite
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/export_bench.py --backend mongo
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from export import ORDER_COLUMNS, stream_rows  # noqa: E402
+from settings import Settings  # noqa: E402
+from storage import create_storage  # noqa: E402
+from storage_bench import make_order  # noqa: E402
+
+
+async def export(storage, fmt: str, compress: bool, batch_size: int):
+    docs = storage.orders.iterate({"restaurant_id": "default", "created_at": {"$gte": ""}},
+                                  sort=[("created_at", 1)], batch_size=batch_size)
+    size = 0
+    async for chunk in stream_rows(docs, fmt, ORDER_COLUMNS, compress):
+        size += len(chunk)
+    return size
+
+
+async def measure(storage, fmt: str, compress: bool, batch_size: int):
+    start = time.perf_counter()
+    size = await export(storage, fmt, compress, batch_size)
+    elapsed = time.perf_counter() - start
+    # Tracing slows everything down, so the peak comes from a second, untimed run
+    tracemalloc.start()
+    await export(storage, fmt, compress, batch_size)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+
+async def bench(backend: str, sizes, batch_size: int):
+    settings = Settings(
+        storage_backend=backend,
+        mongo_url=os.environ.get('MONGO_URL', 'mongodb://localhost:27017'),
+        db_name=f"tp_export_{uuid.uuid4().hex[:8]}",
+        sqlite_path=os.path.join(tempfile.mkdtemp(), "export.db"),
+    )
+    storage = create_storage(settings)
+    await storage.connect()
+    try:
+        await storage.ensure_indexes()
+        now = datetime.now(timezone.utc)
+        loaded = 0
+        print(f"{backend}: batch size {batch_size}")
+        for count in sorted(sizes):
+            while loaded < count:
+                batch = [make_order(now) for _ in range(min(1000, count - loaded))]
+                await storage.orders.insert_many(batch)
+                loaded += len(batch)
+            for fmt, compress in (("csv", False), ("csv", True), ("ndjson", True)):
+                size, elapsed, peak = await measure(storage, fmt, compress, batch_size)
+                label = fmt + (".gz" if compress else "")
+                print(f"  {count:>7} orders  {label:<10} {size / 1e6:>7.1f} MB out  "
+                      f"{count / elapsed:>8.0f} rows/s  peak {peak / 1e6:>6.2f} MB")
+    finally:
+        if backend == "mongo":
+            await storage.client.drop_database(settings.db_name)
+        await storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="sqlite", choices=["sqlite", "mongo"])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000], help="orders to export")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(bench(args.backend, args.sizes, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
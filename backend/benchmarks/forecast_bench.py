@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Time the nightly demand forecast over a year of orders.
+
+Seeds a store with a year of orders with a daily and weekly rhythm, runs the
+forecast job and reports how long aggregating, computing and writing took.
+
+    cd backend
+    python benchmarks/forecast_bench.py                         # memory + sqlite
+    python benchmarks/forecast_bench.py --orders-per-day 300 --backends sqlite
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/forecast_bench.py --backends mongo
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from forecast import run_forecast  # noqa: E402
+from settings import Settings  # noqa: E402
+from storage import create_storage  # noqa: E402
+from storage_bench import make_order  # noqa: E402
+
+MENU = [f"item-{n}" for n in range(80)]
+# Share of a day's orders per hour, lunch and dinner peaks
+HOURS = [0] * 11 + [4, 10, 12, 8, 3, 2, 3, 6, 11, 13, 10, 5] + [0]
+
+
+def year_of_orders(per_day: int, today: datetime):
+    for day in range(365, 0, -1):
+        start = today - timedelta(days=day)
+        # Busier weekends
+        count = int(per_day * (1.4 if start.weekday() >= 5 else 1.0))
+        for hour in random.choices(range(24), weights=HOURS, k=count):
+            created = start + timedelta(hours=hour, minutes=random.randint(0, 59))
+            order = make_order(today)
+            order.update({
+                "created_at": created.isoformat(),
+                "status": "served",
+                "items": [{"menu_item_id": item, "quantity": random.randint(1, 3), "price": 120.0}
+                          for item in random.sample(MENU, random.randint(1, 4))],
+            })
+            yield order
+
+
+async def bench(backend: str, per_day: int):
+    settings = Settings(
+        storage_backend=backend,
+        mongo_url=os.environ.get('MONGO_URL', 'mongodb://localhost:27017'),
+        db_name=f"tp_bench_{uuid.uuid4().hex[:8]}",
+        sqlite_path=os.path.join(tempfile.mkdtemp(), "bench.db"),
+    )
+    storage = create_storage(settings)
+    await storage.connect()
+    await storage.ensure_indexes()
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    orders = list(year_of_orders(per_day, today))
+    for start in range(0, len(orders), 1000):
+        await storage.orders.insert_many(orders[start:start + 1000])
+    print(f"[{backend}] {len(orders)} orders over 365 days")
+
+    start = time.perf_counter()
+    summary = await run_forecast(storage, "default", history_days=365, tz="UTC", today=today.date())
+    print(f"  grouped rows {summary['count_rows']:>8}   forecasts {summary['forecasts']:>6}")
+    print(f"  aggregate {summary['aggregate_s']:>7.2f} s   compute {summary['compute_s']:>6.2f} s   "
+          f"total {time.perf_counter() - start:>6.2f} s")
+    if backend == "mongo":
+        await storage.client.drop_database(settings.db_name)
+    await storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite"])
+    parser.add_argument("--orders-per-day", type=int, default=150)
+    args = parser.parse_args()
+    for backend in args.backends:
+        asyncio.run(bench(backend, args.orders_per_day))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Stock deduction per order: one update per ingredient versus one bulk write.
+
+Seeds a store with ingredients, then deducts orders the way inventory.py does
+(bulk $inc plus reading the levels back) and, for comparison, with one
+update_one per ingredient, several orders at a time as in a rush.
+
+    cd backend
+    python benchmarks/inventory_bench.py                        # memory + sqlite
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/inventory_bench.py --backends mongo
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from inventory import Inventory  # noqa: E402
+from settings import Settings  # noqa: E402
+from storage import create_storage  # noqa: E402
+
+
+async def timed(label: str, orders: int, concurrency: int, deduct):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await deduct()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(orders)))
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {orders / elapsed:>10.0f} orders/s   {elapsed / orders * 1000:>8.3f} ms/order")
+
+
+async def bench(backend: str, orders: int, concurrency: int):
+    settings = Settings(
+        storage_backend=backend,
+        mongo_url=os.environ.get('MONGO_URL', 'mongodb://localhost:27017'),
+        db_name=f"tp_bench_{uuid.uuid4().hex[:8]}",
+        sqlite_path=os.path.join(tempfile.mkdtemp(), "bench.db"),
+    )
+    storage = create_storage(settings)
+    await storage.connect()
+    await storage.ensure_indexes()
+    ingredients = [{"id": f"ing-{n}", "restaurant_id": "default", "name": f"Ingredient {n}", "quantity": 1e9}
+                   for n in range(120)]
+    await storage.collection("inventory").insert_many(ingredients)
+    menu = [{"id": f"item-{n}", "restaurant_id": "default", "name": f"Dish {n}", "is_available": True,
+             "recipe": [{"ingredient_id": ingredient["id"], "quantity": 50}
+                        for ingredient in random.sample(ingredients, 6)]}
+            for n in range(60)]
+    await storage.menu_items.insert_many(menu)
+    inventory = Inventory(storage)
+
+    def order_items():
+        return [{"menu_item_id": item["id"], "quantity": 2} for item in random.sample(menu, 4)]
+
+    async def per_ingredient():
+        book = await inventory.book("default")
+        for ingredient_id, quantity in book.needed(order_items()).items():
+            await storage.collection("inventory").update_one(
+                {"restaurant_id": "default", "id": ingredient_id}, inc={"quantity": -quantity}
+            )
+
+    async def bulk():
+        await inventory.deduct("default", order_items())
+
+    print(f"[{backend}] {orders} orders of 4 dishes x 6 ingredients, {concurrency} at a time")
+    await timed("update per ingredient", orders, concurrency, per_ingredient)
+    await timed("bulk $inc + read back", orders, concurrency, bulk)
+    await inventory.close()
+    if backend == "mongo":
+        await storage.client.drop_database(settings.db_name)
+    await storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite"])
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    for backend in args.backends:
+        asyncio.run(bench(backend, args.orders, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Invoice rendering on the event loop versus in the process pool.
+
+Renders a day's worth of invoices both ways and reports throughput and the
+worst event loop stall seen by a 1 ms ticker meanwhile, which is what every
+other request on the worker would feel.
+
+    cd backend
+    python benchmarks/invoice_bench.py
+    python benchmarks/invoice_bench.py --orders 2000 --workers 4
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from invoice import InvoiceRenderer, render_invoice  # noqa: E402
+from settings import DEFAULT_TAX_RATES  # noqa: E402
+from storage_bench import make_order  # noqa: E402
+
+
+async def ticker(stalls):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        stalls.append(time.perf_counter() - start - 0.001)
+
+
+async def timed(label, count, work):
+    stalls = []
+    tick = asyncio.create_task(ticker(stalls))
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    await work()
+    elapsed = time.perf_counter() - start
+    # Let the ticker see the stall before it is stopped
+    await asyncio.sleep(0.01)
+    tick.cancel()
+    print(f"  {label:<22} {count / elapsed:>8.0f} invoices/s   worst loop stall {max(stalls) * 1000:>8.1f} ms")
+
+
+async def bench(count: int, workers: int):
+    now = datetime.now(timezone.utc)
+    items = [{"menu_item_id": f"item-{n}", "menu_item_name": f"Dish {n}", "quantity": 2, "price": 180.0}
+             for n in range(8)]
+    orders = [{**make_order(now), "items": items, "status": "served", "payment_status": "paid"}
+              for _ in range(count)]
+    print(f"{count} invoices, {workers} worker processes ({os.cpu_count()} CPUs)")
+
+    async def inline():
+        for order in orders:
+            render_invoice(order, rates=DEFAULT_TAX_RATES)
+
+    renderer = InvoiceRenderer(workers=workers, cache_size=0, rates=DEFAULT_TAX_RATES)
+    # Start the worker processes outside the measurement
+    await renderer.render({**orders[0], "id": "warm-up"})
+
+    async def pooled():
+        await asyncio.gather(*(renderer.render(order) for order in orders))
+
+    async def pooled_batch():
+        await renderer.render_many(orders)
+
+    await timed("on the event loop", count, inline)
+    await timed("pool, one per task", count, pooled)
+    await timed("pool, batched", count, pooled_batch)
+    await renderer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    asyncio.run(bench(args.orders, args.workers))
+
+
+if __name__ == "__main__":
+    main()
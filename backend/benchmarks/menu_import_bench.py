@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Throughput and peak memory of the bulk menu import.
+
+Writes a generated catalogue to a temporary CSV (and JSON) file and imports it
+twice through the code behind POST /api/menu/import: once into an empty menu,
+once more to measure the update path.
+
+    cd backend
+    python benchmarks/menu_import_bench.py --rows 50000
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/menu_import_bench.py --backend mongo
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Importing server builds its app from the environment; this benchmark opens its own storage
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+from menu_import import import_menu, records  # noqa: E402
+from server import MenuItemCreate  # noqa: E402
+from settings import Settings  # noqa: E402
+from storage import create_storage  # noqa: E402
+
+CATEGORIES = ["Starters", "Main Course", "Breads", "Rice", "Desserts", "Beverages"]
+
+
+def write_catalogue(directory: str, rows: int):
+    items = [{
+        "name": f"Dish {i}",
+        "price": round(random.uniform(50, 900), 2),
+        "category": random.choice(CATEGORIES),
+        "description": "Slow cooked, with a \"secret\" spice mix, served hot",
+        "preparation_time": random.randint(5, 40),
+    } for i in range(rows)]
+    csv_path = os.path.join(directory, "menu.csv")
+    with open(csv_path, "w", newline="") as out:
+        writer = csv.DictWriter(out, fieldnames=list(items[0]))
+        writer.writeheader()
+        writer.writerows(items)
+    json_path = os.path.join(directory, "menu.json")
+    with open(json_path, "w") as out:
+        json.dump(items, out)
+    return {"csv": csv_path, "json": json_path}
+
+
+async def chunks_of(path: str, size: int = 64 * 1024):
+    with open(path, "rb") as source:
+        while True:
+            chunk = source.read(size)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def run(storage, path: str, fmt: str, restaurant_id: str, batch_size: int):
+    start = time.perf_counter()
+    report = await import_menu(storage.menu_items, restaurant_id, records(chunks_of(path), fmt),
+                               MenuItemCreate, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    assert report.failed == 0, report.errors[:3]
+    return report, elapsed
+
+
+async def peak_memory(storage, path: str, fmt: str, batch_size: int) -> int:
+    """Peak traced allocations of one more import; kept apart from the timed runs, tracing is slow"""
+    tracemalloc.start()
+    await run(storage, path, fmt, f"bench-{fmt}-traced", batch_size)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+async def bench(backend: str, rows: int, batch_size: int):
+    directory = tempfile.mkdtemp()
+    files = write_catalogue(directory, rows)
+    settings = Settings(
+        storage_backend=backend,
+        mongo_url=os.environ.get('MONGO_URL', 'mongodb://localhost:27017'),
+        db_name=f"tp_import_{uuid.uuid4().hex[:8]}",
+        sqlite_path=os.path.join(directory, "import.db"),
+    )
+    storage = create_storage(settings)
+    await storage.connect()
+    try:
+        await storage.ensure_indexes()
+        size = os.path.getsize(files["csv"]) / 1e6
+        print(f"{backend}: {rows} rows ({size:.1f} MB as CSV), batch size {batch_size}")
+        for fmt, path in files.items():
+            for label in ("insert", "update"):
+                report, elapsed = await run(storage, path, fmt, f"bench-{fmt}", batch_size)
+                print(f"  {fmt:<5} {label:<7} {rows / elapsed:>8.0f} rows/s  {elapsed:>6.2f} s  "
+                      f"inserted {report.inserted}  updated {report.updated}")
+            peak = await peak_memory(storage, path, fmt, batch_size)
+            print(f"  {fmt:<5} peak memory {peak / 1e6:.2f} MB")
+    finally:
+        if backend == "mongo":
+            await storage.client.drop_database(settings.db_name)
+        await storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="sqlite", choices=["memory", "sqlite", "mongo"])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(bench(args.backend, args.rows, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
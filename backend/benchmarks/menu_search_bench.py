@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Lookup latency of the in-memory menu search index.
+
+    cd backend
+    python benchmarks/menu_search_bench.py --items 1000
+"""
+
+import argparse
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from menu_search import MenuIndex  # noqa: E402
+
+BASES = ["Paneer", "Chicken", "Mutton", "Veg", "Egg", "Fish", "Prawn", "Mushroom", "Aloo", "Gobi", "Dal", "Malai"]
+DISHES = ["Tikka", "Biryani", "Masala", "Curry", "Kebab", "Korma", "Fried Rice", "Noodles", "Roll", "Soup",
+          "Pakora", "Butter Masala", "Handi", "Kadai", "Lababdar"]
+STYLES = ["", "Special", "Family Pack", "Half", "Full", "Jain", "Spicy"]
+CATEGORIES = ["Starters", "Main Course", "Rice", "Chinese", "Soups", "Rolls"]
+QUERIES = ["pan", "paneer tik", "chiken", "biryni", "butter masala", "kadai", "mushrom", "family", "roll", "dal mak"]
+
+
+def make_menu(count: int):
+    items = []
+    for _ in range(count):
+        name = " ".join(part for part in (random.choice(BASES), random.choice(DISHES), random.choice(STYLES)) if part)
+        items.append({
+            "id": str(uuid.uuid4()),
+            "name": name,
+            "category": random.choice(CATEGORIES),
+            "description": f"House {name.lower()} cooked to order",
+        })
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    items = make_menu(args.items)
+    index = MenuIndex()
+    start = time.perf_counter()
+    for item in items:
+        index.upsert(item)
+    print(f"indexed {args.items} items in {(time.perf_counter() - start) * 1000:.1f} ms")
+    index.popularity = {item["id"]: random.randint(0, 200) for item in items}
+
+    for query in QUERIES:
+        samples = []
+        for _ in range(args.rounds // len(QUERIES)):
+            start = time.perf_counter()
+            results = index.search(query, 20)
+            samples.append(time.perf_counter() - start)
+        samples.sort()
+        median = samples[len(samples) // 2] * 1e6
+        p99 = samples[int(len(samples) * 0.99)] * 1e6
+        print(f"  {query!r:<18} {len(results):>3} hits   median {median:>7.1f} us   p99 {p99:>7.1f} us")
+
+    start = time.perf_counter()
+    for item in random.sample(items, 100):
+        index.upsert({**item, "name": item["name"] + " Deluxe"})
+    print(f"100 incremental updates in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Order search over years of orders: name prefix, table and date range lookups.
+
+Seeds a store with orders spread over several years and times the queries
+/api/orders/search runs, including fetching a page deep into the results
+with the keyset cursor.
+
+    cd backend
+    python benchmarks/order_search_bench.py                     # sqlite
+    python benchmarks/order_search_bench.py --orders 500000 --years 3
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/order_search_bench.py --backends mongo
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from settings import Settings  # noqa: E402
+from storage import create_storage  # noqa: E402
+from storage_bench import make_order  # noqa: E402
+
+
+async def timed(label: str, count: int, fn):
+    start = time.perf_counter()
+    for _ in range(count):
+        await fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {count / elapsed:>10.0f} ops/s   {elapsed / count * 1000:>8.3f} ms/op")
+
+
+async def bench(backend: str, orders: int, years: int, reads: int):
+    settings = Settings(
+        storage_backend=backend,
+        mongo_url=os.environ.get('MONGO_URL', 'mongodb://localhost:27017'),
+        db_name=f"tp_bench_{uuid.uuid4().hex[:8]}",
+        sqlite_path=os.path.join(tempfile.mkdtemp(), "bench.db"),
+    )
+    storage = create_storage(settings)
+    await storage.connect()
+    await storage.ensure_indexes()
+    now = datetime.now(timezone.utc)
+    batch = []
+    for _ in range(orders):
+        order = make_order(now)
+        created = now - timedelta(minutes=random.randint(0, 60 * 24 * 365 * years))
+        name = f"{random.choice(['Guest', 'guest', 'GUEST'])} {random.randint(1, 5000)}"
+        order.update({"customer_name": name, "customer_name_lc": name.casefold(), "created_at": created.isoformat()})
+        batch.append(order)
+        if len(batch) == 1000:
+            await storage.orders.insert_many(batch)
+            batch = []
+    if batch:
+        await storage.orders.insert_many(batch)
+    print(f"[{backend}] {orders} orders over {years} years")
+
+    newest = [("created_at", -1), ("id", -1)]
+    month_ago = (now - timedelta(days=30)).isoformat()
+
+    async def by_name():
+        # The range the endpoint builds for a prefix such as "guest 12"
+        prefix = f"guest {random.randint(1, 500)}"
+        await storage.orders.find(
+            {"restaurant_id": "default", "customer_name_lc": {"$gte": prefix, "$lt": prefix[:-1] + chr(ord(prefix[-1]) + 1)}},
+            sort=newest, limit=51
+        )
+
+    async def by_table():
+        await storage.orders.find(
+            {"restaurant_id": "default", "table_number": f"T{random.randint(1, 30)}",
+             "created_at": {"$gte": month_ago}}, sort=newest, limit=51
+        )
+
+    async def by_payment():
+        await storage.orders.find({"restaurant_id": "default", "payment_status": "pending"}, sort=newest, limit=51)
+
+    last = (await storage.orders.find({"restaurant_id": "default"}, sort=newest, skip=orders // 2, limit=1))[0]
+
+    async def deep_page():
+        await storage.orders.find(
+            {"restaurant_id": "default", "created_at": {"$lte": last["created_at"]}, "$or": [
+                {"created_at": {"$lt": last["created_at"]}},
+                {"created_at": last["created_at"], "id": {"$lt": last["id"]}},
+            ]}, sort=newest, limit=51
+        )
+
+    await timed("name prefix (any case)", reads, by_name)
+    await timed("table, last 30 days", reads, by_table)
+    await timed("payment status", reads, by_payment)
+    await timed("page halfway down (cursor)", reads, deep_page)
+    if backend == "mongo":
+        await storage.client.drop_database(settings.db_name)
+    await storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["sqlite"])
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--reads", type=int, default=200)
+    args = parser.parse_args()
+    for backend in args.backends:
+        asyncio.run(bench(backend, args.orders, args.years, args.reads))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Throughput and latency of the KOT print pipeline.
+
+KOTs with items from several categories are rendered, routed and spooled to
+fake network printers (scripts/fake_printer.py) the same way the kots.print
+outbox handler does it. Latency is measured from submitting a KOT until every
+printer it routes to has taken its ticket.
+
+    cd backend
+    python benchmarks/print_bench.py
+    python benchmarks/print_bench.py --print-seconds 0.15   # with a simulated print head
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from printing import PrintRouter, PrintService, Spooler, create_printer, failed_printers  # noqa: E402
+from scripts.fake_printer import FakePrinter  # noqa: E402
+
+CATEGORIES = {"Starters": "kitchen", "Main Course": "kitchen", "Tandoor": "tandoor", "Beverages": "bar"}
+DISHES = ["Paneer Tikka", "Dal Makhani", "Butter Naan", "Masala Chai", "Veg Biryani", "Sweet Lassi"]
+
+
+def make_kot(number: int, categories: dict):
+    items = []
+    for menu_item_id in random.sample(list(categories), random.randint(1, 4)):
+        items.append({
+            "menu_item_id": menu_item_id,
+            "menu_item_name": random.choice(DISHES),
+            "quantity": random.randint(1, 3),
+            "price": 150.0,
+            "special_instructions": "less spicy" if random.random() < 0.2 else None,
+        })
+    return {
+        "id": str(uuid.uuid4()),
+        "order_number": f"ORD-{number:04d}",
+        "table_number": f"T{random.randint(1, 30)}",
+        "items": items,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def bench(tickets: int, rate: float, print_seconds: float):
+    fakes = {name: await FakePrinter(print_seconds=print_seconds, quiet=True).start()
+             for name in sorted(set(CATEGORIES.values()))}
+    service = PrintService(
+        Spooler([create_printer(name, fake.url) for name, fake in fakes.items()]),
+        PrintRouter(CATEGORIES, "kitchen"),
+    )
+    service.start()
+    # Menu item id -> category, as the handler looks it up
+    categories = {f"item-{index}": category for index, category in enumerate(CATEGORIES)}
+    latencies = []
+    failures = 0
+
+    async def one(number: int):
+        nonlocal failures
+        kot = make_kot(number, categories)
+        start = time.perf_counter()
+        results = await service.print_kot(kot, categories)
+        latencies.append(time.perf_counter() - start)
+        failures += len(failed_printers(results))
+
+    started = time.perf_counter()
+    pending = []
+    for number in range(1, tickets + 1):
+        pending.append(asyncio.create_task(one(number)))
+        if rate:
+            await asyncio.sleep(1 / rate)
+    await asyncio.gather(*pending)
+    elapsed = time.perf_counter() - started
+    await service.close()
+    for fake in fakes.values():
+        await fake.close()
+
+    jobs = sum(len(fake.jobs) for fake in fakes.values())
+    print(f"{tickets} KOTs -> {jobs} printer tickets on {len(fakes)} printers"
+          f" (print head {print_seconds * 1000:.0f} ms, {'burst' if not rate else f'{rate:.0f} KOT/s'})")
+    print(f"  {tickets / elapsed * 60:>8.0f} KOTs/min   {jobs / elapsed * 60:>8.0f} tickets/min")
+    print(f"  latency p50 {statistics.median(latencies) * 1000:.1f} ms   "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms   failed {failures}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=1000, help="KOTs to print")
+    parser.add_argument("--rate", type=float, default=0, help="KOTs per second (default: all at once)")
+    parser.add_argument("--print-seconds", type=float, default=0.0, help="simulated time to print one ticket")
+    args = parser.parse_args()
+    asyncio.run(bench(args.tickets, args.rate, args.print_seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Best-fit table search latency, the query the booking form runs on every keystroke.
+
+    cd backend
+    python benchmarks/reservation_bench.py --tables 200 --bookings 20000
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from reservations import ReservationBook, ReservationConflict  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tables", type=int, default=200)
+    parser.add_argument("--bookings", type=int, default=20000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--rounds", type=int, default=5000)
+    args = parser.parse_args()
+
+    tables = [{"id": f"t{i}", "table_number": f"T{i}", "capacity": random.choice([2, 2, 4, 4, 4, 6, 8])}
+              for i in range(args.tables)]
+    book = ReservationBook(tables)
+    day0 = datetime(2030, 1, 1, 17, tzinfo=timezone.utc)
+    slot = timedelta(minutes=15)
+
+    def random_window():
+        start = day0 + timedelta(days=random.randrange(args.days)) + slot * random.randrange(20)
+        return start, start + slot * random.choice([4, 6, 8])
+
+    placed = 0
+    start_time = time.perf_counter()
+    for i in range(args.bookings):
+        table = random.choice(tables)
+        start, end = random_window()
+        try:
+            book.book({"id": f"r{i}", "table_id": table["id"]}, (start, end))
+            placed += 1
+        except ReservationConflict:
+            pass
+    print(f"placed {placed} of {args.bookings} bookings on {args.tables} tables "
+          f"in {(time.perf_counter() - start_time) * 1000:.1f} ms")
+
+    samples = []
+    for _ in range(args.rounds):
+        start, end = random_window()
+        party = random.choice([1, 2, 3, 4, 5, 6])
+        began = time.perf_counter()
+        book.best_fit(party, start, end)
+        samples.append(time.perf_counter() - began)
+    samples.sort()
+    print(f"best fit: median {samples[len(samples) // 2] * 1e6:.1f} us, "
+          f"p99 {samples[int(len(samples) * 0.99)] * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Compare the storage backends on the queries the POS runs most.
+
+    cd backend
+    python benchmarks/storage_bench.py                      # memory + sqlite
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/storage_bench.py --backends memory sqlite mongo
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from settings import Settings  # noqa: E402
+from storage import create_storage  # noqa: E402
+
+STATUSES = ["pending", "cooking", "ready", "served", "cancelled"]
+
+
+def make_order(now: datetime) -> dict:
+    created = now - timedelta(minutes=random.randint(0, 60 * 24 * 30))
+    return {
+        "id": str(uuid.uuid4()),
+        "restaurant_id": "default",
+        "customer_name": f"Guest {random.randint(1, 500)}",
+        "table_number": f"T{random.randint(1, 30)}",
+        "items": [{"menu_item_id": str(uuid.uuid4()), "menu_item_name": "Item", "quantity": 1, "price": 120.0}],
+        "total_amount": float(random.randint(100, 2000)),
+        "status": random.choice(STATUSES),
+        "payment_status": random.choice(["pending", "paid"]),
+        "created_at": created.isoformat(),
+        "updated_at": created.isoformat(),
+        "kot_generated": False,
+    }
+
+
+async def timed(label: str, count: int, fn):
+    start = time.perf_counter()
+    for _ in range(count):
+        await fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {count / elapsed:>10.0f} ops/s   {elapsed / count * 1000:>8.3f} ms/op")
+
+
+async def bench(backend: str, orders: int, reads: int):
+    settings = Settings(
+        storage_backend=backend,
+        mongo_url=os.environ.get('MONGO_URL', 'mongodb://localhost:27017'),
+        db_name=f"tp_bench_{uuid.uuid4().hex[:8]}",
+        sqlite_path=os.path.join(tempfile.mkdtemp(), "bench.db"),
+    )
+    storage = create_storage(settings)
+    await storage.connect()
+    try:
+        await storage.ensure_indexes()
+        now = datetime.now(timezone.utc)
+        docs = [make_order(now) for _ in range(orders)]
+        print(f"{backend} ({orders} orders)")
+
+        batch = iter(docs)
+        await timed("insert order", orders, lambda: storage.orders.insert_one(next(batch)))
+        ids = [doc["id"] for doc in docs]
+        await timed("get order by id", reads, lambda: storage.orders.find_one(
+            {"restaurant_id": "default", "id": random.choice(ids)}))
+        await timed("list pending (latest 50)", reads // 10, lambda: storage.orders.find(
+            {"restaurant_id": "default", "status": "pending"}, sort=[("created_at", -1)], limit=50))
+        await timed("count by status", reads, lambda: storage.orders.count(
+            {"restaurant_id": "default", "status": random.choice(STATUSES)}))
+        day_start = now.replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
+        await timed("today's revenue", reads // 10, lambda: storage.orders.sum(
+            "total_amount", {"restaurant_id": "default", "created_at": {"$gte": day_start}, "payment_status": "paid"}))
+        await timed("update order status", reads, lambda: storage.orders.update_one(
+            {"restaurant_id": "default", "id": random.choice(ids)}, set={"status": random.choice(STATUSES)}))
+    finally:
+        if backend == "mongo":
+            await storage.client.drop_database(settings.db_name)
+        await storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite"], choices=["memory", "sqlite", "mongo"])
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--reads", type=int, default=2000)
+    args = parser.parse_args()
+    for backend in args.backends:
+        asyncio.run(bench(backend, args.orders, args.reads))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Walk-in table allocation latency on a large floor.
+
+    cd backend
+    python benchmarks/table_allocator_bench.py --tables 200 --occupied 0.7
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from table_allocator import FloorLayout  # noqa: E402
+
+
+def make_floor(count: int, occupied: float):
+    width = max(1, int(count ** 0.5 * 1.4))
+    return [{
+        "id": f"t{i}",
+        "table_number": f"T{i + 1}",
+        "capacity": random.choice([2, 2, 4, 4, 4, 6]),
+        "status": "occupied" if random.random() < occupied else "available",
+        "position_x": i % width,
+        "position_y": i // width,
+    } for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tables", type=int, default=200)
+    parser.add_argument("--occupied", type=float, default=0.7, help="share of tables already taken")
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    layout = FloorLayout(make_floor(args.tables, args.occupied))
+    # A booked table is skipped; pretend one in ten is booked soon
+    booked = {f"t{i}" for i in range(0, args.tables, 10)}
+
+    def not_booked(table):
+        return table["id"] not in booked
+
+    for party in (2, 4, 6, 8, 10, 14):
+        samples = []
+        result = None
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            result = layout.allocate(party, not_booked, max_join=3)
+            samples.append(time.perf_counter() - start)
+        samples.sort()
+        seated = ", ".join(table["table_number"] for table in result) if result else "no fit"
+        print(f"  party of {party:<3} median {samples[len(samples) // 2] * 1e6:>7.1f} us   "
+              f"p99 {samples[int(len(samples) * 0.99)] * 1e6:>7.1f} us   -> {seated}")
+
+
+if __name__ == "__main__":
+    main()
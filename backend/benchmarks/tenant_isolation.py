@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Check that a busy restaurant does not slow down its neighbours.
+
+Restaurant "b" stays small while restaurant "a" is loaded with a large order
+history; b's dashboard queries should cost the same before and after, since
+every index is prefixed with restaurant_id.
+
+    cd backend
+    python benchmarks/tenant_isolation.py                   # memory + sqlite
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/tenant_isolation.py --backends sqlite mongo
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from settings import Settings  # noqa: E402
+from storage import create_storage  # noqa: E402
+from storage_bench import STATUSES, make_order  # noqa: E402
+
+
+async def dashboard(storage, restaurant_id: str, day_start: str) -> None:
+    """The queries behind GET /api/dashboard"""
+    await storage.orders.count({"restaurant_id": restaurant_id, "created_at": {"$gte": day_start}})
+    await storage.orders.sum("total_amount", {
+        "restaurant_id": restaurant_id, "created_at": {"$gte": day_start}, "payment_status": "paid"
+    })
+    for status in ("pending", "cooking", "ready"):
+        await storage.orders.count({"restaurant_id": restaurant_id, "status": status})
+    await storage.orders.count({"restaurant_id": restaurant_id, "payment_status": "pending"})
+
+
+async def measure(storage, restaurant_id: str, day_start: str, rounds: int) -> float:
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await dashboard(storage, restaurant_id, day_start)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000
+
+
+async def load(storage, restaurant_id: str, count: int, now: datetime, batch: int = 1000) -> None:
+    for offset in range(0, count, batch):
+        docs = []
+        for _ in range(min(batch, count - offset)):
+            doc = make_order(now)
+            doc["restaurant_id"] = restaurant_id
+            docs.append(doc)
+        await storage.orders.insert_many(docs)
+
+
+async def bench(backend: str, small: int, large: int, rounds: int):
+    settings = Settings(
+        storage_backend=backend,
+        mongo_url=os.environ.get('MONGO_URL', 'mongodb://localhost:27017'),
+        db_name=f"tp_tenants_{uuid.uuid4().hex[:8]}",
+        sqlite_path=os.path.join(tempfile.mkdtemp(), "tenants.db"),
+    )
+    storage = create_storage(settings)
+    await storage.connect()
+    try:
+        await storage.ensure_indexes()
+        now = datetime.now(timezone.utc)
+        day_start = now.replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
+        await load(storage, "b", small, now)
+
+        before = await measure(storage, "b", day_start, rounds)
+        await load(storage, "a", large, now)
+        after = await measure(storage, "b", day_start, rounds)
+        busy = await measure(storage, "a", day_start, max(1, rounds // 10))
+
+        print(f"{backend}: restaurant b has {small} orders, restaurant a {large}")
+        print(f"  b dashboard before a's load  {before:>8.3f} ms (median)")
+        print(f"  b dashboard after a's load   {after:>8.3f} ms (median)  x{after / before:.2f}")
+        print(f"  a dashboard                  {busy:>8.3f} ms (median)")
+        # Sanity check that the partitions really are separate
+        assert await storage.orders.count({"restaurant_id": "b", "status": {"$in": STATUSES}}) == small
+    finally:
+        if backend == "mongo":
+            await storage.client.drop_database(settings.db_name)
+        await storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite"], choices=["memory", "sqlite", "mongo"])
+    parser.add_argument("--small", type=int, default=500, help="orders in the quiet restaurant")
+    parser.add_argument("--large", type=int, default=50000, help="orders in the busy restaurant")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+    for backend in args.backends:
+        asyncio.run(bench(backend, args.small, args.large, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
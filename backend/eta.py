@@ -0,0 +1,241 @@
+"""
+Load-aware estimates of when an order will be ready.
+
+Every finished order is an observation: how long it waited before the kitchen
+started on it (``created_at`` to ``cooking_at``), how long it cooked
+(``cooking_at`` to ``ready_at``), what was in it, and how many orders were open
+when it came in (``queue_depth``). From a window of recent observations the
+model learns, with NumPy:
+
+* a cooking time per menu item, the median over the orders it held up, and
+* the queue wait as a straight line in the queue depth.
+
+A new order's estimate is the longest cooking time among its items plus the
+wait for the current queue depth. Items without enough history fall back to
+their menu ``preparation_time``, and the wait to the queue depth spread over
+``kitchen_capacity`` parallel orders.
+
+The model is kept per restaurant in each worker. Refreshes only fetch orders
+finished since the last one, and happen in the background at most every
+``refresh_interval`` seconds, so an estimate never waits on them.
+"""
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# Observations of an item needed before its own median replaces the menu preparation time
+MIN_ITEM_SAMPLES = 3
+# Passes crediting each order to its slowest item, see KitchenModel.fit
+ATTRIBUTION_ROUNDS = 3
+
+
+def _epoch_minutes(value: Optional[str]) -> float:
+    if not value:
+        return np.nan
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp() / 60
+
+
+def _medians(groups: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+    """Median of the values of each group 0..size-1, NaN for groups with too few of them"""
+    result = np.full(size, np.nan)
+    order = np.argsort(groups, kind="stable")
+    groups, values = groups[order], values[order]
+    ids, starts, counts = np.unique(groups, return_index=True, return_counts=True)
+    for group, start, count in zip(ids, starts, counts):
+        if count >= MIN_ITEM_SAMPLES:
+            result[group] = np.median(values[start:start + count])
+    return result
+
+
+class KitchenModel:
+    """Recent observations of one restaurant and what was learned from them"""
+
+    def __init__(self):
+        # (ready_at, id) of the last order added; refreshes carry on after it
+        self.watermark: Optional[Tuple[str, str]] = None
+        # One entry per observed order, all in minutes
+        self.ready = np.empty(0)
+        self.wait = np.empty(0)
+        self.cook = np.empty(0)
+        self.depth = np.empty(0)
+        self.items: List[Tuple[str, ...]] = []
+        # Learned
+        self.item_minutes: Dict[str, float] = {}
+        self.wait_line: Optional[Tuple[float, float]] = None
+        self.refreshed_at = 0.0
+
+    @property
+    def samples(self) -> int:
+        return len(self.ready)
+
+    def add(self, orders: List[Dict[str, Any]]) -> None:
+        if not orders:
+            return
+        created = np.array([_epoch_minutes(order.get("created_at")) for order in orders])
+        cooking = np.array([_epoch_minutes(order.get("cooking_at")) for order in orders])
+        ready = np.array([_epoch_minutes(order.get("ready_at")) for order in orders])
+        depth = np.array([order.get("queue_depth", np.nan) for order in orders], dtype=float)
+        self.ready = np.concatenate([self.ready, ready])
+        # Orders that skipped "cooking" only tell the total, which is counted as cooking time
+        self.wait = np.concatenate([self.wait, cooking - created])
+        self.cook = np.concatenate([self.cook, np.where(np.isnan(cooking), ready - created, ready - cooking)])
+        self.depth = np.concatenate([self.depth, depth])
+        self.items += [tuple({item["menu_item_id"] for item in order.get("items", [])}) for order in orders]
+        self.watermark = (orders[-1]["ready_at"], orders[-1]["id"])
+
+    def trim(self, since: float, max_samples: int) -> None:
+        keep = np.flatnonzero(self.ready >= since)[-max_samples:]
+        if len(keep) == len(self.ready):
+            return
+        self.ready, self.wait, self.cook, self.depth = (
+            values[keep] for values in (self.ready, self.wait, self.cook, self.depth)
+        )
+        self.items = [self.items[index] for index in keep]
+
+    def fit(self, min_samples: int) -> None:
+        # Cooking time per item. An order is done when its slowest item is, so an item's
+        # median over every order it was part of overstates quick items ordered with slow
+        # ones; instead each order is credited to its slowest item by the current
+        # estimates, and those are re-taken from the orders credited to them
+        counts = np.array([len(items) for items in self.items], dtype=int)
+        codes: Dict[str, int] = {}
+        flat = np.array([codes.setdefault(item, len(codes)) for items in self.items for item in items], dtype=int)
+        rows = np.repeat(np.arange(len(self.items)), counts)
+        keep = (self.cook >= 0)[rows]
+        flat, rows = flat[keep], rows[keep]
+        cook = self.cook[rows]
+        item_cook = _medians(flat, cook, len(codes))
+        if len(rows):
+            _, row_starts, row_of = np.unique(rows, return_index=True, return_inverse=True)
+            for _ in range(ATTRIBUTION_ROUNDS):
+                estimates = np.where(np.isnan(item_cook[flat]), -np.inf, item_cook[flat])
+                slowest = np.maximum.reduceat(estimates, row_starts)[row_of]
+                credited = np.isfinite(estimates) & (estimates == slowest)
+                refit = _medians(flat[credited], cook[credited], len(codes))
+                item_cook = np.where(np.isnan(refit), item_cook, refit)
+        self.item_minutes = {item: float(item_cook[code]) for item, code in codes.items()
+                             if not np.isnan(item_cook[code])}
+
+        # Queue wait against queue depth, by least squares
+        valid = ~np.isnan(self.wait) & ~np.isnan(self.depth) & (self.wait >= 0)
+        # A line needs two distinct depths, whatever min_samples is
+        if valid.sum() >= max(min_samples, 2) and np.ptp(self.depth[valid]) > 0:
+            slope, intercept = np.polyfit(self.depth[valid], self.wait[valid], 1)
+            self.wait_line = (float(intercept), float(slope))
+        else:
+            self.wait_line = None
+
+    def estimate(self, item_ids: List[str], prep_minutes: Dict[str, float], queue_depth: int,
+                 kitchen_capacity: int) -> float:
+        cook = max((self.item_minutes.get(item, prep_minutes.get(item, 15)) for item in item_ids), default=15)
+        if self.wait_line is not None:
+            intercept, slope = self.wait_line
+            wait = intercept + slope * queue_depth
+        else:
+            wait = queue_depth / kitchen_capacity * cook
+        return cook + max(wait, 0.0)
+
+
+class EtaEstimator:
+    """Per-restaurant kitchen models for one worker process"""
+
+    def __init__(self, storage: Storage, refresh_interval: float = 60.0, history_days: int = 14,
+                 max_samples: int = 5000, min_samples: int = 20, kitchen_capacity: int = 4,
+                 cold_start_minutes: float = 30.0):
+        self.storage = storage
+        self.refresh_interval = refresh_interval
+        self.history_days = history_days
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+        self.kitchen_capacity = kitchen_capacity
+        self.cold_start_minutes = cold_start_minutes
+        self._models: Dict[str, KitchenModel] = {}
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    async def _refresh(self, restaurant_id: str, model: KitchenModel) -> None:
+        since = datetime.now(timezone.utc) - timedelta(days=self.history_days)
+        # Only what finished since the last refresh, a page at a time; ready_at alone is not
+        # unique, so pages are keyed on (ready_at, id) like the order search
+        while True:
+            filters: Dict[str, Any] = {"restaurant_id": restaurant_id}
+            if model.watermark is None or model.watermark[0] < since.isoformat():
+                filters["ready_at"] = {"$gt": since.isoformat()}
+            else:
+                ready_at, order_id = model.watermark
+                filters["ready_at"] = {"$gte": ready_at}
+                filters["$or"] = [{"ready_at": {"$gt": ready_at}}, {"ready_at": ready_at, "id": {"$gt": order_id}}]
+            orders = await self.storage.orders.find(filters, sort=[("ready_at", 1), ("id", 1)],
+                                                    limit=self.max_samples)
+            model.add(orders)
+            if len(orders) < self.max_samples:
+                break
+        model.trim(since.timestamp() / 60, self.max_samples)
+        model.fit(self.min_samples)
+        model.refreshed_at = time.monotonic()
+
+    async def _background_refresh(self, restaurant_id: str, model: KitchenModel) -> None:
+        try:
+            async with self._locks[restaurant_id]:
+                await self._refresh(restaurant_id, model)
+        except Exception:
+            logger.exception("ETA model refresh failed for restaurant %s", restaurant_id)
+        finally:
+            self._refreshing.pop(restaurant_id, None)
+
+    async def model(self, restaurant_id: str) -> KitchenModel:
+        model = self._models.get(restaurant_id)
+        if model is None:
+            async with self._locks[restaurant_id]:
+                model = self._models.get(restaurant_id)
+                if model is None:
+                    model = KitchenModel()
+                    await self._refresh(restaurant_id, model)
+                    self._models[restaurant_id] = model
+        elif (time.monotonic() - model.refreshed_at > self.refresh_interval
+              and restaurant_id not in self._refreshing):
+            self._refreshing[restaurant_id] = asyncio.create_task(self._background_refresh(restaurant_id, model))
+        return model
+
+    async def estimate(self, restaurant_id: str, item_ids: List[str], prep_minutes: Dict[str, float],
+                       queue_depth: int) -> float:
+        """Minutes until an order with these items is ready, given the orders already open"""
+        model = await self.model(restaurant_id)
+        minutes = model.estimate(item_ids, prep_minutes, queue_depth, self.kitchen_capacity)
+        if model.samples < self.min_samples:
+            # Too little history to go by yet, keep to the fixed minimum estimates started from
+            minutes = max(minutes, self.cold_start_minutes)
+        return minutes
+
+    async def summary(self, restaurant_id: str) -> Dict[str, Any]:
+        model = await self.model(restaurant_id)
+        return {
+            "samples": model.samples,
+            "item_minutes": {item: round(minutes, 1) for item, minutes in model.item_minutes.items()},
+            "wait_minutes": (
+                {"base": round(model.wait_line[0], 2), "per_open_order": round(model.wait_line[1], 2)}
+                if model.wait_line else None
+            ),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "restaurants": len(self._models),
+            "samples": sum(model.samples for model in self._models.values()),
+            "refreshing": len(self._refreshing),
+        }
+
+    async def close(self) -> None:
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        await asyncio.gather(*self._refreshing.values(), return_exceptions=True)
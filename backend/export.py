@@ -0,0 +1,117 @@
+"""
+Streaming exports of orders and KOTs.
+
+Rows are read from a database cursor in batches and encoded as they arrive, so
+an export holds one batch and one output chunk in memory however many months
+it covers. CSV has one row per order (or KOT) with its items folded into a
+single column; NDJSON has the full document on every line. Either can be
+gzipped on the fly.
+"""
+
+import csv
+import io
+import json
+import zlib
+from typing import Any, AsyncIterator, Dict, List
+
+FORMATS = {
+    # format -> (media type, file extension)
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+ORDER_COLUMNS = [
+    "id", "created_at", "updated_at", "customer_name", "table_number", "party_size", "status",
+    "payment_status", "payment_method", "total_amount", "item_count", "items",
+]
+KOT_COLUMNS = ["id", "created_at", "order_id", "order_number", "table_number", "status", "item_count", "items"]
+# Encoded bytes collected before a chunk is handed to the response
+CHUNK_SIZE = 64 * 1024
+
+
+def items_summary(items: List[Dict[str, Any]]) -> str:
+    """"2x Paneer Tikka; 1x Butter Naan (extra butter)" """
+    parts = []
+    for item in items:
+        part = f"{item.get('quantity', 1)}x {item.get('menu_item_name', '')}"
+        if item.get("special_instructions"):
+            part += f" ({item['special_instructions']})"
+        parts.append(part)
+    return "; ".join(parts)
+
+
+def flatten(doc: Dict[str, Any], columns: List[str]) -> List[Any]:
+    items = doc.get("items", [])
+    row = []
+    for column in columns:
+        if column == "items":
+            row.append(items_summary(items))
+        elif column == "item_count":
+            row.append(sum(item.get("quantity", 1) for item in items))
+        else:
+            value = doc.get(column)
+            row.append("" if value is None else value)
+    return row
+
+
+def export_media_type(fmt: str, compress: bool) -> str:
+    return "application/gzip" if compress else FORMATS[fmt][0]
+
+
+def export_filename(name: str, fmt: str, compress: bool) -> str:
+    return f"{name}.{FORMATS[fmt][1]}" + (".gz" if compress else "")
+
+
+class _Encoder:
+    """Turns documents into output bytes, gzipped when asked"""
+
+    def __init__(self, fmt: str, columns: List[str], compress: bool):
+        self.fmt = fmt
+        self.columns = columns
+        self._text = io.StringIO()
+        self._csv = csv.writer(self._text, lineterminator="\n")
+        # wbits 31 writes a gzip header and trailer rather than a bare zlib stream
+        self._gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def header(self) -> None:
+        if self.fmt == "csv":
+            self._csv.writerow(self.columns)
+
+    def write(self, doc: Dict[str, Any]) -> None:
+        if self.fmt == "csv":
+            self._csv.writerow(flatten(doc, self.columns))
+        else:
+            doc.pop("_id", None)
+            self._text.write(json.dumps(doc, default=str, separators=(",", ":")))
+            self._text.write("\n")
+
+    def pending(self) -> int:
+        return self._text.tell()
+
+    def take(self, final: bool = False) -> bytes:
+        data = self._text.getvalue().encode("utf-8")
+        self._text.seek(0)
+        self._text.truncate()
+        if self._gzip is None:
+            return data
+        out = self._gzip.compress(data)
+        if final:
+            out += self._gzip.flush()
+        return out
+
+
+async def stream_rows(docs: AsyncIterator[Dict[str, Any]], fmt: str, columns: List[str],
+                      compress: bool = False) -> AsyncIterator[bytes]:
+    """Encode documents as they come off the cursor, yielding chunks of about CHUNK_SIZE"""
+    encoder = _Encoder(fmt, columns, compress)
+    encoder.header()
+    async for doc in docs:
+        encoder.write(doc)
+        if encoder.pending() >= CHUNK_SIZE:
+            chunk = encoder.take()
+            # The compressor holds on to small inputs until it has a full block
+            if chunk:
+                yield chunk
+    chunk = encoder.take(final=True)
+    if chunk:
+        yield chunk
+
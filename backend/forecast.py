@@ -0,0 +1,158 @@
+"""
+Demand forecasts per menu item, weekday and hour.
+
+A nightly batch job (``scripts/forecast_demand.py``) asks the database for the
+quantity of every item sold per local day and hour over the last year, already
+grouped, so raw orders never leave the database. Those counts are laid out as
+an item x day x hour array, and for every weekday the forecast is the
+exponentially weighted mean of that weekday's history, recent weeks counting
+most. Days before an item was first sold do not count as zero demand.
+
+Besides the ``expected`` quantity each forecast has an ``upper`` one, the mean
+plus 1.28 standard deviations (about the 90th percentile), which is what a prep
+list should cover. Forecasts replace the previous run's in the ``forecasts``
+collection.
+"""
+
+import logging
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# Standard deviations above the mean covering about 90% of days
+UPPER_Z = 1.2816
+# Forecasts upserted per database round trip
+WRITE_BATCH = 500
+
+
+async def hourly_demand(storage: Storage, restaurant_id: str, start: datetime, end: datetime,
+                        tz: str) -> pd.DataFrame:
+    """Quantity sold per menu item, local day and hour between ``start`` and ``end``"""
+    rows = [
+        row async for row in storage.orders.hourly_item_quantities(
+            {
+                "restaurant_id": restaurant_id,
+                "created_at": {"$gte": start.isoformat(), "$lt": end.isoformat()},
+                "status": {"$ne": "cancelled"},
+            },
+            tz=tz,
+        )
+    ]
+    return pd.DataFrame(rows, columns=["menu_item_id", "day", "hour", "quantity"])
+
+
+def demand_cube(counts: pd.DataFrame, first_day: date, days: int) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """(item ids, item x day x hour quantities, index of each item's first day with a sale)"""
+    day_index = (pd.to_datetime(counts["day"]) - pd.Timestamp(first_day)).dt.days.to_numpy()
+    in_range = (day_index >= 0) & (day_index < days)
+    counts, day_index = counts[in_range], day_index[in_range]
+    codes, items = pd.factorize(counts["menu_item_id"])
+    cube = np.zeros((len(items), days, 24))
+    np.add.at(cube, (codes, day_index, counts["hour"].to_numpy(dtype=int)), counts["quantity"].to_numpy(dtype=float))
+    first_sale = np.full(len(items), days)
+    np.minimum.at(first_sale, codes, day_index)
+    return list(items), cube, first_sale
+
+
+def forecast_cube(cube: np.ndarray, first_sale: np.ndarray, first_day: date,
+                  half_life_weeks: float) -> Dict[str, np.ndarray]:
+    """Weighted mean and spread per item, weekday (Monday is 0) and hour
+
+    Returns arrays of shape item x 7 x 24: ``expected``, ``upper`` and ``weeks``,
+    the number of days each forecast is based on.
+    """
+    items, days, _ = cube.shape
+    weekday = (first_day.weekday() + np.arange(days)) % 7
+    age_weeks = (days - 1 - np.arange(days)) / 7
+    weights = 0.5 ** (age_weeks / half_life_weeks)
+    # item x day: the weight of each day's observation, zero before the item was on sale
+    observed = np.arange(days)[None, :] >= first_sale[:, None]
+    expected = np.zeros((items, 7, 24))
+    upper = np.zeros((items, 7, 24))
+    weeks = np.zeros((items, 7), dtype=int)
+    for day in range(7):
+        selected = weekday == day
+        w = (weights[selected][None, :] * observed[:, selected])[:, :, None]
+        total = w.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = (cube[:, selected, :] * w).sum(axis=1) / total
+            variance = (w * (cube[:, selected, :] - mean[:, None, :]) ** 2).sum(axis=1) / total
+        expected[:, day, :] = np.nan_to_num(mean)
+        upper[:, day, :] = np.nan_to_num(mean + UPPER_Z * np.sqrt(variance))
+        weeks[:, day] = observed[:, selected].sum(axis=1)
+    return {"expected": expected, "upper": upper, "weeks": weeks}
+
+
+def forecast_documents(restaurant_id: str, items: List[str], forecast: Dict[str, np.ndarray],
+                       names: Dict[str, str], generated_at: str, run_id: str) -> List[Dict[str, Any]]:
+    """One document per item, weekday and hour with any expected demand"""
+    item_index, weekday, hour = np.nonzero(forecast["expected"] >= 0.005)
+    return [
+        {
+            "restaurant_id": restaurant_id,
+            "menu_item_id": items[i],
+            "menu_item_name": names.get(items[i], ""),
+            "weekday": int(d),
+            "hour": int(h),
+            "expected": round(float(forecast["expected"][i, d, h]), 2),
+            "upper": round(float(forecast["upper"][i, d, h]), 2),
+            "weeks": int(forecast["weeks"][i, d]),
+            "generated_at": generated_at,
+            "run_id": run_id,
+        }
+        for i, d, h in zip(item_index.tolist(), weekday.tolist(), hour.tolist())
+    ]
+
+
+async def run_forecast(storage: Storage, restaurant_id: str, history_days: int = 365, tz: str = "UTC",
+                       half_life_weeks: float = 8.0, today: Optional[date] = None) -> Dict[str, Any]:
+    """Forecast a restaurant's demand from the days before ``today`` and store it"""
+    started = time.perf_counter()
+    zone = ZoneInfo(tz)
+    today = today or datetime.now(zone).date()
+    first_day = today - timedelta(days=history_days)
+    start = datetime.combine(first_day, datetime.min.time(), zone).astimezone(timezone.utc)
+    end = datetime.combine(today, datetime.min.time(), zone).astimezone(timezone.utc)
+
+    counts = await hourly_demand(storage, restaurant_id, start, end, tz)
+    aggregated = time.perf_counter()
+    items, cube, first_sale = demand_cube(counts, first_day, history_days)
+    forecast = forecast_cube(cube, first_sale, first_day, half_life_weeks)
+    menu = await storage.menu_items.find({"restaurant_id": restaurant_id, "id": {"$in": items}})
+    run_id = str(uuid.uuid4())
+    docs = forecast_documents(restaurant_id, items, forecast, {m["id"]: m.get("name", "") for m in menu},
+                              datetime.now(timezone.utc).isoformat(), run_id)
+    computed = time.perf_counter()
+
+    for batch_start in range(0, len(docs), WRITE_BATCH):
+        await storage.collection("forecasts").bulk_upsert([
+            ({key: doc[key] for key in ("restaurant_id", "weekday", "hour", "menu_item_id")}, doc, {})
+            for doc in docs[batch_start:batch_start + WRITE_BATCH]
+        ])
+    # Hours that no longer see any demand
+    removed = await storage.collection("forecasts").delete_many(
+        {"restaurant_id": restaurant_id, "run_id": {"$ne": run_id}}
+    )
+    summary = {
+        "restaurant_id": restaurant_id,
+        "from": first_day.isoformat(),
+        "to": (today - timedelta(days=1)).isoformat(),
+        "count_rows": len(counts),
+        "items": len(items),
+        "forecasts": len(docs),
+        "removed": removed,
+        "aggregate_s": round(aggregated - started, 3),
+        "compute_s": round(computed - aggregated, 3),
+        "total_s": round(time.perf_counter() - started, 3),
+    }
+    logger.info("Demand forecast for %s: %s", restaurant_id, summary)
+    return summary
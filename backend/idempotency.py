@@ -0,0 +1,165 @@
+"""
+Idempotency-Key support for write endpoints.
+
+A client that retries a POST with the same ``Idempotency-Key`` header gets the
+response of the first attempt instead of creating a second order or KOT. Keys
+are reserved with a unique index before the handler runs, so two concurrent
+retries cannot both go through, and the stored responses expire through a TTL
+index on ``created_at``. Keys are scoped per restaurant, so two restaurants
+cannot collide on the same key.
+
+A reserved key holds a short lease (``lease_until``). Should the worker die
+before storing the response, a retry after the lease takes the key over rather
+than being told the request is still being processed until the key expires.
+"""
+
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+from storage import ASCENDING, DuplicateKeyError, Repository, StorageUnavailableError
+
+logger = logging.getLogger(__name__)
+
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+
+
+def fingerprint(payload: Any) -> str:
+    """Stable hash of a request body, used to reject keys reused for other requests"""
+    encoded = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self, repository: Repository, ttl_seconds: int = 24 * 3600, local_cache_size: int = 1024,
+                 is_online: Callable[[], bool] = lambda: True, lease_seconds: int = 60):
+        self.repository = repository
+        self.ttl_seconds = ttl_seconds
+        # How long a reserved key stays with the request that reserved it
+        self.lease_seconds = lease_seconds
+        # Lets the write journal tell us the database is known to be down
+        self.is_online = is_online
+        # Recently completed responses, answers retries even while the database is down
+        self._recent: "OrderedDict[Tuple[str, str, str], Dict[str, Any]]" = OrderedDict()
+        self._local_cache_size = local_cache_size
+
+    async def ensure_indexes(self) -> None:
+        await self.repository.create_index(
+            [("restaurant_id", ASCENDING), ("scope", ASCENDING), ("key", ASCENDING)], unique=True
+        )
+        # Mongo drops expired keys on its own; embedded backends expire them lazily in reserve()
+        await self.repository.create_index([("created_at", ASCENDING)], expireAfterSeconds=self.ttl_seconds)
+
+    def _remember(self, ident: Dict[str, str], request_hash: str, response: Any) -> None:
+        cache_key = (ident["restaurant_id"], ident["scope"], ident["key"])
+        self._recent[cache_key] = {
+            "request_hash": request_hash,
+            "state": COMPLETED,
+            "response": response,
+            "expires_at": (datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds)).isoformat(),
+        }
+        self._recent.move_to_end(cache_key)
+        while len(self._recent) > self._local_cache_size:
+            self._recent.popitem(last=False)
+
+    def _recent_record(self, ident: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        cache_key = (ident["restaurant_id"], ident["scope"], ident["key"])
+        record = self._recent.get(cache_key)
+        if record and record["expires_at"] <= datetime.now(timezone.utc).isoformat():
+            del self._recent[cache_key]
+            return None
+        return record
+
+    async def _reserve(self, ident: Dict[str, str], request_hash: str) -> Optional[Dict[str, Any]]:
+        """Claim the key; returns the existing record when someone else already has it"""
+        now = datetime.now(timezone.utc)
+        record = {
+            **ident,
+            "request_hash": request_hash,
+            "state": IN_PROGRESS,
+            "response": None,
+            "created_at": now,
+            "expires_at": (now + timedelta(seconds=self.ttl_seconds)).isoformat(),
+            "lease_until": (now + timedelta(seconds=self.lease_seconds)).isoformat(),
+        }
+        try:
+            await self.repository.insert_one(record)
+            return None
+        except DuplicateKeyError:
+            existing = await self.repository.find_one(ident)
+            if existing and existing["expires_at"] <= now.isoformat():
+                # Expired but not yet swept by the TTL monitor
+                await self.repository.delete_one({**ident, "expires_at": existing["expires_at"]})
+                return await self._reserve(ident, request_hash)
+            if (existing and existing["state"] == IN_PROGRESS and existing.get("lease_until")
+                    and existing["lease_until"] <= now.isoformat()):
+                # Its worker died before storing the response; only one retry can delete this lease
+                if await self.repository.delete_one({**ident, "state": IN_PROGRESS,
+                                                     "lease_until": existing["lease_until"]}):
+                    logger.warning("Taking over %s idempotency key whose lease ran out", ident["scope"])
+                return await self._reserve(ident, request_hash)
+            return existing
+
+    async def _run_locally(self, ident: Dict[str, str], request_hash: str,
+                           handler: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        logger.warning("Idempotency store unreachable, checking %s key against this worker only", ident["scope"])
+        response = jsonable_encoder(await handler())
+        self._remember(ident, request_hash, response)
+        return response, False
+
+    async def run(self, restaurant_id: str, scope: str, key: Optional[str], payload: Any,
+                  handler: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run ``handler`` at most once per key; returns (response, replayed)"""
+        if not key:
+            return await handler(), False
+
+        ident = {"restaurant_id": restaurant_id, "scope": scope, "key": key}
+        request_hash = fingerprint(payload)
+        existing = self._recent_record(ident)
+        if existing is None:
+            if not self.is_online():
+                return await self._run_locally(ident, request_hash, handler)
+            try:
+                existing = await self._reserve(ident, request_hash)
+            except StorageUnavailableError:
+                return await self._run_locally(ident, request_hash, handler)
+
+        if existing is not None:
+            if existing["request_hash"] != request_hash:
+                raise HTTPException(
+                    status_code=422,
+                    detail="Idempotency-Key was already used with a different request body"
+                )
+            if existing["state"] != COMPLETED:
+                raise HTTPException(
+                    status_code=409,
+                    detail="A request with this Idempotency-Key is still being processed"
+                )
+            return existing["response"], True
+
+        try:
+            response = jsonable_encoder(await handler())
+        except BaseException:
+            # Let the client retry a request that failed
+            try:
+                await self.repository.delete_one({**ident, "state": IN_PROGRESS})
+            except StorageUnavailableError:
+                logger.warning("Could not release idempotency key for failed %s request", scope)
+            raise
+        self._remember(ident, request_hash, response)
+        try:
+            await self.repository.update_one(
+                ident,
+                set={"state": COMPLETED, "response": response}
+            )
+        except StorageUnavailableError:
+            # The write itself succeeded (or is journaled); retries to this worker hit the local cache
+            logger.warning("Could not store idempotent response for %s request", scope)
+        return response, False
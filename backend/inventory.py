@@ -0,0 +1,197 @@
+"""
+Ingredient stock and which menu items it still allows.
+
+A menu item's ``recipe`` lists the ingredients (``inventory`` documents) one
+portion uses. Every order deducts what its items use from the stock in a single
+bulk ``$inc`` write, then reads back the levels of just those ingredients. An
+item whose recipe can no longer be made is switched to ``is_available: false``
+(and marked ``stock_out`` so a restock switches it back on; items a manager
+switched off by hand are left alone).
+
+Each worker keeps every restaurant's recipes, stock levels and the resulting
+availability map in memory. It is updated in place by this worker's deductions
+and restocks and reloaded in the background at most every ``refresh_interval``
+seconds to pick up the other workers', so ``/api/menu`` never waits on it.
+Ingredients without an inventory document are not tracked and never make an
+item unavailable.
+"""
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from storage import Storage
+
+logger = logging.getLogger(__name__)
+
+
+class StockBook:
+    """Recipes and stock levels of one restaurant"""
+
+    def __init__(self):
+        # menu item id -> [(ingredient id, quantity per portion)]
+        self.recipes: Dict[str, List[Tuple[str, float]]] = {}
+        # ingredient id -> menu item ids whose recipe uses it
+        self.used_by: Dict[str, Set[str]] = defaultdict(set)
+        self.stock: Dict[str, float] = {}
+        self.available: Dict[str, bool] = {}
+        self.refreshed_at = 0.0
+
+    def load(self, menu_items: Iterable[Dict[str, Any]], ingredients: Iterable[Dict[str, Any]]) -> None:
+        self.recipes = {}
+        self.used_by = defaultdict(set)
+        for item in menu_items:
+            if item.get("recipe"):
+                self.set_recipe(item["id"], item["recipe"])
+        self.stock = {ingredient["id"]: ingredient.get("quantity", 0) for ingredient in ingredients}
+        self.available = {item_id: self.can_make(item_id) for item_id in self.recipes}
+
+    def set_recipe(self, item_id: str, recipe: List[Dict[str, Any]]) -> None:
+        for ingredient_id, _ in self.recipes.pop(item_id, []):
+            self.used_by[ingredient_id].discard(item_id)
+        if recipe:
+            self.recipes[item_id] = [(line["ingredient_id"], line["quantity"]) for line in recipe]
+            for ingredient_id, _ in self.recipes[item_id]:
+                self.used_by[ingredient_id].add(item_id)
+        self.available[item_id] = self.can_make(item_id)
+
+    def can_make(self, item_id: str) -> bool:
+        """Whether the tracked stock still covers one portion"""
+        return all(self.stock.get(ingredient_id, quantity) >= quantity
+                   for ingredient_id, quantity in self.recipes.get(item_id, []))
+
+    def needed(self, items: Iterable[Dict[str, Any]]) -> Dict[str, float]:
+        """Stock used by order items, per tracked ingredient"""
+        totals: Dict[str, float] = defaultdict(float)
+        for item in items:
+            for ingredient_id, quantity in self.recipes.get(item["menu_item_id"], []):
+                if ingredient_id in self.stock:
+                    totals[ingredient_id] += quantity * item.get("quantity", 1)
+        return dict(totals)
+
+    def set_levels(self, levels: Dict[str, float]) -> Tuple[List[str], List[str]]:
+        """Take in fresh stock levels; returns the items that ran out and those back in stock"""
+        self.stock.update(levels)
+        ran_out, back = [], []
+        for item_id in {item_id for ingredient_id in levels for item_id in self.used_by.get(ingredient_id, ())}:
+            available = self.can_make(item_id)
+            if available != self.available.get(item_id, True):
+                (back if available else ran_out).append(item_id)
+            self.available[item_id] = available
+        return ran_out, back
+
+
+class Inventory:
+    """Per-restaurant stock books for one worker process"""
+
+    def __init__(self, storage: Storage, refresh_interval: float = 30.0):
+        self.storage = storage
+        self.refresh_interval = refresh_interval
+        self._books: Dict[str, StockBook] = {}
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self.deductions = 0
+        self.items_ran_out = 0
+
+    async def _refresh(self, restaurant_id: str, book: StockBook) -> None:
+        menu_items, ingredients = await asyncio.gather(
+            self.storage.menu_items.find({"restaurant_id": restaurant_id}),
+            self.storage.collection("inventory").find({"restaurant_id": restaurant_id}),
+        )
+        book.load(menu_items, ingredients)
+        book.refreshed_at = time.monotonic()
+
+    async def _background_refresh(self, restaurant_id: str, book: StockBook) -> None:
+        try:
+            async with self._locks[restaurant_id]:
+                await self._refresh(restaurant_id, book)
+        except Exception:
+            logger.exception("Inventory refresh failed for restaurant %s", restaurant_id)
+        finally:
+            self._refreshing.pop(restaurant_id, None)
+
+    async def book(self, restaurant_id: str) -> StockBook:
+        book = self._books.get(restaurant_id)
+        if book is None:
+            async with self._locks[restaurant_id]:
+                book = self._books.get(restaurant_id)
+                if book is None:
+                    book = StockBook()
+                    await self._refresh(restaurant_id, book)
+                    self._books[restaurant_id] = book
+        elif (time.monotonic() - book.refreshed_at > self.refresh_interval
+              and restaurant_id not in self._refreshing):
+            self._refreshing[restaurant_id] = asyncio.create_task(self._background_refresh(restaurant_id, book))
+        return book
+
+    async def availability(self, restaurant_id: str) -> Dict[str, bool]:
+        """Menu item id -> whether its recipe can be made; items without a recipe are left out"""
+        return (await self.book(restaurant_id)).available
+
+    async def deduct(self, restaurant_id: str, items: List[Dict[str, Any]]) -> Dict[str, float]:
+        """Take what order items use off the stock; returns the ingredients' new levels"""
+        book = await self.book(restaurant_id)
+        needed = book.needed(items)
+        if not needed:
+            return {}
+        now = datetime.now(timezone.utc).isoformat()
+        # One round trip however many ingredients the order uses
+        await self.storage.collection("inventory").bulk_update([
+            ({"restaurant_id": restaurant_id, "id": ingredient_id}, {"updated_at": now}, {"quantity": -quantity})
+            for ingredient_id, quantity in needed.items()
+        ])
+        self.deductions += 1
+        return await self.levels_changed(restaurant_id, list(needed))
+
+    async def levels_changed(self, restaurant_id: str, ingredient_ids: List[str],
+                             restocked: bool = False) -> Dict[str, float]:
+        """Re-read these ingredients and switch the menu items they decide on or off"""
+        book = await self.book(restaurant_id)
+        ingredients = await self.storage.collection("inventory").find(
+            {"restaurant_id": restaurant_id, "id": {"$in": ingredient_ids}}
+        )
+        levels = {ingredient["id"]: ingredient.get("quantity", 0) for ingredient in ingredients}
+        ran_out, back = book.set_levels(levels)
+        if restocked:
+            # Another worker may have switched them off without this one noticing
+            back = list({item_id for ingredient_id in levels for item_id in book.used_by.get(ingredient_id, ())
+                         if book.available[item_id]})
+        await self._switch(restaurant_id, ran_out, back)
+        return levels
+
+    async def recipe_saved(self, restaurant_id: str, item_id: str, recipe: List[Dict[str, Any]]) -> bool:
+        """Take in a menu item's new recipe; returns whether the stock covers it"""
+        book = await self.book(restaurant_id)
+        book.set_recipe(item_id, recipe)
+        available = book.available[item_id]
+        await self._switch(restaurant_id, [] if available else [item_id], [item_id] if available else [])
+        return available
+
+    async def _switch(self, restaurant_id: str, ran_out: List[str], back: List[str]) -> None:
+        now = datetime.now(timezone.utc).isoformat()
+        if ran_out:
+            self.items_ran_out += len(ran_out)
+            await self.storage.menu_items.update_many(
+                {"restaurant_id": restaurant_id, "id": {"$in": ran_out}, "is_available": True},
+                set={"is_available": False, "stock_out": True, "updated_at": now}
+            )
+        if back:
+            await self.storage.menu_items.update_many(
+                {"restaurant_id": restaurant_id, "id": {"$in": back}, "stock_out": True},
+                set={"is_available": True, "stock_out": False, "updated_at": now}
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "restaurants": len(self._books),
+            "deductions": self.deductions,
+            "items_ran_out": self.items_ran_out,
+        }
+
+    async def close(self) -> None:
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        await asyncio.gather(*self._refreshing.values(), return_exceptions=True)
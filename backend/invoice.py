@@ -0,0 +1,260 @@
+"""
+Invoice PDFs with a tax breakdown.
+
+Rendering is CPU work, so it runs in a process pool rather than on the event
+loop; :func:`render_invoice` is a plain function of plain data for that reason.
+The PDF is written by hand (one font, text only), which keeps it small and
+needs no extra dependency. Finished PDFs are cached per order version, i.e.
+by order id and ``updated_at``.
+"""
+
+import asyncio
+import multiprocessing
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from singleflight import SingleFlight
+
+PAGE_WIDTH = 595  # A4 in points
+PAGE_HEIGHT = 842
+MARGIN = 50
+LINE_HEIGHT = 14
+FONT_SIZE = 10
+# Courier is 0.6 em wide per character, which keeps the columns aligned
+COLUMNS = int((PAGE_WIDTH - 2 * MARGIN) / (FONT_SIZE * 0.6))
+CENT = Decimal("0.01")
+# Invoices per process pool task in batch renders
+BATCH_CHUNK = 32
+
+
+def money(value: Any) -> Decimal:
+    return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def tax_breakdown(amount: Any, rates: Dict[str, float],
+                  prices_include_tax: bool = True) -> Tuple[Decimal, List[Tuple[str, float, Decimal]], Decimal]:
+    """(taxable value, [(tax, rate %, amount)], grand total) for an order amount
+
+    With tax-inclusive prices the grand total is the order amount and the taxes
+    are backed out of it; otherwise they are added on top.
+    """
+    amount = money(amount)
+    total_rate = Decimal(str(sum(rates.values()))) / 100
+    taxable = money(amount / (1 + total_rate)) if prices_include_tax else amount
+    taxes = [(name, rate, money(taxable * Decimal(str(rate)) / 100)) for name, rate in rates.items()]
+    if prices_include_tax:
+        # Put the rounding difference in the last tax so the parts add up to what was charged
+        if taxes:
+            name, rate, value = taxes[-1]
+            taxes[-1] = (name, rate, amount - taxable - sum(tax for _, _, tax in taxes[:-1]))
+        return taxable, taxes, amount
+    return taxable, taxes, taxable + sum(tax for _, _, tax in taxes)
+
+
+def created_at(order: Dict[str, Any], tz: str) -> Optional[datetime]:
+    """When the order was placed, in the restaurant's timezone"""
+    created = order.get("created_at")
+    if isinstance(created, str):
+        created = datetime.fromisoformat(created.replace("Z", "+00:00"))
+    return created.astimezone(ZoneInfo(tz)) if created else None
+
+
+def invoice_number(order: Dict[str, Any], tz: str = "UTC") -> str:
+    created = created_at(order, tz)
+    return f"INV-{created.strftime('%Y%m%d') if created else ''}-{order['id'][:8].upper()}"
+
+
+def _escape(text: str) -> bytes:
+    data = text.encode("latin-1", errors="replace")
+    return data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def _row(left: str, right: str = "") -> str:
+    room = COLUMNS - len(right) - 1
+    if len(left) > room:
+        left = left[:room - 3] + "..."
+    return left.ljust(room) + " " + right
+
+
+def _lines(order: Dict[str, Any], header: str, tax_id: str, rates: Dict[str, float],
+           prices_include_tax: bool, tz: str) -> List[Tuple[str, bool]]:
+    """(text, bold) for every line of the invoice"""
+    created = created_at(order, tz)
+    lines = [(header, True)]
+    if tax_id:
+        lines.append((f"GSTIN: {tax_id}", False))
+    lines += [
+        ("", False),
+        (_row("TAX INVOICE", invoice_number(order, tz)), True),
+        (_row(f"Date: {created.strftime('%d-%m-%Y %H:%M') if created else ''}",
+              f"Table: {order['table_number']}" if order.get("table_number") else ""), False),
+    ]
+    if order.get("customer_name"):
+        lines.append((f"Customer: {order['customer_name']}", False))
+    lines += [("-" * COLUMNS, False), (_row("Item", "Qty       Rate      Amount"), True), ("-" * COLUMNS, False)]
+    subtotal = Decimal(0)
+    for item in order.get("items", []):
+        price = money(item.get("price", 0))
+        amount = price * item.get("quantity", 1)
+        subtotal += amount
+        lines.append((_row(item.get("menu_item_name", ""),
+                           f"{item.get('quantity', 1):>3} {price:>11} {amount:>11}"), False))
+    taxable, taxes, total = tax_breakdown(subtotal, rates, prices_include_tax)
+    lines += [("-" * COLUMNS, False), (_row("Taxable value", f"{taxable:>11}"), False)]
+    for name, rate, amount in taxes:
+        lines.append((_row(f"{name} @ {rate:g}%", f"{amount:>11}"), False))
+    lines += [("-" * COLUMNS, False), (_row("TOTAL (Rs.)", f"{total:>11}"), True)]
+    if order.get("payment_status") == "paid":
+        method = (order.get("payment_method") or "").upper()
+        lines.append((f"Paid{' by ' + method if method else ''}", False))
+    lines += [("", False), ("Prices include taxes." if prices_include_tax and taxes else "", False)]
+    return lines
+
+
+def _page(lines: List[Tuple[str, bool]]) -> bytes:
+    out = [b"BT", f"{LINE_HEIGHT} TL".encode(), f"{MARGIN} {PAGE_HEIGHT - MARGIN} Td".encode()]
+    font = None
+    for text, bold in lines:
+        if bold is not font:
+            out.append(f"/F{2 if bold else 1} {FONT_SIZE} Tf".encode())
+            font = bold
+        out.append(b"(" + _escape(text) + b") Tj T*")
+    out.append(b"ET")
+    return b"\n".join(out)
+
+
+def build_pdf(pages: List[bytes]) -> bytes:
+    """A PDF with one (compressed) content stream per page, in Courier and Courier-Bold"""
+    objects: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier-Bold /Encoding /WinAnsiEncoding >>",
+    ]
+    kids = []
+    for content in pages:
+        stream = zlib.compress(content)
+        objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> >>" % (PAGE_WIDTH, PAGE_HEIGHT, len(objects))
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(kids) + b"] /Count %d >>" % len(kids)
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def render_invoice(order: Dict[str, Any], header: str = "Taste Paradise", tax_id: str = "",
+                   rates: Optional[Dict[str, float]] = None, prices_include_tax: bool = True,
+                   tz: str = "UTC") -> bytes:
+    """Invoice PDF for a stored order document, dated in the ``tz`` timezone"""
+    lines = _lines(order, header, tax_id, rates or {}, prices_include_tax, tz)
+    per_page = (PAGE_HEIGHT - 2 * MARGIN) // LINE_HEIGHT
+    return build_pdf([_page(lines[start:start + per_page]) for start in range(0, len(lines), per_page)])
+
+
+class InvoiceRenderer:
+    def __init__(self, workers: Optional[int] = None, cache_size: int = 256, header: str = "Taste Paradise",
+                 tax_id: str = "", rates: Optional[Dict[str, float]] = None, prices_include_tax: bool = True,
+                 tz: str = "UTC"):
+        self.workers = workers
+        self.cache_size = cache_size
+        self.options = {"header": header, "tax_id": tax_id, "rates": rates or {},
+                        "prices_include_tax": prices_include_tax, "tz": tz}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._cache: "OrderedDict[Tuple[str, str, str], bytes]" = OrderedDict()
+        # Several terminals opening the same bill share one render
+        self._flights = SingleFlight()
+        self.rendered = 0
+        self.cache_hits = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Forking a process with a running event loop and driver threads is not safe
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def number(self, order: Dict[str, Any]) -> str:
+        return invoice_number(order, self.options["tz"])
+
+    @staticmethod
+    def key(order: Dict[str, Any]) -> Tuple[str, str, str]:
+        return order["restaurant_id"], order["id"], str(order.get("updated_at") or order.get("created_at"))
+
+    def _cached(self, key: Tuple[str, str, str]) -> Optional[bytes]:
+        pdf = self._cache.get(key)
+        if pdf is not None:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+        return pdf
+
+    def _store(self, key: Tuple[str, str, str], pdf: bytes) -> None:
+        self.rendered += 1
+        self._cache[key] = pdf
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def render(self, order: Dict[str, Any]) -> bytes:
+        key = self.key(order)
+        pdf = self._cached(key)
+        if pdf is not None:
+            return pdf
+        return await self._flights.do(("invoice",) + key, lambda: self._render(key, order))
+
+    async def _render(self, key: Tuple[str, str, str], order: Dict[str, Any]) -> bytes:
+        pdfs = await asyncio.get_running_loop().run_in_executor(
+            self._executor(), _render_batch, [_plain(order)], self.options
+        )
+        self._store(key, pdfs[0])
+        return pdfs[0]
+
+    async def render_many(self, orders: List[Dict[str, Any]]) -> List[bytes]:
+        """PDFs for many orders, spread over the pool in chunks of BATCH_CHUNK"""
+        keys = [self.key(order) for order in orders]
+        pdfs = [self._cached(key) for key in keys]
+        missing = [index for index, pdf in enumerate(pdfs) if pdf is None]
+        # One invoice takes well under a millisecond, so sending them one by one would cost
+        # more in pickling and IPC than the rendering itself
+        chunks = [missing[start:start + BATCH_CHUNK] for start in range(0, len(missing), BATCH_CHUNK)]
+        loop = asyncio.get_running_loop()
+        rendered = await asyncio.gather(*(
+            loop.run_in_executor(self._executor(), _render_batch, [_plain(orders[i]) for i in chunk], self.options)
+            for chunk in chunks
+        ))
+        for chunk, chunk_pdfs in zip(chunks, rendered):
+            for index, pdf in zip(chunk, chunk_pdfs):
+                pdfs[index] = pdf
+                self._store(keys[index], pdf)
+        return pdfs
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._pool.shutdown)
+            self._pool = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"rendered": self.rendered, "cache_hits": self.cache_hits, "cached": len(self._cache)}
+
+
+def _plain(order: Dict[str, Any]) -> Dict[str, Any]:
+    # Mongo's _id is of no use to the worker processes
+    return {field: value for field, value in order.items() if field != "_id"}
+
+
+def _render_batch(orders: List[Dict[str, Any]], options: Dict[str, Any]) -> List[bytes]:
+    return [render_invoice(order, **options) for order in orders]
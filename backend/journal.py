@@ -0,0 +1,316 @@
+"""
+Local write journal for order and KOT writes.
+
+Every journaled write is appended to an NDJSON file and fsync'ed before the
+API answers, then applied to the database. If the database is unreachable the
+journal switches to offline mode: writes only hit the local file and a
+background task replays them once the database answers again. Replays are
+idempotent (inserts that already landed are skipped, updates are plain $set;
+$inc is only used for version counters, where counting twice does no harm).
+
+Appends are group-committed: while one fsync is in flight, new entries queue up
+and are written and synced together, so the journal costs one fsync per batch
+rather than one per order.
+
+Each worker process claims its own journal slot through an OS file lock, so
+several workers never write to the same file and a restarted worker picks up
+whatever its predecessor left behind.
+"""
+
+import asyncio
+import copy
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from storage import DuplicateKeyError, Storage, StorageUnavailableError
+from storage.base import matches
+
+logger = logging.getLogger(__name__)
+
+MAX_SLOTS = 64
+
+
+def _try_lock(handle) -> bool:
+    """Take a non-blocking exclusive lock that the OS releases when the process dies"""
+    try:
+        if os.name == "nt":
+            import msvcrt
+
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot journal {type(value).__name__}")
+
+
+async def apply_ops(storage: Storage, ops: List[Dict[str, Any]]) -> None:
+    """Apply journaled operations to the database; safe to repeat"""
+    for op in ops:
+        repository = storage.collection(op["collection"])
+        if op["op"] == "insert":
+            try:
+                await repository.insert_one(op["doc"])
+            except DuplicateKeyError:
+                # Already applied by an earlier attempt
+                pass
+        elif op["op"] == "update":
+            try:
+                await repository.update_one(
+                    op["filter"], set=op.get("set"), inc=op.get("inc"), upsert=op.get("upsert", False)
+                )
+            except DuplicateKeyError:
+                # Lost an upsert race, the document exists now
+                await repository.update_one(op["filter"], set=op.get("set"), inc=op.get("inc"))
+        else:
+            raise ValueError(f"Unknown journal operation {op['op']!r}")
+
+
+class WriteJournal:
+    def __init__(self, directory: str, storage: Storage, apply_timeout: float = 2.0,
+                 replay_interval: float = 2.0, compact_bytes: int = 16 * 1024 * 1024,
+                 on_replayed: Optional[Callable[[List[Dict[str, Any]]], None]] = None):
+        self.directory = Path(directory)
+        self.storage = storage
+        self.apply_timeout = apply_timeout
+        self.replay_interval = replay_interval
+        self.compact_bytes = compact_bytes
+        # Called with the operations of every entry that reached the database through replay
+        self.on_replayed = on_replayed
+
+        self.path: Optional[Path] = None
+        self._lock_handle = None
+        self._file = None
+        self._size = 0
+        self._next_seq = 1
+        self._online = True
+        # Entries not yet confirmed in the database, by sequence number
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        # Entries whose inline apply is still running; replay leaves them alone
+        self._inflight: Set[int] = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def online(self) -> bool:
+        return self._online
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def mark_offline(self) -> None:
+        if self._online:
+            logger.warning("Database unreachable, journaling order writes locally (%s)", self.path)
+        self._online = False
+
+    # Lifecycle
+
+    def _claim_slot(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for slot in range(MAX_SLOTS):
+            handle = open(self.directory / f"journal-{slot}.lock", "a+b")
+            if _try_lock(handle):
+                self._lock_handle = handle
+                self.path = self.directory / f"journal-{slot}.ndjson"
+                return
+            handle.close()
+        raise RuntimeError(f"No free journal slot in {self.directory}")
+
+    def _load(self) -> None:
+        entries: Dict[int, Dict[str, Any]] = {}
+        acked: Set[int] = set()
+        if self.path.exists():
+            with open(self.path, "rb") as fh:
+                for line in fh:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn write from a crash, everything before it is intact
+                        continue
+                    if "ack" in record:
+                        acked.add(record["ack"])
+                    else:
+                        entries[record["seq"]] = record
+        self._pending = {seq: entry for seq, entry in sorted(entries.items()) if seq not in acked}
+        self._next_seq = max(entries, default=0) + 1
+        mode = "ab" if self._pending else "wb"
+        self._file = open(self.path, mode)
+        self._size = self._file.tell() if self._pending else 0
+        if self._pending:
+            logger.info("Journal %s has %d unreplayed writes", self.path, len(self._pending))
+
+    async def open(self) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="write-journal")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._claim_slot)
+        await loop.run_in_executor(self._executor, self._load)
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._writer()),
+            asyncio.create_task(self._replayer()),
+        ]
+
+    async def close(self) -> None:
+        if self._pending and self._online:
+            await self.replay()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close_files)
+        self._executor.shutdown(wait=True)
+
+    def _close_files(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+        if self._lock_handle is not None:
+            self._lock_handle.close()
+
+    # Group commit
+
+    def _write_batch(self, data: bytes, sync: bool) -> None:
+        self._file.write(data)
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+        self._size += len(data)
+
+    def _truncate(self) -> None:
+        self._file.truncate(0)
+        self._file.seek(0)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._size = 0
+
+    async def _writer(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[Tuple[bytes, Optional[asyncio.Future]]] = [await self._queue.get()]
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            data = b"".join(line for line, _ in batch)
+            sync = any(future is not None for _, future in batch)
+            try:
+                await loop.run_in_executor(self._executor, self._write_batch, data, sync)
+            except Exception as exc:
+                for _, future in batch:
+                    if future is not None and not future.done():
+                        future.set_exception(exc)
+                continue
+            for _, future in batch:
+                if future is not None and not future.done():
+                    future.set_result(None)
+            if not self._pending and self._size > self.compact_bytes:
+                await loop.run_in_executor(self._executor, self._truncate)
+
+    def _enqueue(self, record: Dict[str, Any], durable: bool) -> Optional[asyncio.Future]:
+        line = (json.dumps(record, default=_json_default) + "\n").encode()
+        future = asyncio.get_running_loop().create_future() if durable else None
+        self._queue.put_nowait((line, future))
+        return future
+
+    def _ack(self, seq: int) -> None:
+        if self._pending.pop(seq, None) is not None:
+            self._enqueue({"ack": seq}, durable=False)
+
+    # Writes
+
+    async def write(self, ops: List[Dict[str, Any]]) -> bool:
+        """Durably journal a group of operations, then try to apply them.
+
+        Returns True when the database already has the write, False when it
+        was left for the background replay.
+        """
+        seq = self._next_seq
+        self._next_seq += 1
+        entry = {"seq": seq, "ts": datetime.now(timezone.utc).isoformat(), "ops": ops}
+        entry = json.loads(json.dumps(entry, default=_json_default))
+        self._pending[seq] = entry
+        self._inflight.add(seq)
+        try:
+            await self._enqueue(entry, durable=True)
+            if not self._online:
+                return False
+            try:
+                await asyncio.wait_for(apply_ops(self.storage, entry["ops"]), self.apply_timeout)
+            except (StorageUnavailableError, asyncio.TimeoutError):
+                self.mark_offline()
+                return False
+            except Exception:
+                # The caller reports the write as failed, so it must not be replayed later
+                self._ack(seq)
+                raise
+            self._ack(seq)
+            return True
+        finally:
+            self._inflight.discard(seq)
+
+    def find_pending(self, collection: str, filters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Look up a document that so far only exists in the journal"""
+        for entry in reversed(list(self._pending.values())):
+            for op in entry["ops"]:
+                if op["collection"] == collection and op["op"] == "insert" and matches(op["doc"], filters):
+                    return copy.deepcopy(op["doc"])
+        return None
+
+    # Replay
+
+    async def replay(self) -> int:
+        """Apply pending entries in order; returns how many were confirmed"""
+        replayed = 0
+        for seq in sorted(self._pending):
+            if seq in self._inflight:
+                continue
+            entry = self._pending.get(seq)
+            if entry is None:
+                continue
+            try:
+                await apply_ops(self.storage, entry["ops"])
+            except StorageUnavailableError:
+                self.mark_offline()
+                break
+            except Exception:
+                logger.exception("Journal entry %s could not be replayed, will retry", seq)
+                continue
+            self._ack(seq)
+            replayed += 1
+            if self.on_replayed is not None:
+                self.on_replayed(entry["ops"])
+        return replayed
+
+    async def _replayer(self) -> None:
+        while True:
+            await asyncio.sleep(self.replay_interval)
+            if not self._online:
+                # Also with nothing pending: a failed read marks the journal offline too, and until
+                # it is back online every write goes through the journal
+                if not await self.storage.ping():
+                    continue
+                logger.info("Database reachable again, replaying %d journaled writes", len(self._pending))
+                self._online = True
+            if not any(seq not in self._inflight for seq in self._pending):
+                continue
+            try:
+                replayed = await self.replay()
+            except Exception:
+                logger.exception("Journal replay failed")
+                continue
+            if replayed:
+                logger.info("Replayed %d journaled writes", replayed)
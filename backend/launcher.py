@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Production launcher for the Taste Paradise backend.
+
+Runs several worker processes so the API can use every core of the counter PC.
+Each worker imports ``server:app`` on its own and opens its own Mongo client in
+the app lifespan, so pool settings (MONGO_MAX_POOL_SIZE etc.) apply per worker.
+
+    python launcher.py                      # one worker per CPU core, uvicorn
+    python launcher.py --workers 4          # fixed worker count
+    python launcher.py --server gunicorn    # gunicorn + uvicorn workers (Linux/macOS only)
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+
+
+def default_workers() -> int:
+    if os.environ.get('WEB_CONCURRENCY'):
+        return int(os.environ['WEB_CONCURRENCY'])
+    return os.cpu_count() or 1
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Taste Paradise API with multiple workers")
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="number of worker processes (default: WEB_CONCURRENCY or CPU count)")
+    parser.add_argument("--host", default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument("--port", type=int, default=int(os.environ.get('PORT', '8001')))
+    parser.add_argument("--server", choices=["uvicorn", "gunicorn"], default="uvicorn",
+                        help="process manager to use (gunicorn is not available on Windows)")
+    parser.add_argument("--log-level", default="info")
+    return parser.parse_args(argv)
+
+
+def run_uvicorn(args):
+    import uvicorn
+
+    uvicorn.run(
+        "server:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=args.log_level,
+        app_dir=str(ROOT_DIR),
+    )
+
+
+def run_gunicorn(args):
+    command = [
+        sys.executable, "-m", "gunicorn", "server:app",
+        "--worker-class", "uvicorn.workers.UvicornWorker",
+        "--workers", str(args.workers),
+        "--bind", f"{args.host}:{args.port}",
+        "--log-level", args.log_level,
+        "--chdir", str(ROOT_DIR),
+    ]
+    os.execv(sys.executable, command)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"Starting Taste Paradise API with {args.workers} {args.server} worker(s) on {args.host}:{args.port}")
+    if args.server == "gunicorn":
+        run_gunicorn(args)
+    else:
+        run_uvicorn(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Bulk menu import from CSV or JSON uploads.
+
+The upload is parsed as it is read, a chunk at a time: CSV records are cut at
+line ends outside quotes, JSON is either an array of objects or one object per
+line (NDJSON). Valid rows are upserted in batches keyed on (category, name), so
+importing a corrected file again updates the items instead of duplicating them.
+Rows that fail validation are reported by number and skipped.
+"""
+
+import codecs
+import csv
+import json
+import re
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+from storage import Repository, Upsert
+
+FORMATS = ("csv", "json")
+CHUNK_SIZE = 64 * 1024
+# A single JSON item bigger than this is treated as malformed rather than buffered further
+MAX_RECORD_CHARS = 1024 * 1024
+# The report lists at most this many failed rows; failed counts them all
+MAX_REPORTED_ERRORS = 1000
+WHITESPACE = re.compile(r"[ \t\r\n]*")
+
+
+class ImportFormatError(ValueError):
+    """The file cannot be parsed past ``row``"""
+
+    def __init__(self, row: int, message: str):
+        super().__init__(message)
+        self.row = row
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    failed: int = 0
+    # False when a syntax error stopped the import part way; rows before it were still imported
+    complete: bool = True
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+
+    def error(self, row: int, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".json", ".ndjson", ".jsonl")):
+        return "json"
+    content_type = (content_type or "").lower()
+    if "csv" in content_type:
+        return "csv"
+    if "json" in content_type:
+        return "json"
+    return None
+
+
+async def read_chunks(file, size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Read an UploadFile (or anything with an async read) piece by piece"""
+    while True:
+        chunk = await file.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def _texts(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[str, bool]]:
+    """Decoded text of each chunk, and whether it is the last"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    try:
+        async for chunk in chunks:
+            yield decoder.decode(chunk), False
+        yield decoder.decode(b"", final=True), True
+    except UnicodeDecodeError as exc:
+        raise ImportFormatError(0, f"File is not UTF-8 text: {exc.reason}") from exc
+
+
+async def csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Dict[str, str]]]:
+    """(line number, row) for every data row; empty cells are left out so defaults apply"""
+    header: Optional[List[str]] = None
+    pending = ""
+    # Lines of a record whose quoted field spans a line break
+    record: List[str] = []
+    quotes = 0
+    line = 0
+    start = 1
+    async for text, last in _texts(chunks):
+        lines = (pending + text).split("\n")
+        pending = "" if last else lines.pop()
+        complete: List[Tuple[int, str]] = []
+        for text_line in lines:
+            line += 1
+            if not record:
+                start = line
+            record.append(text_line)
+            quotes += text_line.count('"')
+            # Escaped quotes come in pairs, so an odd count means a field is still open
+            if quotes % 2 == 0:
+                complete.append((start, "\n".join(record)))
+                record, quotes = [], 0
+        if last and record:
+            raise ImportFormatError(start, "Quoted field is never closed")
+
+        for (row, _), values in zip(complete, csv.reader(text for _, text in complete)):
+            if not any(value.strip() for value in values):
+                continue
+            if header is None:
+                header = [name.strip().lower() for name in values]
+                continue
+            yield row, {name: value.strip() for name, value in zip(header, values) if name and value.strip()}
+
+
+async def json_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    """(position, item) for every item of a JSON array or of an NDJSON file"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    array: Optional[bool] = None
+    closed = False
+    after_item = False
+    row = 0
+    async for text, last in _texts(chunks):
+        buffer += text
+        position = 0
+        while True:
+            position = WHITESPACE.match(buffer, position).end()
+            if position == len(buffer):
+                break
+            char = buffer[position]
+            if closed:
+                raise ImportFormatError(row, "Unexpected data after the closing ]")
+            if array is None:
+                array = char == "["
+                if array:
+                    position += 1
+                    continue
+            if array and char == "]":
+                closed = True
+                position += 1
+                continue
+            if array and after_item:
+                if char != ",":
+                    raise ImportFormatError(row + 1, "Expected , or ] between items")
+                after_item = False
+                position += 1
+                continue
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as exc:
+                # Most likely the item continues in the next chunk
+                if not last and len(buffer) - position < MAX_RECORD_CHARS:
+                    break
+                raise ImportFormatError(row + 1, f"Invalid JSON: {exc.msg}") from exc
+            if end == len(buffer) and not last and not isinstance(value, (dict, list)):
+                # A number may have been cut in two
+                break
+            row += 1
+            position = end
+            after_item = True
+            yield row, value
+        buffer = buffer[position:]
+    if array and not closed:
+        raise ImportFormatError(row + 1, "Missing closing ]")
+
+
+def records(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[Tuple[int, Any]]:
+    return csv_records(chunks) if fmt == "csv" else json_records(chunks)
+
+
+def _describe(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}" for error in exc.errors()
+    )
+
+
+async def import_menu(repository: Repository, restaurant_id: str, rows: AsyncIterator[Tuple[int, Any]],
+                      model: Type[BaseModel], batch_size: int = 500) -> ImportReport:
+    """Validate rows against ``model`` and upsert them on (restaurant, category, name)"""
+    report = ImportReport()
+    batch: Dict[Tuple[str, str], Upsert] = {}
+
+    async def flush() -> None:
+        if batch:
+            updated, inserted = await repository.bulk_upsert(list(batch.values()))
+            report.updated += updated
+            report.inserted += inserted
+            batch.clear()
+
+    try:
+        async for row, record in rows:
+            report.rows += 1
+            if not isinstance(record, dict):
+                report.error(row, "Expected an object")
+                continue
+            try:
+                item = model(**record)
+            except ValidationError as exc:
+                report.error(row, _describe(exc))
+                continue
+            fields = item.dict()
+            fields["name"] = fields["name"].strip()
+            fields["category"] = fields["category"].strip()
+            if not fields["name"] or not fields["category"]:
+                report.error(row, "name and category must not be blank")
+                continue
+
+            key = (fields["category"], fields["name"])
+            if key in batch:
+                # The same item twice in one batch; apply them in file order
+                await flush()
+            now = datetime.now(timezone.utc).isoformat()
+            batch[key] = (
+                {"restaurant_id": restaurant_id, "category": fields["category"], "name": fields["name"]},
+                {**fields, "updated_at": now},
+                {"id": str(uuid.uuid4()), "is_available": True, "created_at": now},
+            )
+            if len(batch) >= batch_size:
+                await flush()
+    except ImportFormatError as exc:
+        report.error(exc.row, str(exc))
+        report.complete = False
+    await flush()
+    return report
@@ -0,0 +1,279 @@
+"""
+In-memory search over menu item names, descriptions and categories.
+
+Each restaurant's menu is kept in a small inverted index: a sorted vocabulary
+answers prefix lookups (what a waiter has typed so far), and a trigram index
+finds words within one or two typos of the query. Results are ranked by match
+quality and field (name over category over description), then boosted by how
+often the item was ordered recently.
+
+The index is built from the database on first use and updated in place on menu
+writes in this worker. Writes made by other workers are picked up by a
+background refresh at most ``refresh_interval`` seconds later.
+"""
+
+import asyncio
+import bisect
+import heapq
+import logging
+import math
+import re
+import time
+import unicodedata
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from storage import Storage
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+FIELD_WEIGHTS = {"name": 3.0, "category": 2.0, "description": 1.0}
+# Match quality of a query term against an indexed word
+EXACT = 1.0
+PREFIX = 0.7
+FUZZY = 0.4
+
+
+def normalize(text: str) -> str:
+    """Lowercase and strip accents, so "Crème" matches "creme" """
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_PATTERN.findall(normalize(text or ""))
+
+
+def trigrams(word: str) -> Set[str]:
+    padded = f" {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Damerau-Levenshtein distance (adjacent swaps count once), capped at limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class MenuIndex:
+    """Search index over one restaurant's menu"""
+
+    def __init__(self):
+        self.items: Dict[str, Dict[str, Any]] = {}
+        # word -> item id -> best field weight the word appears in
+        self._postings: Dict[str, Dict[str, float]] = {}
+        # Sorted vocabulary; every word with a given prefix is one contiguous slice
+        self._words: List[str] = []
+        self._grams: Dict[str, Set[str]] = defaultdict(set)
+        self._item_words: Dict[str, Dict[str, float]] = {}
+        self.popularity: Dict[str, float] = {}
+        self.refreshed_at = 0.0
+        self.popularity_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def upsert(self, doc: Dict[str, Any]) -> None:
+        item_id = doc["id"]
+        if self.items.get(item_id) == doc:
+            return
+        self.remove(item_id)
+        weights: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for word in tokenize(doc.get(field)):
+                weights[word] = max(weights.get(word, 0.0), weight)
+        for word, weight in weights.items():
+            if word not in self._postings:
+                self._postings[word] = {}
+                bisect.insort(self._words, word)
+                for gram in trigrams(word):
+                    self._grams[gram].add(word)
+            self._postings[word][item_id] = weight
+        self.items[item_id] = doc
+        self._item_words[item_id] = weights
+
+    def remove(self, item_id: str) -> None:
+        self.items.pop(item_id, None)
+        for word in self._item_words.pop(item_id, {}):
+            postings = self._postings[word]
+            postings.pop(item_id, None)
+            if postings:
+                continue
+            del self._postings[word]
+            del self._words[bisect.bisect_left(self._words, word)]
+            for gram in trigrams(word):
+                self._grams[gram].discard(word)
+                if not self._grams[gram]:
+                    del self._grams[gram]
+
+    def replace_all(self, docs: Iterable[Dict[str, Any]]) -> None:
+        """Bring the index in line with the stored menu, touching only what changed"""
+        docs_by_id = {doc["id"]: doc for doc in docs}
+        for item_id in [item_id for item_id in self.items if item_id not in docs_by_id]:
+            self.remove(item_id)
+        for doc in docs_by_id.values():
+            self.upsert(doc)
+
+    def _prefixed(self, prefix: str) -> Iterable[str]:
+        for position in range(bisect.bisect_left(self._words, prefix), len(self._words)):
+            word = self._words[position]
+            if not word.startswith(prefix):
+                break
+            yield word
+
+    def _similar(self, term: str) -> Iterable[str]:
+        limit = 1 if len(term) <= 5 else 2
+        candidates = {word for gram in trigrams(term) for word in self._grams.get(gram, ())}
+        for word in candidates:
+            if edit_distance(term, word, limit) <= limit:
+                yield word
+
+    def _term_scores(self, term: str, fuzzy: bool) -> Dict[str, float]:
+        scores: Dict[str, float] = {}
+
+        def add(word: str, quality: float) -> None:
+            for item_id, weight in self._postings[word].items():
+                score = quality * weight
+                if score > scores.get(item_id, 0.0):
+                    scores[item_id] = score
+
+        if term in self._postings:
+            add(term, EXACT)
+        for word in self._prefixed(term):
+            if word != term:
+                add(word, PREFIX)
+        # Typos only get a look when the term itself found little
+        if fuzzy and len(scores) < 3 and len(term) >= 3:
+            for word in self._similar(term):
+                if word != term and not word.startswith(term):
+                    add(word, FUZZY)
+        return scores
+
+    def search(self, query: str, limit: int = 20, fuzzy: bool = True) -> List[Dict[str, Any]]:
+        """Items matching every word of the query, best first"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        totals: Optional[Dict[str, float]] = None
+        for term in dict.fromkeys(terms):
+            scores = self._term_scores(term, fuzzy)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {item_id: total + scores[item_id] for item_id, total in totals.items() if item_id in scores}
+            if not totals:
+                return []
+
+        def rank(item_id: str):
+            boost = 1 + 0.25 * math.log1p(self.popularity.get(item_id, 0.0))
+            return totals[item_id] * boost
+
+        best = heapq.nlargest(limit, totals, key=rank)
+        return [self.items[item_id] for item_id in best]
+
+
+class MenuSearch:
+    """Per-restaurant menu indexes for one worker process"""
+
+    def __init__(self, storage: Storage, refresh_interval: float = 30.0,
+                 popularity_window_days: int = 30, popularity_interval: float = 600.0):
+        self.storage = storage
+        self.refresh_interval = refresh_interval
+        self.popularity_window_days = popularity_window_days
+        self.popularity_interval = popularity_interval
+        self._indexes: Dict[str, MenuIndex] = {}
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    async def _load_popularity(self, restaurant_id: str) -> Dict[str, float]:
+        since = (datetime.now(timezone.utc) - timedelta(days=self.popularity_window_days)).isoformat()
+        counts: Dict[str, float] = defaultdict(float)
+        async for order in self.storage.orders.iterate({
+            "restaurant_id": restaurant_id,
+            "created_at": {"$gte": since},
+            "status": {"$ne": "cancelled"},
+        }):
+            for item in order.get("items", []):
+                counts[item.get("menu_item_id")] += item.get("quantity", 1)
+        return dict(counts)
+
+    async def _refresh(self, restaurant_id: str, index: MenuIndex) -> None:
+        items = await self.storage.menu_items.find({"restaurant_id": restaurant_id})
+        index.replace_all(items)
+        index.refreshed_at = time.monotonic()
+        if not index.popularity_at or index.refreshed_at - index.popularity_at >= self.popularity_interval:
+            index.popularity = await self._load_popularity(restaurant_id)
+            index.popularity_at = time.monotonic()
+
+    async def _background_refresh(self, restaurant_id: str, index: MenuIndex) -> None:
+        try:
+            async with self._locks[restaurant_id]:
+                await self._refresh(restaurant_id, index)
+        except Exception:
+            logger.exception("Menu search refresh failed for restaurant %s", restaurant_id)
+        finally:
+            self._refreshing.pop(restaurant_id, None)
+
+    async def index(self, restaurant_id: str) -> MenuIndex:
+        index = self._indexes.get(restaurant_id)
+        if index is None:
+            async with self._locks[restaurant_id]:
+                index = self._indexes.get(restaurant_id)
+                if index is None:
+                    index = MenuIndex()
+                    await self._refresh(restaurant_id, index)
+                    self._indexes[restaurant_id] = index
+        elif (time.monotonic() - index.refreshed_at > self.refresh_interval
+              and restaurant_id not in self._refreshing):
+            # Serve the current index while the refresh runs
+            self._refreshing[restaurant_id] = asyncio.create_task(
+                self._background_refresh(restaurant_id, index)
+            )
+        return index
+
+    async def search(self, restaurant_id: str, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        index = await self.index(restaurant_id)
+        return index.search(query, limit)
+
+    # Incremental updates from this worker's writes
+
+    def item_saved(self, restaurant_id: str, doc: Dict[str, Any]) -> None:
+        index = self._indexes.get(restaurant_id)
+        if index is not None:
+            index.upsert(doc)
+
+    def item_deleted(self, restaurant_id: str, item_id: str) -> None:
+        index = self._indexes.get(restaurant_id)
+        if index is not None:
+            index.remove(item_id)
+
+    def forget(self, restaurant_id: str) -> None:
+        """Rebuild on next use, e.g. after a bulk import"""
+        self._indexes.pop(restaurant_id, None)
+
+    def items_ordered(self, restaurant_id: str, items: Iterable[Any]) -> None:
+        index = self._indexes.get(restaurant_id)
+        if index is None:
+            return
+        for item in items:
+            index.popularity[item.menu_item_id] = index.popularity.get(item.menu_item_id, 0.0) + item.quantity
+
+    async def close(self) -> None:
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        await asyncio.gather(*self._refreshing.values(), return_exceptions=True)
@@ -0,0 +1,116 @@
+"""
+Order events for the operations screen.
+
+Every order creation and status change is recorded in ``order_events``, on
+MongoDB a time-series collection (see ``TIME_SERIES`` in storage/base.py):
+
+    {"at": <BSON date>, "meta": {"restaurant_id", "table_number", "status"},
+     "id": ..., "order_id": ...}
+
+MongoDB buckets events sharing ``meta`` by time, so a few years of them take
+little space and the hour-of-day x weekday heatmap and rolling throughput
+queries read a time range of buckets instead of scanning ``orders`` by its
+ISO-string ``created_at``. Events are recorded through the outbox, which may
+run a handler twice; time-series collections have no unique indexes, so the
+handler looks for the event's id before inserting it.
+"""
+
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from storage import Storage, as_datetime
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "order_events"
+
+
+def order_event(restaurant_id: str, order_id: str, status: str, table_number: Optional[str],
+                at: datetime, event_id: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "id": event_id or str(uuid.uuid4()),
+        "at": as_datetime(at).astimezone(timezone.utc),
+        "meta": {"restaurant_id": restaurant_id, "table_number": table_number, "status": status},
+        "order_id": order_id,
+    }
+
+
+class OrderEvents:
+    def __init__(self, storage: Storage):
+        self.storage = storage
+        self.recorded = 0
+
+    @property
+    def collection(self):
+        return self.storage.collection(COLLECTION)
+
+    @staticmethod
+    def payload(order_id: str, status: str, table_number: Optional[str], at: str) -> Dict[str, Any]:
+        """Outbox payload for one event; the id makes repeated runs recognisable"""
+        return {"id": str(uuid.uuid4()), "order_id": order_id, "status": status,
+                "table_number": table_number, "at": at}
+
+    async def record(self, restaurant_id: str, payload: Dict[str, Any]) -> None:
+        """Outbox handler storing one event"""
+        event = order_event(restaurant_id, payload["order_id"], payload["status"], payload.get("table_number"),
+                            payload["at"], payload["id"])
+        # The time narrows the lookup down to one bucket
+        if await self.collection.find_one({"meta.restaurant_id": restaurant_id, "at": event["at"],
+                                           "id": event["id"]}):
+            return
+        await self.collection.insert_one(event)
+        self.recorded += 1
+
+    async def heatmap(self, restaurant_id: str, start: datetime, end: datetime, tz: str, status: str = "pending",
+                      table_number: Optional[str] = None) -> List[List[int]]:
+        """Events per local weekday (rows, Monday first) and hour (columns) between ``start`` and ``end``"""
+        filters: Dict[str, Any] = {
+            "meta.restaurant_id": restaurant_id,
+            "meta.status": status,
+            "at": {"$gte": start, "$lt": end},
+        }
+        if table_number:
+            filters["meta.table_number"] = table_number
+        counts = [[0] * 24 for _ in range(7)]
+        for cell in await self.storage.reads("analytics").collection(COLLECTION).weekday_hour_counts(
+            filters, "at", tz
+        ):
+            counts[cell["weekday"]][cell["hour"]] = cell["count"]
+        return counts
+
+    async def throughput(self, restaurant_id: str, hours: float, bucket_minutes: int,
+                         now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Events per status in each ``bucket_minutes`` interval of the last ``hours``, oldest first"""
+        now = now or datetime.now(timezone.utc)
+        width = timedelta(minutes=bucket_minutes)
+        # Whole buckets, the last one being the one in progress
+        end = datetime.fromtimestamp(now.timestamp() // width.total_seconds() * width.total_seconds(),
+                                     timezone.utc) + width
+        start = end - width * max(1, round(hours * 60 / bucket_minutes))
+        groups = await self.storage.reads("analytics").collection(COLLECTION).interval_counts(
+            {"meta.restaurant_id": restaurant_id, "at": {"$gte": start, "$lt": end}},
+            "at", bucket_minutes, group_field="meta.status"
+        )
+        buckets: Dict[datetime, Dict[str, int]] = {}
+        bucket = start
+        while bucket < end:
+            buckets[bucket] = {}
+            bucket += width
+        totals: Dict[str, int] = {}
+        for group in groups:
+            buckets.setdefault(group["start"], {})[group["key"]] = group["count"]
+            totals[group["key"]] = totals.get(group["key"], 0) + group["count"]
+        elapsed_hours = (now - start).total_seconds() / 3600
+        return {
+            "start": start,
+            "end": end,
+            "bucket_minutes": bucket_minutes,
+            "buckets": [{"start": at, "counts": counts} for at, counts in sorted(buckets.items())],
+            # Over the whole window so far, e.g. orders served per hour
+            "per_hour": {status: round(count / elapsed_hours, 2) for status, count in totals.items()},
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {"recorded": self.recorded}
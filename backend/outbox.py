@@ -0,0 +1,186 @@
+"""
+Durable outbox for side effects of order and KOT writes.
+
+Work that the waiter does not need to wait for (marking tables occupied,
+deducting ingredient stock, recording order events, printing KOTs) is
+recorded as an ``outbox`` document in the same journaled write as the order
+itself, so it is exactly as durable as the order. Right after the write the
+entry is handed to this worker's in-process queue and usually runs within
+milliseconds.
+
+If the worker dies first, or a handler fails, the entry stays in the database
+and a sweeper in every worker picks it up once its lease (``available_at``)
+runs out. Handlers therefore run at least once and must be idempotent.
+"""
+
+import asyncio
+import logging
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from storage import Storage, StorageUnavailableError
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+# Gave up after max_attempts; left in the collection for a person to look at
+FAILED = "failed"
+
+Handler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+@dataclass
+class OutboxStats:
+    dispatched: int = 0
+    swept: int = 0
+    completed: int = 0
+    retried: int = 0
+    failed: int = 0
+
+
+class Outbox:
+    def __init__(self, storage: Storage, workers: int = 4, poll_interval: float = 2.0,
+                 lease_seconds: float = 30.0, max_attempts: int = 10, queue_size: int = 10000):
+        self.storage = storage
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease = timedelta(seconds=lease_seconds)
+        self.max_attempts = max_attempts
+        self._handlers: Dict[str, Handler] = {}
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._tasks: List[asyncio.Task] = []
+        self._stats = OutboxStats()
+
+    @property
+    def collection(self):
+        return self.storage.collection("outbox")
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self._handlers[kind] = handler
+
+    # Recording side effects
+
+    def entry(self, restaurant_id: str, kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        return {
+            "id": str(uuid.uuid4()),
+            "restaurant_id": restaurant_id,
+            "kind": kind,
+            "payload": payload,
+            "status": PENDING,
+            "attempts": 0,
+            # The in-process queue gets the first go; the sweeper only after the lease
+            "available_at": (now + self.lease).isoformat(),
+            "created_at": now.isoformat(),
+        }
+
+    @staticmethod
+    def op(entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Journal operation that stores the entry alongside the primary write"""
+        return {"collection": "outbox", "op": "insert", "doc": entry}
+
+    def dispatch(self, entries: List[Dict[str, Any]]) -> None:
+        """Run committed entries in the background; a full queue leaves them to the sweeper"""
+        for entry in entries:
+            try:
+                self._queue.put_nowait(entry)
+                self._stats.dispatched += 1
+            except asyncio.QueueFull:
+                break
+
+    # Running them
+
+    async def _run(self, entry: Dict[str, Any]) -> None:
+        ident = {"restaurant_id": entry["restaurant_id"], "id": entry["id"]}
+        handler = self._handlers.get(entry["kind"])
+        try:
+            if handler is None:
+                raise LookupError(f"No outbox handler for {entry['kind']!r}")
+            await handler(entry["restaurant_id"], entry["payload"])
+        except StorageUnavailableError:
+            # The entry may not even be stored yet (journaled offline); the sweeper retries it
+            logger.warning("Database unreachable, outbox entry %s left for later", entry["id"])
+            return
+        except Exception as exc:
+            attempts = entry["attempts"] + 1
+            if attempts >= self.max_attempts:
+                logger.exception("Outbox entry %s (%s) failed %d times, giving up", entry["id"], entry["kind"], attempts)
+                await self.collection.update_one(ident, set={"status": FAILED, "attempts": attempts,
+                                                             "last_error": repr(exc)})
+                self._stats.failed += 1
+                return
+            logger.warning("Outbox entry %s (%s) failed: %r, retrying", entry["id"], entry["kind"], exc)
+            retry_at = datetime.now(timezone.utc) + timedelta(seconds=min(2 ** attempts, 300))
+            await self.collection.update_one(ident, set={"available_at": retry_at.isoformat(),
+                                                         "attempts": attempts, "last_error": repr(exc)})
+            self._stats.retried += 1
+            return
+        await self.collection.delete_one(ident)
+        self._stats.completed += 1
+
+    async def _worker(self) -> None:
+        while True:
+            entry = await self._queue.get()
+            try:
+                await self._run(entry)
+            except StorageUnavailableError:
+                pass
+            except Exception:
+                logger.exception("Outbox entry %s could not be processed", entry["id"])
+            finally:
+                self._queue.task_done()
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        """Take one due entry from any worker by pushing its lease forward"""
+        now = datetime.now(timezone.utc)
+        claimed = await self.collection.find_one_and_update(
+            {"status": PENDING, "available_at": {"$lte": now.isoformat()}},
+            set={"available_at": (now + self.lease).isoformat()}
+        )
+        if claimed is not None:
+            claimed.pop("_id", None)
+        return claimed
+
+    async def sweep(self, limit: int = 100) -> int:
+        """Queue up entries whose lease ran out; returns how many"""
+        swept = 0
+        while swept < limit and not self._queue.full():
+            entry = await self._claim()
+            if entry is None:
+                break
+            self._queue.put_nowait(entry)
+            swept += 1
+        self._stats.swept += swept
+        return swept
+
+    async def _sweeper(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.sweep()
+            except StorageUnavailableError:
+                continue
+            except Exception:
+                logger.exception("Outbox sweep failed")
+
+    # Lifecycle
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+
+    async def close(self, drain_timeout: float = 5.0) -> None:
+        """Finish what is queued (up to drain_timeout); anything left is swept by a later worker"""
+        try:
+            await asyncio.wait_for(self._queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Outbox closed with %d queued entries", self._queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {"queued": self._queue.qsize(), **asdict(self._stats)}
@@ -0,0 +1,41 @@
+"""Server-side printing of KOTs and bills.
+
+Tickets are rendered to ESC/POS (:mod:`.escpos`) and handed to a
+:class:`Spooler`, which keeps one queue per printer. Printers are configured
+with ``PRINTERS`` as ``name=address`` pairs, where an address is
+``tcp://host:9100`` for a network receipt printer or a file path.
+"""
+
+from typing import Optional
+
+from .escpos import render_bill, render_kot, to_text
+from .printers import FilePrinter, Printer, TcpPrinter, create_printer
+from .router import PrintRouter
+from .service import PrintService, failed_printers
+from .spooler import PrinterNotFoundError, Spooler
+
+
+def create_print_service(settings) -> Optional[PrintService]:
+    """None when no printers are configured"""
+    if not settings.printers:
+        return None
+    printers = [
+        create_printer(name, address, settings.print_timeout_s) for name, address in settings.printers.items()
+    ]
+    default = settings.print_default_printer or printers[0].name
+    for printer in [default, settings.print_bill_printer, *settings.print_routes.values()]:
+        if printer is not None and printer not in settings.printers:
+            raise ValueError(f"Unknown printer {printer!r} (PRINTERS has {', '.join(settings.printers)})")
+    return PrintService(
+        Spooler(printers, retries=settings.print_retries, timeout=settings.print_timeout_s),
+        PrintRouter(settings.print_routes, default),
+        bill_printer=settings.print_bill_printer,
+        width=settings.print_width,
+        header=settings.print_header,
+    )
+
+
+__all__ = [
+    "FilePrinter", "PrintRouter", "PrintService", "Printer", "PrinterNotFoundError", "Spooler", "TcpPrinter",
+    "create_print_service", "create_printer", "failed_printers", "render_bill", "render_kot", "to_text",
+]
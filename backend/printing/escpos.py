@@ -0,0 +1,167 @@
+"""ESC/POS rendering of kitchen tickets and bills.
+
+Only the commands every thermal receipt printer understands are used: reset,
+alignment, bold, double size, line feed and cut. Text is sent in code page 437;
+characters it lacks are printed as "?".
+"""
+
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+ESC = b"\x1b"
+GS = b"\x1d"
+
+RESET = ESC + b"@"
+CODE_PAGE_437 = ESC + b"t\x00"
+ALIGN_LEFT = ESC + b"a\x00"
+ALIGN_CENTER = ESC + b"a\x01"
+BOLD_ON = ESC + b"E\x01"
+BOLD_OFF = ESC + b"E\x00"
+NORMAL_SIZE = GS + b"!\x00"
+DOUBLE_SIZE = GS + b"!\x11"
+# Feed three lines, then a full cut
+CUT = GS + b"VA\x03"
+
+ENCODING = "cp437"
+_COMMANDS = re.compile(rb"\x1b[@]|\x1b[taE].|\x1d!.|\x1dVA.", re.DOTALL)
+
+
+class Ticket:
+    """Builds one ESC/POS job"""
+
+    def __init__(self, width: int = 48):
+        self.width = width
+        self._parts: List[bytes] = [RESET, CODE_PAGE_437]
+
+    def line(self, text: str = "", bold: bool = False, large: bool = False, center: bool = False) -> "Ticket":
+        # Double size halves the characters per line
+        width = self.width // 2 if large else self.width
+        if center:
+            self._parts.append(ALIGN_CENTER)
+        if bold:
+            self._parts.append(BOLD_ON)
+        if large:
+            self._parts.append(DOUBLE_SIZE)
+        for chunk in wrap(text, width):
+            self._text(chunk)
+        if large:
+            self._parts.append(NORMAL_SIZE)
+        if bold:
+            self._parts.append(BOLD_OFF)
+        if center:
+            self._parts.append(ALIGN_LEFT)
+        return self
+
+    def columns(self, left: str, right: str, bold: bool = False) -> "Ticket":
+        """Left text and right aligned text (a price) on one line"""
+        room = self.width - len(right) - 1
+        lines = wrap(left, room)
+        lines[-1] = lines[-1].ljust(room) + " " + right
+        if bold:
+            self._parts.append(BOLD_ON)
+        for text in lines:
+            self._text(text)
+        if bold:
+            self._parts.append(BOLD_OFF)
+        return self
+
+    def _text(self, text: str) -> None:
+        self._parts.append(text.encode(ENCODING, errors="replace") + b"\n")
+
+    def rule(self, char: str = "-") -> "Ticket":
+        return self.line(char * self.width)
+
+    def cut(self) -> bytes:
+        self._parts.append(CUT)
+        return b"".join(self._parts)
+
+
+def wrap(text: str, width: int) -> List[str]:
+    """Split text into lines of at most width characters, breaking at spaces where possible
+
+    Leading spaces indent every line of the paragraph.
+    """
+    lines: List[str] = []
+    for paragraph in (text or "").split("\n"):
+        words = paragraph.lstrip(" ")
+        indent = paragraph[:len(paragraph) - len(words)][:width // 2]
+        room = width - len(indent)
+        current = ""
+        for word in words.split():
+            while len(word) > room:
+                if current:
+                    lines.append(indent + current)
+                    current = ""
+                lines.append(indent + word[:room])
+                word = word[room:]
+            if not current:
+                current = word
+            elif len(current) + 1 + len(word) <= room:
+                current += " " + word
+            else:
+                lines.append(indent + current)
+                current = word
+        lines.append(indent + current if current else "")
+    return lines
+
+
+def _local_time(value: Any) -> str:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if not isinstance(value, datetime):
+        return ""
+    return value.astimezone().strftime("%d-%m-%Y %H:%M")
+
+
+def render_kot(kot: Dict[str, Any], items: Optional[List[Dict[str, Any]]] = None,
+               station: Optional[str] = None, width: int = 48) -> bytes:
+    """Kitchen ticket for a KOT; ``items`` narrows it to one station's share"""
+    ticket = Ticket(width)
+    ticket.line("KOT", bold=True, large=True, center=True)
+    ticket.line(kot.get("order_number", ""), bold=True, large=True, center=True)
+    if station:
+        ticket.line(station.upper(), bold=True, center=True)
+    ticket.rule()
+    if kot.get("table_number"):
+        ticket.line(f"Table {kot['table_number']}", bold=True, large=True)
+    ticket.line(_local_time(kot.get("created_at")))
+    ticket.rule()
+    for item in kot.get("items", []) if items is None else items:
+        ticket.line(f"{item.get('quantity', 1)} x {item.get('menu_item_name', '')}", bold=True, large=True)
+        if item.get("special_instructions"):
+            ticket.line(f"  * {item['special_instructions']}")
+    ticket.rule()
+    return ticket.cut()
+
+
+def render_bill(order: Dict[str, Any], header: str = "Taste Paradise", width: int = 48) -> bytes:
+    """Customer bill for an order"""
+    ticket = Ticket(width)
+    ticket.line(header, bold=True, large=True, center=True)
+    ticket.line(_local_time(order.get("created_at")), center=True)
+    ticket.rule()
+    details = [f"Bill #{order.get('id', '')[-6:].upper()}"]
+    if order.get("table_number"):
+        details.append(f"Table {order['table_number']}")
+    ticket.line("  ".join(details))
+    if order.get("customer_name"):
+        ticket.line(order["customer_name"])
+    ticket.rule()
+    for item in order.get("items", []):
+        quantity = item.get("quantity", 1)
+        amount = quantity * item.get("price", 0)
+        ticket.columns(f"{quantity} x {item.get('menu_item_name', '')}", f"{amount:.2f}")
+    ticket.rule()
+    ticket.columns("TOTAL (Rs.)", f"{order.get('total_amount', 0):.2f}", bold=True)
+    if order.get("payment_status") == "paid":
+        method = (order.get("payment_method") or "").upper()
+        ticket.line(f"Paid{' by ' + method if method else ''}", center=True)
+    ticket.line()
+    ticket.line("Thank you, visit again!", center=True)
+    return ticket.cut()
+
+
+def to_text(data: bytes) -> str:
+    """Readable preview of an ESC/POS job, with the printer commands left out"""
+    return _COMMANDS.sub(b"", data).decode(ENCODING, errors="replace")
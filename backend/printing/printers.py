@@ -0,0 +1,82 @@
+"""Printer transports: a network receipt printer, or a file standing in for one."""
+
+import asyncio
+from abc import ABC, abstractmethod
+from pathlib import Path
+from urllib.parse import urlsplit
+
+# Raw printing port of Epson, Star, Xprinter and most other network receipt printers
+DEFAULT_PORT = 9100
+
+
+class Printer(ABC):
+    name: str
+
+    @abstractmethod
+    async def send(self, data: bytes) -> None:
+        """Deliver one complete job; raises OSError when the printer cannot be reached"""
+
+
+class TcpPrinter(Printer):
+    """Network printer taking raw ESC/POS on a socket, one connection per job"""
+
+    def __init__(self, name: str, host: str, port: int = DEFAULT_PORT, timeout: float = 5.0):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    async def send(self, data: bytes) -> None:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        try:
+            writer.write(data)
+            await asyncio.wait_for(writer.drain(), self.timeout)
+            # The printer closes its end once the job is in its buffer; waiting for that keeps
+            # the next job from piling up in the socket while it is still busy
+            writer.write_eof()
+            try:
+                await asyncio.wait_for(reader.read(), self.timeout)
+            except asyncio.TimeoutError:
+                # Some printers keep the connection open; every byte was already sent
+                pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    def __repr__(self) -> str:
+        return f"TcpPrinter({self.name!r}, tcp://{self.host}:{self.port})"
+
+
+class FilePrinter(Printer):
+    """Appends jobs to a file; for tests, demos, or a USB printer exposed as a device file"""
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = Path(path)
+
+    def _append(self, data: bytes) -> None:
+        with open(self.path, "ab") as handle:
+            handle.write(data)
+
+    async def send(self, data: bytes) -> None:
+        await asyncio.to_thread(self._append, data)
+
+    def __repr__(self) -> str:
+        return f"FilePrinter({self.name!r}, {str(self.path)!r})"
+
+
+def create_printer(name: str, address: str, timeout: float = 5.0) -> Printer:
+    """``tcp://host[:port]``, ``file:///path`` or a plain path"""
+    parts = urlsplit(address)
+    if parts.scheme == "tcp":
+        if not parts.hostname:
+            raise ValueError(f"Printer {name!r}: no host in {address!r}")
+        return TcpPrinter(name, parts.hostname, parts.port or DEFAULT_PORT, timeout)
+    if parts.scheme == "file":
+        return FilePrinter(name, parts.path)
+    if not parts.scheme:
+        return FilePrinter(name, address)
+    raise ValueError(f"Printer {name!r}: unsupported address {address!r} (expected tcp:// or file://)")
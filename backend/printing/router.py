@@ -0,0 +1,33 @@
+"""Which printer a KOT line goes to."""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+class PrintRouter:
+    """Routes by menu category or kitchen station, falling back to a default printer
+
+    Route keys are matched case-insensitively, so ``Beverages=bar`` also catches
+    items filed under "beverages".
+    """
+
+    def __init__(self, routes: Dict[str, str], default: Optional[str]):
+        self.routes = {key.strip().lower(): printer for key, printer in routes.items()}
+        self.default = default
+
+    def printer_for(self, *keys: Optional[str]) -> Optional[str]:
+        """Printer of the first key with a route"""
+        for key in keys:
+            printer = self.routes.get((key or "").strip().lower())
+            if printer is not None:
+                return printer
+        return self.default
+
+    def split(self, items: List[Dict[str, Any]],
+              keys_of: Callable[[Dict[str, Any]], Sequence[Optional[str]]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Items grouped per printer, in their original order; unroutable items are dropped"""
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for item in items:
+            printer = self.printer_for(*keys_of(item))
+            if printer is not None:
+                groups.setdefault(printer, []).append(item)
+        return groups
@@ -0,0 +1,81 @@
+"""KOT and bill printing on top of the spooler."""
+
+import asyncio
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .escpos import render_bill, render_kot
+from .router import PrintRouter
+from .spooler import PrinterNotFoundError, Spooler
+
+
+class PrintService:
+    def __init__(self, spooler: Spooler, router: PrintRouter, bill_printer: Optional[str] = None,
+                 width: int = 48, header: str = "Taste Paradise"):
+        self.spooler = spooler
+        self.router = router
+        self.bill_printer = bill_printer or router.default
+        self.width = width
+        self.header = header
+
+    def kot_tickets(self, kot: Dict[str, Any], categories: Dict[str, str],
+                    station_of: Callable[[Optional[str]], Optional[str]] = lambda category: None) -> Dict[str, bytes]:
+        """One rendered ticket per printer, each with the items routed to it
+
+        ``categories`` maps menu item ids to their category; an item's category route
+        wins over the route of the kitchen station ``station_of`` puts it at.
+        """
+        def keys_of(item: Dict[str, Any]) -> List[Optional[str]]:
+            category = categories.get(item.get("menu_item_id"))
+            return [category, station_of(category)]
+
+        groups = self.router.split(kot.get("items", []), keys_of)
+        # Name the station on the ticket only when the order is split between several
+        split = len(groups) > 1
+        return {
+            printer: render_kot(kot, items, station=printer if split else None, width=self.width)
+            for printer, items in groups.items()
+        }
+
+    async def print_kot(self, kot: Dict[str, Any], categories: Dict[str, str],
+                        station_of: Callable[[Optional[str]], Optional[str]] = lambda category: None,
+                        skip: Iterable[str] = ()) -> Dict[str, Any]:
+        """Print a KOT on every printer it routes to except ``skip``
+
+        Returns printer -> job id for the ones that printed and printer -> exception
+        for the ones that did not.
+        """
+        tickets = self.kot_tickets(kot, categories, station_of)
+        return await self._wait({
+            printer: self.spooler.submit(printer, data, f"KOT {kot.get('order_number', '')}")
+            for printer, data in tickets.items() if printer not in skip
+        })
+
+    async def print_bill(self, order: Dict[str, Any]) -> int:
+        if self.bill_printer is None:
+            raise PrinterNotFoundError("No bill printer configured")
+        data = render_bill(order, header=self.header, width=self.width)
+        return await self.spooler.submit(self.bill_printer, data, f"Bill {order.get('id', '')}")
+
+    @staticmethod
+    async def _wait(futures: Dict[str, asyncio.Future]) -> Dict[str, Any]:
+        results = await asyncio.gather(*futures.values(), return_exceptions=True)
+        return dict(zip(futures, results))
+
+    def start(self) -> None:
+        self.spooler.start()
+
+    async def close(self) -> None:
+        await self.spooler.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "default_printer": self.router.default,
+            "bill_printer": self.bill_printer,
+            "routes": self.router.routes,
+            "printers": self.spooler.stats(),
+        }
+
+
+def failed_printers(results: Dict[str, Any]) -> List[str]:
+    """Printers in a ``print_kot`` result that did not take their ticket"""
+    return [printer for printer, result in results.items() if isinstance(result, BaseException)]
@@ -0,0 +1,156 @@
+"""
+Print spooler with one queue per printer.
+
+Jobs for a printer are sent strictly one after another (receipt printers
+interleave concurrent connections badly), while different printers work in
+parallel, so a jammed bar printer never holds up the kitchen. A job that
+fails is retried with backoff; the caller gets a future that resolves once the
+printer accepted the job, or fails after the last retry.
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+from .printers import Printer
+
+logger = logging.getLogger(__name__)
+
+
+class PrinterNotFoundError(LookupError):
+    pass
+
+
+@dataclass
+class PrintJob:
+    id: int
+    label: str
+    data: bytes
+    future: asyncio.Future
+    attempts: int = 0
+    queued_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class PrinterStats:
+    printed: int = 0
+    failed: int = 0
+    retried: int = 0
+    last_error: Optional[str] = None
+    last_printed_at: Optional[float] = None
+
+
+class PrinterQueue:
+    def __init__(self, printer: Printer, retries: int = 3, timeout: float = 5.0, backoff: float = 0.5,
+                 queue_size: int = 1000):
+        self.printer = printer
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._task: Optional[asyncio.Task] = None
+        self._stats = PrinterStats()
+
+    def put(self, job: PrintJob) -> None:
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            job.future.set_exception(OSError(f"Print queue for {self.printer.name!r} is full"))
+
+    async def _print(self, job: PrintJob) -> None:
+        while True:
+            job.attempts += 1
+            try:
+                # Room for each of the printer's own waits (connect, drain, the printer closing
+                # its end), so a printer that keeps the socket open is not printed to again
+                await asyncio.wait_for(self.printer.send(job.data), 3 * self.timeout)
+            except (OSError, asyncio.TimeoutError) as exc:
+                error = repr(exc) if str(exc) else type(exc).__name__
+                self._stats.last_error = error
+                if job.attempts > self.retries:
+                    logger.warning("Printer %s: job %s (%s) failed: %s", self.printer.name, job.id, job.label, error)
+                    self._stats.failed += 1
+                    if not job.future.done():
+                        job.future.set_exception(OSError(f"Printer {self.printer.name!r}: {error}"))
+                    return
+                self._stats.retried += 1
+                await asyncio.sleep(self.backoff * 2 ** (job.attempts - 1))
+                continue
+            self._stats.printed += 1
+            self._stats.last_printed_at = time.time()
+            if not job.future.done():
+                job.future.set_result(job.id)
+            return
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._print(job)
+            except Exception as exc:
+                logger.exception("Printer %s: job %s could not be printed", self.printer.name, job.id)
+                if not job.future.done():
+                    job.future.set_exception(exc)
+            finally:
+                self._queue.task_done()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._worker())
+
+    async def drain(self) -> None:
+        await self._queue.join()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Whoever is waiting on jobs that never printed learns about it
+        while not self._queue.empty():
+            job = self._queue.get_nowait()
+            if not job.future.done():
+                job.future.set_exception(OSError(f"Printer {self.printer.name!r}: spooler stopped"))
+            self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"printer": repr(self.printer), "queued": self._queue.qsize(), **asdict(self._stats)}
+
+
+class Spooler:
+    def __init__(self, printers: List[Printer], retries: int = 3, timeout: float = 5.0, backoff: float = 0.5):
+        self._queues: Dict[str, PrinterQueue] = {
+            printer.name: PrinterQueue(printer, retries, timeout, backoff) for printer in printers
+        }
+        self._ids = itertools.count(1)
+
+    @property
+    def printers(self) -> List[str]:
+        return list(self._queues)
+
+    def submit(self, printer: str, data: bytes, label: str = "") -> asyncio.Future:
+        """Queue a job; the future resolves to the job id once the printer has it"""
+        queue = self._queues.get(printer)
+        if queue is None:
+            raise PrinterNotFoundError(f"No printer named {printer!r}")
+        job = PrintJob(next(self._ids), label, data, asyncio.get_running_loop().create_future())
+        queue.put(job)
+        return job.future
+
+    def start(self) -> None:
+        for queue in self._queues.values():
+            queue.start()
+
+    async def close(self, drain_timeout: float = 5.0) -> None:
+        """Print what is queued (up to drain_timeout), then stop"""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.drain() for queue in self._queues.values())),
+                                   drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Spooler closed with unprinted jobs")
+        await asyncio.gather(*(queue.stop() for queue in self._queues.values()))
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: queue.stats() for name, queue in self._queues.items()}
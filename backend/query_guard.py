@@ -0,0 +1,176 @@
+"""
+Guardrails for the database reads behind every API request.
+
+:class:`QueryGuardMiddleware` gives each ``/api`` request a
+:class:`~storage.QueryLimits` for its endpoint (the route's function name):
+
+* a server-side time limit on every read it makes (``maxTimeMS`` on MongoDB,
+  a progress handler on SQLite). A read running past it fails with
+  :class:`~storage.QueryTimeoutError`, answered as a 503 right away instead of
+  holding a pool connection for as long as the scan takes;
+* a cap on the documents list endpoints return, applied with :func:`capped`.
+  A capped response carries ``X-Result-Truncated: <cap>``;
+* for GET requests, cancellation when the client disconnects: the handler is
+  cancelled and its reads still running on MongoDB are killed by their
+  ``comment``, SQLite stops them from the progress handler. Requests that write
+  are always run to completion.
+
+Timeouts, truncated responses and cancellations are counted per endpoint for
+``/api/metrics``. The in-memory backend has no time limits.
+"""
+
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from starlette.routing import Match
+
+from storage import (
+    QueryCancelledError, QueryLimits, QueryTimeoutError, Repository, Storage, current_query_limits, query_limits,
+)
+from storage.base import SortSpec
+
+logger = logging.getLogger(__name__)
+
+# Methods whose handlers only read, and so may be cancelled half way
+CANCELLABLE_METHODS = ("GET", "HEAD")
+
+
+@dataclass
+class GuardStats:
+    timeouts: int = 0
+    truncated: int = 0
+    cancelled: int = 0
+
+
+class QueryGuard:
+    def __init__(self, time_limits_ms: Dict[str, int], max_results: int,
+                 storage: Callable[[], Optional[Storage]]):
+        self.time_limits_ms = time_limits_ms
+        self.max_results = max_results
+        # The worker's storage once the app has started
+        self.storage = storage
+        self._stats: Dict[str, GuardStats] = defaultdict(GuardStats)
+
+    def limits_for(self, endpoint: str) -> QueryLimits:
+        return QueryLimits(
+            endpoint=endpoint,
+            max_time_ms=self.time_limits_ms.get(endpoint, self.time_limits_ms.get("default", 0)),
+            max_results=self.max_results,
+            comment=f"tp:{endpoint}:{uuid.uuid4().hex}",
+        )
+
+    async def cancel(self, limits: QueryLimits) -> None:
+        limits.cancelled = True
+        self._stats[limits.endpoint].cancelled += 1
+        storage = self.storage()
+        if storage is None:
+            return
+        try:
+            await storage.cancel_queries(limits.comment)
+        except Exception as exc:
+            # e.g. a database user without the killop privilege; the time limit still applies
+            logger.warning("Could not cancel the reads of %s: %r", limits.endpoint, exc)
+
+    def truncated(self, endpoint: str) -> None:
+        self._stats[endpoint].truncated += 1
+
+    async def timeout_response(self, request: Request, exc: QueryTimeoutError) -> JSONResponse:
+        limits = current_query_limits()
+        endpoint = limits.endpoint if limits else request.url.path
+        self._stats[endpoint].timeouts += 1
+        logger.warning("Read on %s exceeded its time limit: %s", endpoint, exc)
+        limit = f" of {limits.max_time_ms} ms" if limits and limits.max_time_ms else ""
+        return JSONResponse(
+            status_code=503,
+            content={"detail": f"The database took longer than the time limit{limit}; narrow the request or retry"},
+            headers={"Retry-After": "1"},
+        )
+
+    async def cancelled_response(self, request: Request, exc: QueryCancelledError) -> JSONResponse:
+        # Nobody is listening any more, but the handler still has to answer something
+        return JSONResponse(status_code=499, content={"detail": "Client disconnected"})
+
+    def stats(self) -> Dict[str, Any]:
+        return {endpoint: asdict(stats) for endpoint, stats in sorted(self._stats.items())}
+
+
+async def capped(repository: Repository, filters: Dict[str, Any], sort: Optional[SortSpec] = None) -> List[Dict[str, Any]]:
+    """Find for list endpoints: at most the request's ``max_results`` documents, flagging the
+    response as truncated when there were more
+    """
+    limits = current_query_limits()
+    cap = limits.max_results if limits else 0
+    docs = await repository.find(filters, sort=sort, limit=cap + 1 if cap else None)
+    if cap and len(docs) > cap:
+        del docs[cap:]
+        limits.truncated = True
+    return docs
+
+
+class QueryGuardMiddleware:
+    """ASGI middleware applying a QueryGuard to every /api request"""
+
+    def __init__(self, app, guard: QueryGuard):
+        self.app = app
+        self.guard = guard
+
+    @staticmethod
+    def endpoint(scope) -> str:
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.name
+        return scope["path"]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api"):
+            await self.app(scope, receive, send)
+            return
+        limits = self.guard.limits_for(self.endpoint(scope))
+        responded = False
+
+        async def send_with_headers(message):
+            nonlocal responded
+            if message["type"] == "http.response.start" and limits.truncated:
+                self.guard.truncated(limits.endpoint)
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (b"x-result-truncated", str(limits.max_results).encode())]}
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                responded = True
+            await send(message)
+
+        with query_limits(limits):
+            if scope["method"] not in CANCELLABLE_METHODS:
+                await self.app(scope, receive, send_with_headers)
+                return
+            # Read everything the client sends from here, so its disconnect is seen while the handler runs
+            messages: asyncio.Queue = asyncio.Queue()
+            handler = asyncio.ensure_future(self.app(scope, messages.get, send_with_headers))
+            limits.task = handler
+
+            async def listen():
+                while True:
+                    message = await receive()
+                    await messages.put(message)
+                    if message["type"] == "http.disconnect":
+                        return
+
+            listener = asyncio.ensure_future(listen())
+            try:
+                await asyncio.wait({handler, listener}, return_when=asyncio.FIRST_COMPLETED)
+                if not handler.done() and not responded:
+                    await self.guard.cancel(limits)
+                    handler.cancel()
+                try:
+                    await handler
+                except asyncio.CancelledError:
+                    if not limits.cancelled:
+                        raise
+            finally:
+                listener.cancel()
@@ -0,0 +1,96 @@
+"""
+End-of-day (Z) reports.
+
+Closing a business day runs one aggregation over the orders created between
+local midnight and the next in the restaurant's timezone, so a day that ends
+after midnight UTC (or before it) is reported as the staff saw it. The result
+is stored in ``day_reports`` as a snapshot that is never recomputed or
+overwritten: the figures handed over at the till stay the same even if orders
+are edited afterwards, and a past day's report is a lookup by date.
+"""
+
+import logging
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from invoice import money, tax_breakdown
+from storage import DuplicateKeyError, Storage
+
+logger = logging.getLogger(__name__)
+
+
+def day_window(day: date, tz: str) -> Tuple[datetime, datetime]:
+    """UTC start and end of a local calendar day; 23 or 25 hours long on DST changes"""
+    zone = ZoneInfo(tz)
+    start = datetime.combine(day, datetime.min.time(), zone)
+    end = datetime.combine(day + timedelta(days=1), datetime.min.time(), zone)
+    return start.astimezone(timezone.utc), end.astimezone(timezone.utc)
+
+
+def _total(groups: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {"count": sum(group["count"] for group in groups),
+            "amount": float(money(sum(group["amount"] for group in groups)))}
+
+
+def build_report(restaurant_id: str, day: date, tz: str, totals: Dict[str, List[Dict[str, Any]]],
+                 tax_rates: Dict[str, float], prices_include_tax: bool = True) -> Dict[str, Any]:
+    """Z-report document from :meth:`Repository.sales_totals` of the day's orders"""
+    start, end = day_window(day, tz)
+    sold = [group for group in totals["orders"] if not group["cancelled"]]
+    sales = _total(sold)
+    taxable, taxes, _ = tax_breakdown(sales["amount"], tax_rates, prices_include_tax)
+    methods: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for group in sold:
+        if group["paid"]:
+            methods.setdefault(group["payment_method"], []).append(group)
+    return {
+        "id": str(uuid.uuid4()),
+        "restaurant_id": restaurant_id,
+        "date": day.isoformat(),
+        "timezone": tz,
+        "window_start": start.isoformat(),
+        "window_end": end.isoformat(),
+        "closed_at": datetime.now(timezone.utc).isoformat(),
+        "orders": sum(group["count"] for group in totals["orders"]),
+        "gross_sales": sales["amount"],
+        "average_order": float(money(sales["amount"] / sales["count"])) if sales["count"] else 0.0,
+        "taxable_value": float(taxable),
+        "taxes": [{"name": name, "rate": rate, "amount": float(amount)} for name, rate, amount in taxes],
+        "paid": _total([group for group in sold if group["paid"]]),
+        "pending_payments": _total([group for group in sold if not group["paid"]]),
+        "cancellations": _total([group for group in totals["orders"] if group["cancelled"]]),
+        "payment_methods": sorted(
+            ({"method": method, **_total(groups)} for method, groups in methods.items()),
+            key=lambda split: -split["amount"]
+        ),
+        "items": sorted(
+            ({**item, "amount": float(money(item["amount"]))} for item in totals["items"]),
+            key=lambda item: (-item["quantity"], item["menu_item_name"])
+        ),
+    }
+
+
+async def close_day(storage: Storage, restaurant_id: str, day: date, tz: str, tax_rates: Dict[str, float],
+                    prices_include_tax: bool = True) -> Tuple[Dict[str, Any], bool]:
+    """The day's Z-report, computed and stored on the first close; returns (report, newly closed)"""
+    reports = storage.collection("day_reports")
+    key = {"restaurant_id": restaurant_id, "date": day.isoformat()}
+    existing = await reports.find_one(key)
+    if existing:
+        return existing, False
+    start, end = day_window(day, tz)
+    # Read from the primary: the snapshot must include every order written so far
+    totals = await storage.orders.sales_totals(
+        {"restaurant_id": restaurant_id, "created_at": {"$gte": start.isoformat(), "$lt": end.isoformat()}}
+    )
+    report = build_report(restaurant_id, day, tz, totals, tax_rates, prices_include_tax)
+    try:
+        await reports.insert_one(report)
+    except DuplicateKeyError:
+        # Closed concurrently by another terminal; theirs stands
+        return await reports.find_one(key), False
+    logger.info("Closed %s for restaurant %s: %d orders, %.2f sales",
+                report["date"], restaurant_id, report["orders"], report["gross_sales"])
+    return report, True
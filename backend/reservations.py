@@ -0,0 +1,284 @@
+"""
+Table reservations.
+
+A reservation holds its table for a run of fixed-length slots. Every held slot
+is a document in ``reservation_slots`` with a unique (restaurant, table, slot)
+index, so two workers can never book the same table twice for the same time.
+
+For availability and best-fit queries each worker keeps the bookings of every
+table in memory. A table's bookings never overlap, so keeping them sorted by
+start lets a bisect answer "is this window free?" in O(log n), which is what an
+interval tree would give us for the general case. The in-memory view is
+updated by this worker's writes and refreshed from the database in the
+background, like the menu search index.
+"""
+
+import asyncio
+import bisect
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from storage import DuplicateKeyError, Storage
+
+logger = logging.getLogger(__name__)
+
+# Reservations in these states hold their table
+ACTIVE_STATUSES = ("booked", "seated")
+# Empty time on either side of a booking counts at most this much when ranking tables
+MAX_GAP_S = 24 * 3600.0
+
+
+class ReservationConflict(Exception):
+    """The table is already booked for part of the requested time"""
+
+
+def as_utc(value: datetime) -> datetime:
+    """Treat naive datetimes as UTC"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def parse_time(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        return as_utc(value)
+    return as_utc(datetime.fromisoformat(value.replace('Z', '+00:00')))
+
+
+class TableSchedule:
+    """Bookings on one table, sorted by start; they never overlap"""
+
+    def __init__(self):
+        self._starts: List[float] = []
+        self._ends: List[float] = []
+        self._ids: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _overlapping(self, start: float, end: float) -> range:
+        # Ends are sorted too, since bookings are disjoint
+        return range(bisect.bisect_right(self._ends, start), bisect.bisect_left(self._starts, end))
+
+    def conflicts(self, start: float, end: float) -> List[str]:
+        return [self._ids[i] for i in self._overlapping(start, end)]
+
+    def is_free(self, start: float, end: float) -> bool:
+        return len(self._overlapping(start, end)) == 0
+
+    def gaps(self, start: float, end: float) -> Tuple[float, float]:
+        """Idle seconds left before and after a booking of [start, end)"""
+        position = bisect.bisect_left(self._starts, end)
+        before = start - self._ends[position - 1] if position > 0 else MAX_GAP_S
+        after = self._starts[position] - end if position < len(self._starts) else MAX_GAP_S
+        return min(before, MAX_GAP_S), min(after, MAX_GAP_S)
+
+    def next_start(self, after: float) -> Optional[float]:
+        """Start of the first booking that begins at or after ``after``"""
+        position = bisect.bisect_left(self._starts, after)
+        return self._starts[position] if position < len(self._starts) else None
+
+    def add(self, start: float, end: float, reservation_id: str) -> None:
+        if not self.is_free(start, end):
+            raise ReservationConflict(f"Overlaps {self.conflicts(start, end)}")
+        position = bisect.bisect_left(self._starts, start)
+        self._starts.insert(position, start)
+        self._ends.insert(position, end)
+        self._ids.insert(position, reservation_id)
+
+    def remove(self, reservation_id: str) -> None:
+        if reservation_id in self._ids:
+            position = self._ids.index(reservation_id)
+            del self._starts[position], self._ends[position], self._ids[position]
+
+
+class ReservationBook:
+    """One restaurant's tables and their schedules"""
+
+    def __init__(self, tables: List[Dict[str, Any]]):
+        # Smallest tables first, so the first free fit wastes the fewest seats
+        self.tables = sorted(tables, key=lambda t: (t.get("capacity", 0), t["table_number"]))
+        self.schedules: Dict[str, TableSchedule] = defaultdict(TableSchedule)
+        self.refreshed_at = time.monotonic()
+
+    def table(self, table_number: str) -> Optional[Dict[str, Any]]:
+        for table in self.tables:
+            if table["table_number"] == table_number:
+                return table
+        return None
+
+    def book(self, reservation: Dict[str, Any], held: Tuple[datetime, datetime]) -> None:
+        self.schedules[reservation["table_id"]].add(held[0].timestamp(), held[1].timestamp(), reservation["id"])
+
+    def release(self, reservation: Dict[str, Any]) -> None:
+        self.schedules[reservation["table_id"]].remove(reservation["id"])
+
+    def best_fit(self, party_size: int, start: datetime, end: datetime, limit: int = 3) -> List[Dict[str, Any]]:
+        """Free tables for the party, best first: fewest empty seats, then the snuggest fit in the schedule"""
+        start_ts, end_ts = start.timestamp(), end.timestamp()
+        candidates = []
+        for table in self.tables:
+            capacity = table.get("capacity", 0)
+            if capacity < party_size:
+                continue
+            if len(candidates) >= limit and capacity - party_size > candidates[limit - 1][0][0]:
+                # Tables come smallest first, nothing later can rank higher
+                break
+            schedule = self.schedules.get(table["id"])
+            if schedule is None:
+                gap = 2 * MAX_GAP_S
+            elif schedule.is_free(start_ts, end_ts):
+                gap = sum(schedule.gaps(start_ts, end_ts))
+            else:
+                continue
+            candidates.append(((capacity - party_size, gap, table["table_number"]), table))
+        candidates.sort(key=lambda candidate: candidate[0])
+        return [table for _, table in candidates[:limit]]
+
+
+class Reservations:
+    """Reservation bookkeeping for one worker process"""
+
+    def __init__(self, storage: Storage, slot_minutes: int = 15, refresh_interval: float = 30.0,
+                 history_hours: int = 24):
+        self.storage = storage
+        self.slot = timedelta(minutes=slot_minutes)
+        self.refresh_interval = refresh_interval
+        self.history = timedelta(hours=history_hours)
+        self._books: Dict[str, ReservationBook] = {}
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    @property
+    def collection(self):
+        return self.storage.collection("reservations")
+
+    @property
+    def slots(self):
+        return self.storage.collection("reservation_slots")
+
+    def held(self, start: datetime, end: datetime) -> Tuple[datetime, datetime]:
+        """The whole slots a booking of [start, end) occupies"""
+        epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+        first = epoch + ((start - epoch) // self.slot) * self.slot
+        last = epoch + -((epoch - end) // self.slot) * self.slot
+        return first, last
+
+    def slot_starts(self, start: datetime, end: datetime) -> List[datetime]:
+        first, last = self.held(start, end)
+        count = (last - first) // self.slot
+        return [first + i * self.slot for i in range(count)]
+
+    # In-memory view
+
+    async def _load(self, restaurant_id: str) -> ReservationBook:
+        tables = await self.storage.tables.find({"restaurant_id": restaurant_id})
+        book = ReservationBook(tables)
+        since = (datetime.now(timezone.utc) - self.history).isoformat()
+        async for reservation in self.collection.iterate({
+            "restaurant_id": restaurant_id,
+            "status": {"$in": list(ACTIVE_STATUSES)},
+            "end_at": {"$gte": since},
+        }):
+            try:
+                book.book(reservation, self.held(parse_time(reservation["start_at"]), parse_time(reservation["end_at"])))
+            except ReservationConflict:
+                logger.warning("Reservation %s overlaps another booking on its table", reservation["id"])
+        return book
+
+    async def _background_refresh(self, restaurant_id: str) -> None:
+        try:
+            async with self._locks[restaurant_id]:
+                self._books[restaurant_id] = await self._load(restaurant_id)
+        except Exception:
+            logger.exception("Reservation refresh failed for restaurant %s", restaurant_id)
+        finally:
+            self._refreshing.pop(restaurant_id, None)
+
+    async def book_for(self, restaurant_id: str) -> ReservationBook:
+        book = self._books.get(restaurant_id)
+        if book is None:
+            async with self._locks[restaurant_id]:
+                book = self._books.get(restaurant_id)
+                if book is None:
+                    book = await self._load(restaurant_id)
+                    self._books[restaurant_id] = book
+        elif (time.monotonic() - book.refreshed_at > self.refresh_interval
+              and restaurant_id not in self._refreshing):
+            self._refreshing[restaurant_id] = asyncio.create_task(self._background_refresh(restaurant_id))
+        return book
+
+    def forget(self, restaurant_id: str) -> None:
+        """Reload on next use, e.g. after tables were added or removed"""
+        self._books.pop(restaurant_id, None)
+
+    async def best_fit(self, restaurant_id: str, party_size: int, start: datetime, end: datetime,
+                       limit: int = 3) -> List[Dict[str, Any]]:
+        book = await self.book_for(restaurant_id)
+        first, last = self.held(as_utc(start), as_utc(end))
+        return book.best_fit(party_size, first, last, limit)
+
+    # Writes
+
+    async def _claim(self, reservation: Dict[str, Any], start: datetime, end: datetime) -> None:
+        """Hold every slot of the booking, or none of them"""
+        try:
+            for slot in self.slot_starts(start, end):
+                await self.slots.insert_one({
+                    "restaurant_id": reservation["restaurant_id"],
+                    "table_id": reservation["table_id"],
+                    "slot": slot.isoformat(),
+                    "reservation_id": reservation["id"],
+                })
+        except DuplicateKeyError:
+            await self.slots.delete_many({"restaurant_id": reservation["restaurant_id"],
+                                          "reservation_id": reservation["id"]})
+            raise ReservationConflict(f"Table {reservation['table_number']} is already booked for that time")
+
+    async def create(self, reservation: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a reservation whose table_id/table_number are set; raises ReservationConflict"""
+        restaurant_id = reservation["restaurant_id"]
+        start, end = parse_time(reservation["start_at"]), parse_time(reservation["end_at"])
+        book = await self.book_for(restaurant_id)
+        held = self.held(start, end)
+        schedule = book.schedules.get(reservation["table_id"])
+        if schedule is not None and not schedule.is_free(held[0].timestamp(), held[1].timestamp()):
+            raise ReservationConflict(f"Table {reservation['table_number']} is already booked for that time")
+
+        # The reservation goes in first so a crash never leaves slots without an owner
+        await self.collection.insert_one(reservation)
+        try:
+            await self._claim(reservation, start, end)
+        except BaseException:
+            await self.collection.delete_one({"restaurant_id": restaurant_id, "id": reservation["id"]})
+            raise
+        try:
+            book.book(reservation, held)
+        except ReservationConflict:
+            # Our view was stale, the database is the authority
+            self.forget(restaurant_id)
+        return reservation
+
+    async def set_status(self, restaurant_id: str, reservation_id: str, status: str) -> Optional[Dict[str, Any]]:
+        """Move an active reservation on; cancelled or finished ones stay as they are"""
+        reservation = await self.collection.find_one_and_update(
+            {"restaurant_id": restaurant_id, "id": reservation_id, "status": {"$in": list(ACTIVE_STATUSES)}},
+            set={"status": status, "updated_at": datetime.now(timezone.utc).isoformat()}
+        )
+        if reservation is None:
+            existing = await self.collection.find_one({"restaurant_id": restaurant_id, "id": reservation_id})
+            if existing is not None:
+                raise ReservationConflict(f"Reservation is already {existing['status']}")
+            return None
+        if status not in ACTIVE_STATUSES:
+            await self.slots.delete_many({"restaurant_id": restaurant_id, "reservation_id": reservation_id})
+            book = self._books.get(restaurant_id)
+            if book is not None:
+                book.release(reservation)
+        return reservation
+
+    async def close(self) -> None:
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        await asyncio.gather(*self._refreshing.values(), return_exceptions=True)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Fill order_events from the orders placed before events were recorded.
+
+Orders carry when they were created and when they reached each later status
+(``cooking_at``, ``ready_at`` and so on); one event is written for each. Only
+orders older than a restaurant's first recorded event are read, so running it
+again, or after the API has been recording for a while, adds nothing twice.
+
+    cd backend
+    python scripts/backfill_order_events.py
+    python scripts/backfill_order_events.py --restaurant default
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from order_events import COLLECTION, order_event  # noqa: E402
+from settings import ROOT_DIR, Settings  # noqa: E402
+from storage import as_datetime, create_storage  # noqa: E402
+
+STATUSES = ("cooking", "ready", "served", "cancelled")
+BATCH = 1000
+
+logger = logging.getLogger("backfill_order_events")
+
+
+async def backfill(storage, restaurant_id: str) -> int:
+    events = storage.collection(COLLECTION)
+    first = await events.find_one({"meta.restaurant_id": restaurant_id}, sort=[("at", 1)])
+    filters = {"restaurant_id": restaurant_id}
+    if first:
+        filters["created_at"] = {"$lt": as_datetime(first["at"]).isoformat()}
+    written, batch = 0, []
+    # Newest first: if interrupted, running it again picks up the older orders left over
+    async for order in storage.orders.iterate(filters, sort=[("created_at", -1)], batch_size=BATCH):
+        table_number = order.get("table_number")
+        batch.append(order_event(restaurant_id, order["id"], "pending", table_number, order["created_at"],
+                                 f"{order['id']}:pending"))
+        for status in STATUSES:
+            if order.get(f"{status}_at"):
+                batch.append(order_event(restaurant_id, order["id"], status, table_number, order[f"{status}_at"],
+                                         f"{order['id']}:{status}"))
+        if len(batch) >= BATCH:
+            await events.insert_many(batch)
+            written, batch = written + len(batch), []
+    if batch:
+        await events.insert_many(batch)
+        written += len(batch)
+    logger.info("Wrote %d order events for restaurant %s", written, restaurant_id)
+    return written
+
+
+async def run(args) -> None:
+    settings = Settings.from_env()
+    storage = create_storage(settings)
+    await storage.connect()
+    try:
+        await storage.ensure_indexes()
+        for restaurant_id in args.restaurant or await storage.orders.distinct("restaurant_id"):
+            await backfill(storage, restaurant_id)
+    finally:
+        await storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--restaurant", action="append", help="restaurant id, may be repeated")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    load_dotenv(ROOT_DIR / ".env")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
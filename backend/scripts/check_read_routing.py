@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Show which replica set member serves each kind of query.
+
+Writes and read-your-writes paths must hit the primary; endpoints listed in
+MONGO_READ_PREFERENCES should be served by a secondary when one is healthy.
+
+    cd backend
+    ./scripts/local_replica_set.sh start
+    MONGO_URL="mongodb://localhost:27021,localhost:27022,localhost:27023/?replicaSet=tp-rs" \\
+        python scripts/check_read_routing.py
+"""
+
+import asyncio
+import os
+import sys
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from pymongo import monitoring
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from settings import DEFAULT_READ_PREFERENCES, env_int, env_map  # noqa: E402
+from storage.mongo import MongoStorage  # noqa: E402
+
+
+class ServerRecorder(monitoring.CommandListener):
+    """Remember which server ran each command"""
+
+    def __init__(self):
+        self.servers = Counter()
+
+    def started(self, event):
+        if event.command_name in ("insert", "find", "aggregate", "count", "update"):
+            self.servers[(event.command_name, event.connection_id)] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def main():
+    recorder = ServerRecorder()
+    read_preferences = env_map('MONGO_READ_PREFERENCES', DEFAULT_READ_PREFERENCES)
+    storage = MongoStorage(
+        os.environ['MONGO_URL'], f"tp_routing_{uuid.uuid4().hex[:8]}",
+        {"event_listeners": [recorder]},
+        read_preferences=read_preferences, max_staleness_s=env_int('MONGO_MAX_STALENESS_S', 90),
+    )
+    await storage.connect()
+    try:
+        # Topology is known once the first command has run
+        await storage.client.admin.command("ping")
+        primary = storage.client.primary
+        print(f"primary: {primary}, secondaries: {sorted(storage.client.secondaries)}")
+        checks = [("write", lambda: storage.orders.insert_one({"restaurant_id": "default", "id": "o1"})),
+                  ("primary read", lambda: storage.orders.find_one({"restaurant_id": "default", "id": "o1"}))]
+        for endpoint in read_preferences:
+            checks.append((endpoint, lambda endpoint=endpoint: storage.reads(endpoint).orders.count(
+                {"restaurant_id": "default"})))
+        for label, check in checks:
+            recorder.servers.clear()
+            await check()
+            for (command, server), _ in recorder.servers.items():
+                role = "primary" if server == primary else "secondary"
+                print(f"  {label:<16} {command:<10} {server[0]}:{server[1]} ({role})")
+    finally:
+        await storage.client.drop_database(storage.db_name)
+        await storage.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
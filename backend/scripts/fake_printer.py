@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Stand-in for a network receipt printer.
+
+Listens like a printer's raw port (one connection per job), shows a text
+preview of every ticket and optionally keeps the raw ESC/POS bytes. Point the
+API at it with PRINTERS:
+
+    cd backend
+    python scripts/fake_printer.py --port 9100 --save /tmp/tickets &
+    PRINTERS=kitchen=tcp://localhost:9100 uvicorn server:app --port 8001
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from printing import to_text  # noqa: E402
+
+
+class FakePrinter:
+    """TCP server that accepts ESC/POS jobs; ``print_seconds`` simulates the print head"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, print_seconds: float = 0.0,
+                 save_dir: Optional[str] = None, quiet: bool = False):
+        self.host = host
+        self.port = port
+        self.print_seconds = print_seconds
+        self.save_dir = Path(save_dir) if save_dir else None
+        self.quiet = quiet
+        self.jobs: List[bytes] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+        # A real printer handles one job at a time
+        self._head = asyncio.Lock()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        async with self._head:
+            data = await reader.read()
+            if self.print_seconds:
+                await asyncio.sleep(self.print_seconds)
+        # Closing tells the spooler the job is taken, as a real printer does
+        writer.close()
+        if not data:
+            return
+        self.jobs.append(data)
+        if self.save_dir is not None:
+            (self.save_dir / f"job-{len(self.jobs):05d}.bin").write_bytes(data)
+        if not self.quiet:
+            print(f"--- job {len(self.jobs)} ({len(data)} bytes) ---")
+            print(to_text(data))
+
+    async def start(self) -> "FakePrinter":
+        if self.save_dir is not None:
+            self.save_dir.mkdir(parents=True, exist_ok=True)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    @property
+    def url(self) -> str:
+        return f"tcp://{self.host}:{self.port}"
+
+
+async def serve(args) -> None:
+    printer = await FakePrinter(args.host, args.port, args.print_seconds, args.save).start()
+    print(f"Fake printer listening on {printer.url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await printer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--print-seconds", type=float, default=0.0, help="simulated time to print one job")
+    parser.add_argument("--save", help="directory to keep the raw jobs in")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
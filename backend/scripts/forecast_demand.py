@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Nightly job computing demand forecasts per menu item, weekday and hour.
+
+Reads the same .env as the API. Without --restaurant every restaurant with
+orders is forecast. Run it once a night, after closing, e.g. from cron:
+
+    cd backend
+    python scripts/forecast_demand.py
+    python scripts/forecast_demand.py --restaurant default --days 180
+    # crontab: 30 3 * * * cd /path/to/backend && python scripts/forecast_demand.py
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from forecast import run_forecast  # noqa: E402
+from settings import ROOT_DIR, Settings  # noqa: E402
+from storage import create_storage  # noqa: E402
+
+
+async def run(args) -> None:
+    settings = Settings.from_env()
+    storage = create_storage(settings)
+    await storage.connect()
+    try:
+        await storage.ensure_indexes()
+        restaurant_ids = args.restaurant or await storage.orders.distinct("restaurant_id")
+        for restaurant_id in restaurant_ids:
+            await run_forecast(
+                storage,
+                restaurant_id,
+                history_days=args.days or settings.forecast_history_days,
+                tz=settings.timezone,
+                half_life_weeks=settings.forecast_half_life_weeks,
+            )
+    finally:
+        await storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--restaurant", action="append", help="restaurant id, may be repeated")
+    parser.add_argument("--days", type=int, help="days of history (default FORECAST_HISTORY_DAYS)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    load_dotenv(ROOT_DIR / ".env")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
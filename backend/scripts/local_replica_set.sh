@@ -0,0 +1,49 @@
+#!/bin/bash
+# Start a throwaway three-member replica set on localhost for testing read routing.
+#
+#   ./scripts/local_replica_set.sh start     # ports 27021-27023, data in /tmp/tp-rs
+#   ./scripts/local_replica_set.sh stop
+#
+# Then point the API at it:
+#   MONGO_URL="mongodb://localhost:27021,localhost:27022,localhost:27023/?replicaSet=tp-rs"
+
+set -e
+
+RS_NAME="${RS_NAME:-tp-rs}"
+RS_DIR="${RS_DIR:-/tmp/tp-rs}"
+PORTS=(27021 27022 27023)
+
+start() {
+    for port in "${PORTS[@]}"; do
+        mkdir -p "$RS_DIR/$port"
+        mongod --replSet "$RS_NAME" --port "$port" --bind_ip localhost \
+            --dbpath "$RS_DIR/$port" --logpath "$RS_DIR/$port.log" --fork
+    done
+    mongosh --quiet --port "${PORTS[0]}" --eval "
+        rs.initiate({
+            _id: '$RS_NAME',
+            members: [
+                {_id: 0, host: 'localhost:${PORTS[0]}', priority: 2},
+                {_id: 1, host: 'localhost:${PORTS[1]}'},
+                {_id: 2, host: 'localhost:${PORTS[2]}'}
+            ]
+        })
+    "
+    echo "Waiting for a primary..."
+    until mongosh --quiet --port "${PORTS[0]}" --eval "db.hello().isWritablePrimary" | grep -q true; do
+        sleep 1
+    done
+    echo "MONGO_URL=\"mongodb://localhost:${PORTS[0]},localhost:${PORTS[1]},localhost:${PORTS[2]}/?replicaSet=$RS_NAME\""
+}
+
+stop() {
+    for port in "${PORTS[@]}"; do
+        mongod --dbpath "$RS_DIR/$port" --shutdown || true
+    done
+}
+
+case "$1" in
+    start) start ;;
+    stop) stop ;;
+    *) echo "usage: $0 start|stop"; exit 1 ;;
+esac
@@ -1,30 +1,88 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Header, Response, Request, Depends, Query, File, UploadFile
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+from contextlib import asynccontextmanager
+import asyncio
+import io
 import logging
+import os
+import re
+import sys
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import uuid
-from datetime import datetime, timezone, timedelta
+import zipfile
+from datetime import date, datetime, timezone, timedelta
 from enum import Enum
+from zoneinfo import ZoneInfo
+
+from settings import DEFAULT_RESTAURANT_ID, Settings
+from storage import (
+    DuplicateKeyError, QueryCancelledError, QueryTimeoutError, Storage, StorageUnavailableError,
+    create_storage,
+)
+from journal import WriteJournal, apply_ops
+from eta import EtaEstimator
+from idempotency import IdempotencyStore
+from inventory import Inventory
+from invoice import InvoiceRenderer
+from export import KOT_COLUMNS, ORDER_COLUMNS, export_filename, export_media_type, stream_rows
+from menu_import import FORMATS as IMPORT_FORMATS, detect_format, import_menu, read_chunks, records
+from menu_search import MenuSearch
+from order_events import OrderEvents
+from outbox import Outbox
+from query_guard import QueryGuard, QueryGuardMiddleware, capped
+from printing import PrinterNotFoundError, PrintService, create_print_service, failed_printers
+from reports import close_day, day_window
+from reservations import ReservationConflict, Reservations, as_utc
+from stations import OPEN as OPEN_TICKETS, StationMap, advances, derive_status
+from table_allocator import TableAllocator
+from tracing import TracedJSONResponse, TracedRoute, Tracer, TracingMiddleware, command_listener, timed
+from singleflight import SingleFlight
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
-# Create the main app without a prefix
-app = FastAPI(title="Taste Paradise API", version="1.0.0")
+# Database connection, opened per worker process by the app lifespan
+storage: Optional[Storage] = None
+# Local journal that order and KOT writes land in first (None when disabled)
+journal: Optional[WriteJournal] = None
+# Stored responses for requests sent with an Idempotency-Key header
+idempotency: Optional[IdempotencyStore] = None
+# Shares identical concurrent dashboard/orders/tables reads, see singleflight.py
+read_coalescer: SingleFlight = SingleFlight()
+# In-memory menu search indexes, see menu_search.py
+menu_search: Optional[MenuSearch] = None
+# Learned kitchen times behind order ETAs, see eta.py
+eta_estimator: Optional[EtaEstimator] = None
+# Ingredient stock and the menu availability it allows, see inventory.py
+inventory: Optional[Inventory] = None
+# Order creation and status events behind the heatmaps, see order_events.py
+order_events: Optional[OrderEvents] = None
+# Table bookings and their per-table schedules, see reservations.py
+reservations: Optional[Reservations] = None
+# In-memory floor used to seat walk-ins, see table_allocator.py
+table_allocator: Optional[TableAllocator] = None
+# Side effects run after the response, see outbox.py
+outbox: Optional[Outbox] = None
+# Which kitchen station cooks which menu category, see stations.py
+station_map: StationMap = StationMap({})
+# Invoice PDFs, rendered in a process pool, see invoice.py
+invoice_renderer: Optional[InvoiceRenderer] = None
+# Where the restaurant's days and hours are counted, the TIMEZONE setting
+local_timezone: ZoneInfo = ZoneInfo("UTC")
+# KOT and bill printers, see printing/ (None when PRINTERS is not set)
+print_service: Optional[PrintService] = None
+# Time limits and result caps for each request's reads, see query_guard.py
+query_guard: Optional[QueryGuard] = None
+# Sampled request traces, see tracing.py
+tracer: Optional[Tracer] = None
 
 # Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=TracedRoute, default_response_class=TracedJSONResponse)
 
 # Enums
 class OrderStatus(str, Enum):
@@ -53,9 +111,26 @@ class TableStatus(str, Enum):
     RESERVED = "reserved"
     CLEANING = "cleaning"
 
+class ReservationStatus(str, Enum):
+    BOOKED = "booked"
+    SEATED = "seated"
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+    NO_SHOW = "no_show"
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
 # Models
+class RecipeIngredient(BaseModel):
+    ingredient_id: str
+    # In the ingredient's unit, per portion
+    quantity: float = Field(gt=0)
+
 class MenuItem(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    restaurant_id: str = DEFAULT_RESTAURANT_ID
     name: str
     description: str = ""
     price: float
@@ -63,6 +138,7 @@ class MenuItem(BaseModel):
     image_url: Optional[str] = None
     is_available: bool = True
     preparation_time: int = 15  # in minutes
+    recipe: List[RecipeIngredient] = []
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class MenuItemCreate(BaseModel):
@@ -73,6 +149,36 @@ class MenuItemCreate(BaseModel):
     image_url: Optional[str] = None
     preparation_time: int = 15
 
+class Ingredient(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    restaurant_id: str = DEFAULT_RESTAURANT_ID
+    name: str
+    unit: str = ""
+    quantity: float = 0
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class IngredientCreate(BaseModel):
+    name: str
+    unit: str = ""
+    quantity: float = 0
+
+class StockAdjustment(BaseModel):
+    # Added to the stock; negative for waste
+    quantity: float
+
+class MenuImportError(BaseModel):
+    row: int
+    error: str
+
+class MenuImportReport(BaseModel):
+    rows: int
+    inserted: int
+    updated: int
+    failed: int
+    complete: bool
+    errors: List[MenuImportError]
+
 class OrderItem(BaseModel):
     menu_item_id: str
     menu_item_name: str
@@ -82,8 +188,10 @@ class OrderItem(BaseModel):
 
 class Order(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    restaurant_id: str = DEFAULT_RESTAURANT_ID
     customer_name: str = ""
     table_number: Optional[str] = None
+    party_size: Optional[int] = None
     items: List[OrderItem]
     total_amount: float
     status: OrderStatus = OrderStatus.PENDING
@@ -97,8 +205,15 @@ class Order(BaseModel):
 class OrderCreate(BaseModel):
     customer_name: str = ""
     table_number: Optional[str] = None
+    # Without a table_number, seats the party at the best free table
+    party_size: Optional[int] = Field(None, ge=1)
     items: List[OrderItem]
 
+class OrderSearchPage(BaseModel):
+    orders: List[Order]
+    # Pass back as cursor for the next page; None on the last one
+    next_cursor: Optional[str] = None
+
 class OrderUpdate(BaseModel):
     status: Optional[OrderStatus] = None
     payment_status: Optional[PaymentStatus] = None
@@ -106,6 +221,7 @@ class OrderUpdate(BaseModel):
 
 class KOT(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    restaurant_id: str = DEFAULT_RESTAURANT_ID
     order_id: str
     order_number: str
     table_number: Optional[str] = None
@@ -113,6 +229,117 @@ class KOT(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     status: OrderStatus = OrderStatus.PENDING
 
+class StationTicket(BaseModel):
+    """The part of a KOT cooked at one kitchen station"""
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    restaurant_id: str = DEFAULT_RESTAURANT_ID
+    kot_id: str
+    order_id: str
+    order_number: str
+    station: str
+    # Running number at this station; None for tickets taken while the database was unreachable
+    number: Optional[int] = None
+    table_number: Optional[str] = None
+    items: List[OrderItem]
+    status: OrderStatus = OrderStatus.PENDING
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: Optional[datetime] = None
+
+class StationTicketUpdate(BaseModel):
+    status: OrderStatus
+
+class StationQueue(BaseModel):
+    station: str
+    pending: int
+    cooking: int
+
+class HourForecast(BaseModel):
+    hour: int
+    expected: float
+    upper: float
+
+class ItemForecast(BaseModel):
+    menu_item_id: str
+    menu_item_name: str
+    expected: float
+    upper: float
+    hours: List[HourForecast]
+
+class DemandForecast(BaseModel):
+    date: date
+    weekday: int
+    generated_at: Optional[datetime] = None
+    # Prep list: what each item is expected to sell over the day, busiest first
+    items: List[ItemForecast]
+    # Staffing: all items together per hour
+    hours: List[HourForecast]
+
+class ReportTotal(BaseModel):
+    count: int
+    amount: float
+
+class PaymentMethodTotal(ReportTotal):
+    method: Optional[str] = None
+
+class ItemSales(BaseModel):
+    menu_item_id: str
+    menu_item_name: str = ""
+    quantity: float
+    amount: float
+
+class TaxLine(BaseModel):
+    name: str
+    rate: float
+    amount: float
+
+class DayReport(BaseModel):
+    """End-of-day (Z) report; a snapshot taken when the day was closed, see reports.py"""
+    id: str
+    restaurant_id: str
+    date: date
+    timezone: str
+    window_start: datetime
+    window_end: datetime
+    closed_at: datetime
+    orders: int
+    # Everything below leaves cancelled orders out, except cancellations
+    gross_sales: float
+    average_order: float
+    taxable_value: float
+    taxes: List[TaxLine]
+    paid: ReportTotal
+    pending_payments: ReportTotal
+    cancellations: ReportTotal
+    payment_methods: List[PaymentMethodTotal]
+    items: List[ItemSales]
+
+class CloseDayRequest(BaseModel):
+    # The business day to close, today in the restaurant's timezone by default
+    day: Optional[date] = Field(None, alias="date")
+    # Close today before midnight, once the last bill is settled
+    force: bool = False
+
+class OrderHeatmap(BaseModel):
+    timezone: str
+    status: OrderStatus
+    table_number: Optional[str] = None
+    start: datetime
+    end: datetime
+    # counts[weekday][hour], Monday first, in the restaurant's timezone
+    counts: List[List[int]]
+
+class ThroughputBucket(BaseModel):
+    start: datetime
+    # Status -> orders that reached it in the bucket
+    counts: Dict[str, int]
+
+class Throughput(BaseModel):
+    start: datetime
+    end: datetime
+    bucket_minutes: int
+    buckets: List[ThroughputBucket]
+    per_hour: Dict[str, float]
+
 class DashboardStats(BaseModel):
     today_orders: int
     today_revenue: float
@@ -125,6 +352,7 @@ class DashboardStats(BaseModel):
 
 class RestaurantTable(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    restaurant_id: str = DEFAULT_RESTAURANT_ID
     table_number: str
     capacity: int = 4
     status: TableStatus = TableStatus.AVAILABLE
@@ -143,6 +371,51 @@ class TableUpdate(BaseModel):
     status: Optional[TableStatus] = None
     current_order_id: Optional[str] = None
 
+class OrderSummary(BaseModel):
+    id: str
+    customer_name: str = ""
+    items_count: int
+    total_amount: float
+    status: OrderStatus
+    payment_status: PaymentStatus
+    created_at: datetime
+    elapsed_minutes: int = 0
+
+class FloorTable(RestaurantTable):
+    current_order: Optional[OrderSummary] = None
+
+class FloorPlan(BaseModel):
+    version: int
+    tables: List[FloorTable]
+
+class Reservation(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    restaurant_id: str = DEFAULT_RESTAURANT_ID
+    table_id: str
+    table_number: str
+    customer_name: str
+    phone: str = ""
+    party_size: int
+    start_at: datetime
+    end_at: datetime
+    status: ReservationStatus = ReservationStatus.BOOKED
+    notes: str = ""
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class ReservationCreate(BaseModel):
+    customer_name: str
+    phone: str = ""
+    party_size: int = Field(..., ge=1)
+    start_at: datetime
+    # Defaults to start_at plus the usual sitting length
+    end_at: Optional[datetime] = None
+    # Picked with the best-fit search when left out
+    table_number: Optional[str] = None
+    notes: str = ""
+
+class ReservationUpdate(BaseModel):
+    status: ReservationStatus
+
 def prepare_for_mongo(data: Dict[str, Any]) -> Dict[str, Any]:
     """Convert datetime objects to ISO strings for MongoDB storage"""
     for key, value in data.items():
@@ -154,6 +427,7 @@ def prepare_for_mongo(data: Dict[str, Any]) -> Dict[str, Any]:
                     value[i] = prepare_for_mongo(item)
     return data
 
+@timed("parse_from_mongo")
 def parse_from_mongo(item: Dict[str, Any]) -> Dict[str, Any]:
     """Convert ISO strings back to datetime objects"""
     if '_id' in item:
@@ -171,200 +445,866 @@ def parse_from_mongo(item: Dict[str, Any]) -> Dict[str, Any]:
                     value[i] = parse_from_mongo(subitem)
     return item
 
+RESTAURANT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+def get_restaurant_id(request: Request, x_restaurant_id: Optional[str] = Header(None)) -> str:
+    """Tenant scope of the request, from the X-Restaurant-Id header"""
+    restaurant_id = x_restaurant_id or request.app.state.settings.default_restaurant_id
+    if not RESTAURANT_ID_PATTERN.match(restaurant_id):
+        raise HTTPException(status_code=400, detail="Invalid X-Restaurant-Id header")
+    return restaurant_id
+
+async def next_sequence(restaurant_id: str, name: str, seed_collection: str,
+                        seed_filters: Optional[Dict[str, Any]] = None) -> int:
+    """Per-restaurant counter, seeded from the existing documents the first time it is used"""
+    counters = storage.collection("counters")
+    key = {"restaurant_id": restaurant_id, "name": name}
+    if await counters.find_one(key) is None:
+        seed = await storage.collection(seed_collection).count({"restaurant_id": restaurant_id, **(seed_filters or {})})
+        try:
+            await counters.insert_one({**key, "value": seed})
+        except DuplicateKeyError:
+            # Another request seeded it first
+            pass
+    counter = await counters.find_one_and_update(key, inc={"value": 1})
+    return counter["value"]
+
+def invalidate_reads() -> None:
+    """Drop coalesced reads after a write to orders or tables"""
+    read_coalescer.invalidate()
+
+def floor_version_op(restaurant_id: str) -> Dict[str, Any]:
+    """Operation that moves the restaurant's floor version on, invalidating cached /api/floor views"""
+    return {
+        "collection": "counters",
+        "op": "update",
+        "filter": {"restaurant_id": restaurant_id, "name": "floor"},
+        "inc": {"value": 1},
+        "upsert": True
+    }
+
+async def floor_changed(restaurant_id: str) -> None:
+    """Call after a direct (not journaled) order or table write"""
+    invalidate_reads()
+    if journal is not None and not journal.online:
+        return
+    try:
+        await apply_ops(storage, [floor_version_op(restaurant_id)])
+    except StorageUnavailableError:
+        logger.warning("Could not bump floor version for restaurant %s", restaurant_id)
+
+async def journaled_write(ops: List[Dict[str, Any]], effects: Optional[List[Dict[str, Any]]] = None) -> None:
+    """Write order/KOT operations through the local journal when it is enabled.
+
+    ``effects`` are outbox entries stored in the same write and run once it is in the database.
+    """
+    effects = effects or []
+    ops = ops + [Outbox.op(entry) for entry in effects]
+    try:
+        if journal is not None:
+            applied = await journal.write(ops)
+        else:
+            await apply_ops(storage, ops)
+            applied = True
+    finally:
+        invalidate_reads()
+    if applied:
+        outbox.dispatch(effects)
+
+async def find_document(collection: str, filters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Fetch an order or KOT, falling back to the journal for writes made while offline"""
+    if journal is None:
+        return await storage.collection(collection).find_one(filters)
+    doc = None
+    if journal.online:
+        try:
+            doc = await storage.collection(collection).find_one(filters)
+        except StorageUnavailableError:
+            journal.mark_offline()
+    return doc or journal.find_pending(collection, filters)
+
 # Menu Management Endpoints
 @api_router.post("/menu", response_model=MenuItem)
-async def create_menu_item(item: MenuItemCreate):
-    menu_item = MenuItem(**item.dict())
+async def create_menu_item(item: MenuItemCreate, restaurant_id: str = Depends(get_restaurant_id)):
+    menu_item = MenuItem(**item.dict(), restaurant_id=restaurant_id)
     item_dict = prepare_for_mongo(menu_item.dict())
-    await db.menu_items.insert_one(item_dict)
+    await storage.menu_items.insert_one(item_dict)
+    menu_search.item_saved(restaurant_id, item_dict)
     return menu_item
 
 @api_router.get("/menu", response_model=List[MenuItem])
-async def get_menu():
-    items = await db.menu_items.find().to_list(length=None)
-    return [MenuItem(**parse_from_mongo(item)) for item in items]
+async def get_menu(restaurant_id: str = Depends(get_restaurant_id)):
+    items, availability = await asyncio.gather(
+        capped(storage.menu_items, {"restaurant_id": restaurant_id}), inventory.availability(restaurant_id)
+    )
+    return [MenuItem(**with_stock(parse_from_mongo(item), availability)) for item in items]
+
+def with_stock(item: Dict[str, Any], availability: Dict[str, bool]) -> Dict[str, Any]:
+    """Also unavailable when the stock no longer covers the item's recipe"""
+    item["is_available"] = item.get("is_available", True) and availability.get(item["id"], True)
+    return item
 
 @api_router.get("/menu/categories")
-async def get_categories():
-    categories = await db.menu_items.distinct("category")
+async def get_categories(restaurant_id: str = Depends(get_restaurant_id)):
+    categories = await storage.menu_items.distinct("category", {"restaurant_id": restaurant_id})
     return {"categories": categories}
 
+@api_router.get("/menu/search", response_model=List[MenuItem])
+async def search_menu(q: str = Query(..., min_length=1, max_length=100), limit: int = Query(20, ge=1, le=100),
+                      restaurant_id: str = Depends(get_restaurant_id)):
+    """Prefix and typo tolerant search over names, descriptions and categories"""
+    items, availability = await asyncio.gather(
+        menu_search.search(restaurant_id, q, limit), inventory.availability(restaurant_id)
+    )
+    return [MenuItem(**with_stock(parse_from_mongo(dict(item)), availability)) for item in items]
+
+@api_router.post("/menu/import", response_model=MenuImportReport)
+async def import_menu_items(request: Request, file: UploadFile = File(...), format: Optional[str] = None,
+                            restaurant_id: str = Depends(get_restaurant_id)):
+    """Create or update menu items from a CSV or JSON file, matched on category and name"""
+    fmt = format or detect_format(file.filename, file.content_type)
+    if fmt not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Upload a .csv or .json file, or pass format=csv|json")
+    report = await import_menu(
+        storage.menu_items, restaurant_id, records(read_chunks(file), fmt), MenuItemCreate,
+        batch_size=request.app.state.settings.menu_import_batch_size
+    )
+    if report.inserted or report.updated:
+        menu_search.forget(restaurant_id)
+    return report
+
 @api_router.put("/menu/{item_id}", response_model=MenuItem)
-async def update_menu_item(item_id: str, update_data: MenuItemCreate):
+async def update_menu_item(item_id: str, update_data: MenuItemCreate,
+                           restaurant_id: str = Depends(get_restaurant_id)):
     item_dict = update_data.dict()
     item_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
     
-    result = await db.menu_items.update_one(
-        {"id": item_id},
-        {"$set": prepare_for_mongo(item_dict)}
+    matched = await storage.menu_items.update_one(
+        {"restaurant_id": restaurant_id, "id": item_id},
+        set=prepare_for_mongo(item_dict)
     )
     
-    if result.matched_count == 0:
+    if matched == 0:
         raise HTTPException(status_code=404, detail="Menu item not found")
     
-    updated_item = await db.menu_items.find_one({"id": item_id})
+    updated_item = await storage.menu_items.find_one({"restaurant_id": restaurant_id, "id": item_id})
+    menu_search.item_saved(restaurant_id, dict(updated_item))
     return MenuItem(**parse_from_mongo(updated_item))
 
 @api_router.delete("/menu/{item_id}")
-async def delete_menu_item(item_id: str):
-    result = await db.menu_items.delete_one({"id": item_id})
-    if result.deleted_count == 0:
+async def delete_menu_item(item_id: str, restaurant_id: str = Depends(get_restaurant_id)):
+    deleted = await storage.menu_items.delete_one({"restaurant_id": restaurant_id, "id": item_id})
+    if deleted == 0:
         raise HTTPException(status_code=404, detail="Menu item not found")
+    menu_search.item_deleted(restaurant_id, item_id)
     return {"message": "Menu item deleted successfully"}
 
+@api_router.put("/menu/{item_id}/recipe", response_model=MenuItem)
+async def update_recipe(item_id: str, recipe: List[RecipeIngredient], restaurant_id: str = Depends(get_restaurant_id)):
+    """Set the ingredients one portion of a menu item uses; orders then deduct them from the stock"""
+    ingredient_ids = {line.ingredient_id for line in recipe}
+    known = await storage.collection("inventory").count(
+        {"restaurant_id": restaurant_id, "id": {"$in": list(ingredient_ids)}}
+    )
+    if known != len(ingredient_ids):
+        raise HTTPException(status_code=400, detail="Unknown ingredient in recipe")
+    lines = [line.dict() for line in recipe]
+    matched = await storage.menu_items.update_one(
+        {"restaurant_id": restaurant_id, "id": item_id},
+        set={"recipe": lines, "updated_at": datetime.now(timezone.utc).isoformat()}
+    )
+    if matched == 0:
+        raise HTTPException(status_code=404, detail="Menu item not found")
+    await inventory.recipe_saved(restaurant_id, item_id, lines)
+    updated_item = await storage.menu_items.find_one({"restaurant_id": restaurant_id, "id": item_id})
+    menu_search.item_saved(restaurant_id, dict(updated_item))
+    return MenuItem(**parse_from_mongo(updated_item))
+
+# Inventory Endpoints
+@api_router.post("/inventory", response_model=Ingredient)
+async def create_ingredient(data: IngredientCreate, restaurant_id: str = Depends(get_restaurant_id)):
+    ingredient = Ingredient(**data.dict(), restaurant_id=restaurant_id)
+    await storage.collection("inventory").insert_one(prepare_for_mongo(ingredient.dict()))
+    await inventory.levels_changed(restaurant_id, [ingredient.id])
+    return ingredient
+
+@api_router.get("/inventory", response_model=List[Ingredient])
+async def get_inventory(restaurant_id: str = Depends(get_restaurant_id)):
+    ingredients = await capped(storage.collection("inventory"), {"restaurant_id": restaurant_id}, sort=[("name", 1)])
+    return [Ingredient(**parse_from_mongo(ingredient)) for ingredient in ingredients]
+
+@api_router.put("/inventory/{ingredient_id}", response_model=Ingredient)
+async def update_ingredient(ingredient_id: str, data: IngredientCreate,
+                            restaurant_id: str = Depends(get_restaurant_id)):
+    """Rename an ingredient or set its stock after a count"""
+    ingredient = await storage.collection("inventory").find_one_and_update(
+        {"restaurant_id": restaurant_id, "id": ingredient_id},
+        set={**data.dict(), "updated_at": datetime.now(timezone.utc).isoformat()}
+    )
+    if ingredient is None:
+        raise HTTPException(status_code=404, detail="Ingredient not found")
+    await inventory.levels_changed(restaurant_id, [ingredient_id], restocked=True)
+    return Ingredient(**parse_from_mongo(ingredient))
+
+@api_router.post("/inventory/{ingredient_id}/restock", response_model=Ingredient)
+async def restock_ingredient(ingredient_id: str, adjustment: StockAdjustment,
+                             restaurant_id: str = Depends(get_restaurant_id)):
+    """Add a delivery to the stock (or take waste off it); concurrent orders keep deducting"""
+    ingredient = await storage.collection("inventory").find_one_and_update(
+        {"restaurant_id": restaurant_id, "id": ingredient_id},
+        set={"updated_at": datetime.now(timezone.utc).isoformat()}, inc={"quantity": adjustment.quantity}
+    )
+    if ingredient is None:
+        raise HTTPException(status_code=404, detail="Ingredient not found")
+    await inventory.levels_changed(restaurant_id, [ingredient_id], restocked=adjustment.quantity > 0)
+    return Ingredient(**parse_from_mongo(ingredient))
+
 # Order Management Endpoints
 @api_router.post("/orders", response_model=Order)
-async def create_order(order_data: OrderCreate):
+async def create_order(order_data: OrderCreate, response: Response,
+                       idempotency_key: Optional[str] = Header(None),
+                       restaurant_id: str = Depends(get_restaurant_id)):
+    result, replayed = await idempotency.run(
+        restaurant_id, "orders", idempotency_key, order_data, lambda: place_order(restaurant_id, order_data)
+    )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+async def place_order(restaurant_id: str, order_data: OrderCreate) -> Order:
     # Calculate total amount
     total_amount = sum(item.quantity * item.price for item in order_data.items)
     
-    # Calculate estimated completion time
-    max_prep_time = 30  # default max prep time
-    for item in order_data.items:
-        menu_item = await db.menu_items.find_one({"id": item.menu_item_id})
-        if menu_item:
-            max_prep_time = max(max_prep_time, menu_item.get('preparation_time', 15))
+    # Calculate estimated completion time from the kitchen's load and learned prep times
+    eta_minutes = 30  # default when the database cannot be asked
+    queue_depth = None
+    # Unknown while offline; the deduction then finds out once the order is replayed
+    stock_tracked = None
+    if journal is None or journal.online:
+        try:
+            item_ids = [item.menu_item_id for item in order_data.items]
+            menu_items, queue_depth = await asyncio.gather(
+                storage.menu_items.find({"restaurant_id": restaurant_id, "id": {"$in": list(set(item_ids))}}),
+                storage.orders.count({
+                    "restaurant_id": restaurant_id,
+                    "status": {"$in": [OrderStatus.PENDING, OrderStatus.COOKING]}
+                }),
+            )
+            prep_minutes = {menu_item['id']: menu_item.get('preparation_time', 15) for menu_item in menu_items}
+            eta_minutes = await eta_estimator.estimate(restaurant_id, item_ids, prep_minutes, queue_depth)
+            stock_tracked = bool((await inventory.book(restaurant_id)).needed(order_data.dict()["items"]))
+        except StorageUnavailableError:
+            # Keep taking orders during an outage, the ETA falls back to the default
+            if journal is None:
+                raise
+            journal.mark_offline()
     
     estimated_completion = datetime.now(timezone.utc).replace(microsecond=0) + \
-                          timedelta(minutes=max_prep_time)
+                          timedelta(minutes=round(eta_minutes))
     
     order = Order(
         **order_data.dict(),
+        restaurant_id=restaurant_id,
         total_amount=total_amount,
         estimated_completion=estimated_completion
     )
     
+    table_numbers = [order.table_number] if order.table_number else []
+    if not table_numbers and order.party_size:
+        table_numbers = await seat_walk_in(restaurant_id, order.id, order.party_size)
+        order.table_number = table_numbers[0]
+    
     order_dict = prepare_for_mongo(order.dict())
-    await db.orders.insert_one(order_dict)
+    # Searched by prefix in any case, see search_orders
+    order_dict['customer_name_lc'] = order.customer_name.casefold()
+    if queue_depth is not None:
+        # What the kitchen had open when the order came in, which the ETA model learns from
+        order_dict['queue_depth'] = queue_depth
     
-    # If table number is provided, update the table status
-    if order.table_number:
-        await db.tables.update_one(
-            {"table_number": order.table_number},
-            {"$set": {"status": "occupied", "current_order_id": order.id}}
-        )
+    # The table status is updated in the background once the order is stored
+    effects = []
+    if stock_tracked is not False:
+        effects.append(outbox.entry(restaurant_id, "inventory.deduct", {"order_id": order.id}))
+    effects.append(outbox.entry(restaurant_id, "order_events.record", OrderEvents.payload(
+        order.id, OrderStatus.PENDING.value, order.table_number, order_dict['created_at']
+    )))
+    if table_numbers:
+        effects.append(outbox.entry(restaurant_id, "tables.occupy", {
+            "order_id": order.id, "table_numbers": table_numbers
+        }))
+    for table_number in table_numbers:
+        table_allocator.set_status(restaurant_id, table_number, "occupied")
     
+    try:
+        await journaled_write([{"collection": "orders", "op": "insert", "doc": order_dict}], effects)
+    except Exception:
+        # The order does not exist, so nothing would ever clear the tables held for it
+        await release_tables(restaurant_id, order.id, table_numbers)
+        raise
+    menu_search.items_ordered(restaurant_id, order.items)
     return order
 
+async def seat_walk_in(restaurant_id: str, order_id: str, party_size: int) -> List[str]:
+    """Pick and claim the best free table(s) for a walk-in party"""
+    book = await reservations.book_for(restaurant_id)
+    now = datetime.now(timezone.utc).timestamp()
+    until = now + table_allocator.sitting_minutes * 60
+
+    def not_booked(table: Dict[str, Any]) -> bool:
+        schedule = book.schedules.get(table["id"])
+        return schedule is None or schedule.is_free(now, until)
+
+    for _ in range(3):
+        tables = await table_allocator.allocate(restaurant_id, party_size, not_booked)
+        if not tables:
+            raise HTTPException(status_code=409, detail=f"No free table for a party of {party_size}")
+        if journal is not None and not journal.online:
+            # Nothing to claim against; the tables.occupy outbox entry seats them once replayed
+            break
+        claimed = []
+        try:
+            for table in tables:
+                if not await storage.tables.update_one(
+                    {"restaurant_id": restaurant_id, "id": table["id"], "status": "available"},
+                    set={"status": "occupied", "current_order_id": order_id}
+                ):
+                    break
+                claimed.append(table)
+        except StorageUnavailableError:
+            if journal is None:
+                raise
+            journal.mark_offline()
+            break
+        if len(claimed) == len(tables):
+            break
+        # Another worker seated someone there first; give back what we took and look again
+        await release_tables(restaurant_id, order_id, [table["table_number"] for table in claimed])
+    else:
+        raise HTTPException(status_code=409, detail=f"No free table for a party of {party_size}")
+    return [table["table_number"] for table in tables]
+
+async def release_tables(restaurant_id: str, order_id: str, table_numbers: List[str]) -> None:
+    """Free the tables still held for ``order_id``; tables given to anyone else are left alone"""
+    try:
+        for table_number in table_numbers:
+            await storage.tables.update_one(
+                {"restaurant_id": restaurant_id, "table_number": table_number, "current_order_id": order_id},
+                set={"status": "available", "current_order_id": None}
+            )
+    except StorageUnavailableError:
+        if journal is None:
+            raise
+        journal.mark_offline()
+    finally:
+        table_allocator.forget(restaurant_id)
+
 @api_router.get("/orders", response_model=List[Order])
-async def get_orders(status: Optional[OrderStatus] = None):
-    filter_query = {}
+async def get_orders(status: Optional[OrderStatus] = None, restaurant_id: str = Depends(get_restaurant_id)):
+    return await read_coalescer.do(("orders", restaurant_id, status), lambda: load_orders(restaurant_id, status))
+
+async def load_orders(restaurant_id: str, status: Optional[OrderStatus]) -> List[Order]:
+    filter_query = {"restaurant_id": restaurant_id}
     if status:
         filter_query["status"] = status
     
-    orders = await db.orders.find(filter_query).sort("created_at", -1).to_list(length=None)
+    orders = await capped(storage.orders, filter_query, sort=[("created_at", -1)])
     return [Order(**parse_from_mongo(order)) for order in orders]
 
+def prefix_range(prefix: str) -> Dict[str, str]:
+    """Filter for the strings starting with ``prefix``"""
+    last = ord(prefix[-1])
+    if last == sys.maxunicode:
+        # Nothing sorts after it, the lower bound alone is as close as it gets
+        return {"$gte": prefix}
+    # Surrogates cannot be encoded, so the character after U+D7FF is U+E000
+    following = 0xE000 if 0xD7FF <= last < 0xE000 else last + 1
+    return {"$gte": prefix, "$lt": prefix[:-1] + chr(following)}
+
+@api_router.get("/orders/search", response_model=OrderSearchPage)
+async def search_orders(q: Optional[str] = Query(None, min_length=1, max_length=100),
+                        table_number: Optional[str] = None, status: Optional[OrderStatus] = None,
+                        payment_status: Optional[PaymentStatus] = None,
+                        start: Optional[datetime] = None, end: Optional[datetime] = None,
+                        limit: int = Query(50, ge=1, le=200), cursor: Optional[str] = None,
+                        restaurant_id: str = Depends(get_restaurant_id)):
+    """Newest first, by customer name prefix (any case), table, status, payment status and date range"""
+    filter_query: Dict[str, Any] = {"restaurant_id": restaurant_id}
+    q = q.strip() if q else None
+    if q:
+        # A range rather than a regex so the name index serves it
+        filter_query["customer_name_lc"] = prefix_range(q.casefold())
+    if table_number:
+        filter_query["table_number"] = table_number
+    if status:
+        filter_query["status"] = status
+    if payment_status:
+        filter_query["payment_status"] = payment_status
+    created_at: Dict[str, Any] = {}
+    if start:
+        created_at["$gte"] = as_utc(start).isoformat()
+    if end:
+        created_at["$lt"] = as_utc(end).isoformat()
+    if cursor:
+        # Keyset pagination: carry on after the last order of the previous page, however deep
+        last_created_at, _, last_id = cursor.partition("|")
+        if not last_id:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        # The plain range lets the index skip straight there, the $or breaks ties on created_at
+        created_at["$lte"] = last_created_at
+        filter_query["$or"] = [
+            {"created_at": {"$lt": last_created_at}},
+            {"created_at": last_created_at, "id": {"$lt": last_id}},
+        ]
+    if created_at:
+        filter_query["created_at"] = created_at
+    orders = await storage.reads("order_history").orders.find(
+        filter_query, sort=[("created_at", -1), ("id", -1)], limit=limit + 1
+    )
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = f"{orders[-1]['created_at']}|{orders[-1]['id']}"
+    return OrderSearchPage(orders=[Order(**parse_from_mongo(order)) for order in orders], next_cursor=next_cursor)
+
 @api_router.get("/orders/{order_id}", response_model=Order)
-async def get_order(order_id: str):
-    order = await db.orders.find_one({"id": order_id})
+async def get_order(order_id: str, restaurant_id: str = Depends(get_restaurant_id)):
+    order = await storage.orders.find_one({"restaurant_id": restaurant_id, "id": order_id})
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     return Order(**parse_from_mongo(order))
 
 @api_router.put("/orders/{order_id}", response_model=Order)
-async def update_order(order_id: str, update_data: OrderUpdate):
+async def update_order(order_id: str, update_data: OrderUpdate, restaurant_id: str = Depends(get_restaurant_id)):
     update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
     update_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
+    if update_data.status:
+        # When each status was reached, e.g. cooking_at and ready_at, for the ETA model
+        update_dict[f"{update_data.status.value}_at"] = update_dict['updated_at']
     
-    result = await db.orders.update_one(
-        {"id": order_id},
-        {"$set": update_dict}
+    matched = await storage.orders.update_one(
+        {"restaurant_id": restaurant_id, "id": order_id},
+        set=update_dict
     )
     
-    if result.matched_count == 0:
+    if matched == 0:
         raise HTTPException(status_code=404, detail="Order not found")
+    await floor_changed(restaurant_id)
     
-    updated_order = await db.orders.find_one({"id": order_id})
+    if update_data.status == OrderStatus.CANCELLED:
+        # Take the order off every station's queue
+        await storage.station_tickets.update_many(
+            {"restaurant_id": restaurant_id, "order_id": order_id, "status": {"$in": OPEN_TICKETS}},
+            set={"status": OrderStatus.CANCELLED, "updated_at": update_dict['updated_at']}
+        )
+        invalidate_reads()
+    
+    updated_order = await storage.orders.find_one({"restaurant_id": restaurant_id, "id": order_id})
+    if update_data.status:
+        await record_status_event(restaurant_id, order_id, update_data.status.value,
+                                  updated_order.get("table_number"), update_dict['updated_at'])
     return Order(**parse_from_mongo(updated_order))
 
+async def record_status_event(restaurant_id: str, order_id: str, status: str, table_number: Optional[str],
+                              at: str) -> None:
+    """Add a status change to order_events, through the outbox like the other side effects"""
+    await journaled_write([], [outbox.entry(
+        restaurant_id, "order_events.record", OrderEvents.payload(order_id, status, table_number, at)
+    )])
+
 # KOT Endpoints
+async def item_categories(restaurant_id: str, items: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Menu category of each ordered item, which decides its station and printer"""
+    menu_items = await storage.menu_items.find({
+        "restaurant_id": restaurant_id,
+        "id": {"$in": list({item["menu_item_id"] for item in items})}
+    })
+    return {menu_item["id"]: menu_item.get("category", "") for menu_item in menu_items}
+
 @api_router.post("/kot/{order_id}", response_model=KOT)
-async def generate_kot(order_id: str):
-    order = await db.orders.find_one({"id": order_id})
+async def generate_kot(order_id: str, response: Response,
+                       idempotency_key: Optional[str] = Header(None),
+                       restaurant_id: str = Depends(get_restaurant_id)):
+    result, replayed = await idempotency.run(
+        restaurant_id, "kot", idempotency_key, {"order_id": order_id}, lambda: create_kot(restaurant_id, order_id)
+    )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+async def create_kot(restaurant_id: str, order_id: str) -> KOT:
+    order = await find_document("orders", {"restaurant_id": restaurant_id, "id": order_id})
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    order_obj = Order(**parse_from_mongo(order))
+    # Only one KOT per order; a repeated call returns the ticket already sent to the kitchen
+    existing_kot = await find_document("kots", {"restaurant_id": restaurant_id, "order_id": order_id})
+    if existing_kot:
+        return KOT(**parse_from_mongo(existing_kot))
     
-    # Generate KOT number
-    kot_count = await db.kots.count_documents({}) + 1
-    order_number = f"ORD-{kot_count:04d}"
+    order_obj = Order(**parse_from_mongo(order))
     
     kot = KOT(
+        restaurant_id=restaurant_id,
         order_id=order_id,
-        order_number=order_number,
+        order_number="",
         table_number=order_obj.table_number,
         items=order_obj.items
     )
     
+    items = [item.dict() for item in kot.items]
+    categories: Dict[str, str] = {}
+    
+    # Generate KOT number
+    if journal is None or journal.online:
+        try:
+            kot_count = await next_sequence(restaurant_id, "kot", "kots")
+            kot.order_number = f"ORD-{kot_count:04d}"
+            categories = await item_categories(restaurant_id, items)
+        except StorageUnavailableError:
+            if journal is None:
+                raise
+            journal.mark_offline()
+    if not kot.order_number:
+        # The running count lives in the database; offline tickets get a unique provisional number
+        kot.order_number = f"OFF-{kot.id[:8].upper()}"
+    
+    # Split between the kitchen stations; without the menu (offline) it all goes to the default station
+    tickets = [
+        StationTicket(restaurant_id=restaurant_id, kot_id=kot.id, order_id=order_id, order_number=kot.order_number,
+                      station=station, table_number=kot.table_number, items=station_items)
+        for station, station_items in station_map.split(items, categories).items()
+    ]
+    if categories:
+        try:
+            numbers = await asyncio.gather(*(
+                next_sequence(restaurant_id, f"station:{ticket.station}", "station_tickets", {"station": ticket.station})
+                for ticket in tickets
+            ))
+            for ticket, number in zip(tickets, numbers):
+                ticket.number = number
+        except StorageUnavailableError:
+            if journal is None:
+                raise
+            journal.mark_offline()
+    
     kot_dict = prepare_for_mongo(kot.dict())
-    await db.kots.insert_one(kot_dict)
     
-    # Mark order as KOT generated
-    await db.orders.update_one(
-        {"id": order_id},
-        {"$set": {"kot_generated": True}}
-    )
+    # Tickets go to the kitchen printers in the background
+    effects = []
+    if print_service is not None:
+        effects.append(outbox.entry(restaurant_id, "kots.print", {"kot_id": kot.id, "order_id": order_id}))
     
-    return kot
+    # Store the KOT and its station tickets and mark the order as KOT generated
+    await journaled_write([
+        {"collection": "kots", "op": "insert", "doc": kot_dict},
+        *({"collection": "station_tickets", "op": "insert", "doc": prepare_for_mongo(ticket.dict())}
+          for ticket in tickets),
+        {
+            "collection": "orders",
+            "op": "update",
+            "filter": {"restaurant_id": restaurant_id, "id": order_id},
+            "set": {"kot_generated": True}
+        },
+    ], effects)
+    
+    # A concurrent call may have won the unique order_id index, return the stored ticket
+    stored_kot = await find_document("kots", {"restaurant_id": restaurant_id, "order_id": order_id})
+    return KOT(**parse_from_mongo(stored_kot)) if stored_kot else kot
 
 @api_router.get("/kot", response_model=List[KOT])
-async def get_kots():
-    kots = await db.kots.find().sort("created_at", -1).to_list(length=None)
+async def get_kots(restaurant_id: str = Depends(get_restaurant_id)):
+    kots = await capped(storage.kots, {"restaurant_id": restaurant_id}, sort=[("created_at", -1)])
     return [KOT(**parse_from_mongo(kot)) for kot in kots]
 
+@api_router.get("/kot/{order_id}/tickets", response_model=List[StationTicket])
+async def get_kot_tickets(order_id: str, restaurant_id: str = Depends(get_restaurant_id)):
+    tickets = await storage.station_tickets.find({"restaurant_id": restaurant_id, "order_id": order_id},
+                                                 sort=[("station", 1)])
+    return [StationTicket(**parse_from_mongo(ticket)) for ticket in tickets]
+
+# Kitchen Station Endpoints
+@api_router.get("/stations", response_model=List[StationQueue])
+async def get_stations(restaurant_id: str = Depends(get_restaurant_id)):
+    return await read_coalescer.do(("stations", restaurant_id), lambda: load_station_queues(restaurant_id))
+
+async def load_station_queues(restaurant_id: str) -> List[StationQueue]:
+    async def queue(station: str) -> StationQueue:
+        pending, cooking = await asyncio.gather(*(
+            storage.station_tickets.count({"restaurant_id": restaurant_id, "station": station, "status": status})
+            for status in (OrderStatus.PENDING, OrderStatus.COOKING)
+        ))
+        return StationQueue(station=station, pending=pending, cooking=cooking)
+    return list(await asyncio.gather(*(queue(station) for station in station_map.stations)))
+
+@api_router.get("/stations/{station}/tickets", response_model=List[StationTicket])
+async def get_station_tickets(station: str, status: Optional[OrderStatus] = None,
+                              restaurant_id: str = Depends(get_restaurant_id)):
+    """A station's queue, oldest first: open tickets, or those with ``status``"""
+    return await read_coalescer.do(("station", restaurant_id, station, status),
+                                   lambda: load_station_tickets(restaurant_id, station, status))
+
+async def load_station_tickets(restaurant_id: str, station: str, status: Optional[OrderStatus]) -> List[StationTicket]:
+    tickets = await capped(
+        storage.station_tickets,
+        {"restaurant_id": restaurant_id, "station": station, "status": status or {"$in": OPEN_TICKETS}},
+        sort=[("created_at", 1)]
+    )
+    return [StationTicket(**parse_from_mongo(ticket)) for ticket in tickets]
+
+@api_router.put("/stations/tickets/{ticket_id}", response_model=StationTicket)
+async def update_station_ticket(ticket_id: str, update_data: StationTicketUpdate,
+                                restaurant_id: str = Depends(get_restaurant_id)):
+    now = datetime.now(timezone.utc).isoformat()
+    ticket = await storage.station_tickets.find_one_and_update(
+        {"restaurant_id": restaurant_id, "id": ticket_id},
+        set={"status": update_data.status, "updated_at": now}
+    )
+    if ticket is None:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    await sync_order_status(restaurant_id, ticket["order_id"], now)
+    invalidate_reads()
+    return StationTicket(**parse_from_mongo(ticket))
+
+async def sync_order_status(restaurant_id: str, order_id: str, now: str) -> None:
+    """Move the order (and its KOT) along once its station tickets say so"""
+    tickets = await storage.station_tickets.find({"restaurant_id": restaurant_id, "order_id": order_id})
+    status = derive_status([ticket["status"] for ticket in tickets])
+    order = await storage.orders.find_one({"restaurant_id": restaurant_id, "id": order_id})
+    if order is None or not advances(order.get("status"), status):
+        return
+    # Conditional on the status just read, so a concurrent cancel is not overwritten
+    matched = await storage.orders.update_one(
+        {"restaurant_id": restaurant_id, "id": order_id, "status": order.get("status")},
+        set={"status": status, "updated_at": now, f"{status}_at": now}
+    )
+    if matched:
+        await storage.kots.update_one({"restaurant_id": restaurant_id, "order_id": order_id}, set={"status": status})
+        await record_status_event(restaurant_id, order_id, status, order.get("table_number"), now)
+        await floor_changed(restaurant_id)
+
+@api_router.get("/kitchen/eta")
+async def get_eta_model(restaurant_id: str = Depends(get_restaurant_id)):
+    """What the ETA model has learned: per-item cooking minutes and the wait per open order"""
+    return await eta_estimator.summary(restaurant_id)
+
+# Printing Endpoints
+def require_printing() -> PrintService:
+    if print_service is None:
+        raise HTTPException(status_code=503, detail="No printers configured (set PRINTERS)")
+    return print_service
+
+@api_router.post("/kot/{order_id}/print")
+async def reprint_kot(order_id: str, restaurant_id: str = Depends(get_restaurant_id)):
+    """Print the order's KOT again on every printer it routes to"""
+    printing = require_printing()
+    kot = await storage.kots.find_one({"restaurant_id": restaurant_id, "order_id": order_id})
+    if not kot:
+        raise HTTPException(status_code=404, detail="KOT not found")
+    results = await printing.print_kot(kot, await item_categories(restaurant_id, kot["items"]),
+                                       station_map.station_for)
+    failed = failed_printers(results)
+    if failed:
+        raise HTTPException(status_code=502, detail=f"Printing failed on {', '.join(failed)}")
+    return {"kot_id": kot["id"], "jobs": results}
+
+@api_router.post("/orders/{order_id}/print-bill")
+async def print_bill(order_id: str, restaurant_id: str = Depends(get_restaurant_id)):
+    printing = require_printing()
+    order = await storage.orders.find_one({"restaurant_id": restaurant_id, "id": order_id})
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    try:
+        job_id = await printing.print_bill(order)
+    except PrinterNotFoundError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    except OSError as exc:
+        raise HTTPException(status_code=502, detail=str(exc))
+    return {"order_id": order_id, "printer": printing.bill_printer, "job_id": job_id}
+
+@api_router.get("/printers")
+async def get_printers():
+    return require_printing().stats()
+
+# Invoice Endpoints
+def invoiceable(order: Dict[str, Any]) -> bool:
+    return order.get("status") != OrderStatus.CANCELLED and (
+        order.get("status") == OrderStatus.SERVED or order.get("payment_status") == PaymentStatus.PAID
+    )
+
+@api_router.get("/orders/{order_id}/invoice")
+async def get_invoice(order_id: str, restaurant_id: str = Depends(get_restaurant_id)):
+    order = await storage.orders.find_one({"restaurant_id": restaurant_id, "id": order_id})
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    if not invoiceable(order):
+        raise HTTPException(status_code=409, detail="Invoices are issued once an order is served or paid")
+    pdf = await invoice_renderer.render(order)
+    return Response(pdf, media_type="application/pdf",
+                    headers={"Content-Disposition": f'inline; filename="{invoice_renderer.number(order)}.pdf"'})
+
+@api_router.get("/invoices")
+async def get_invoices(start: datetime, end: Optional[datetime] = None,
+                       restaurant_id: str = Depends(get_restaurant_id)):
+    """ZIP of the invoices of every served or paid order created in [start, end), by default one day"""
+    start = as_utc(start)
+    end = as_utc(end) if end else start + timedelta(days=1)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    orders = await storage.orders.find(
+        {"restaurant_id": restaurant_id, "created_at": {"$gte": start.isoformat(), "$lt": end.isoformat()}},
+        sort=[("created_at", 1)]
+    )
+    orders = [order for order in orders if invoiceable(order)]
+    # Rendered side by side on all of the pool's processes
+    pdfs = await invoice_renderer.render_many(orders)
+    archive = io.BytesIO()
+    # PDF streams are compressed already
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as zip_file:
+        for order, pdf in zip(orders, pdfs):
+            zip_file.writestr(f"{invoice_renderer.number(order)}.pdf", pdf)
+    return Response(archive.getvalue(), media_type="application/zip", headers={
+        "Content-Disposition": f'attachment; filename="invoices-{start:%Y%m%d}.zip"',
+        "X-Invoice-Count": str(len(orders)),
+    })
+
+# Forecast Endpoints
+@api_router.get("/forecast", response_model=DemandForecast)
+async def get_forecast(day: Optional[date] = Query(None, alias="date"), menu_item_id: Optional[str] = None,
+                       restaurant_id: str = Depends(get_restaurant_id)):
+    """Expected demand on a day (today by default) from the nightly forecast, see forecast.py"""
+    day = day or datetime.now(local_timezone).date()
+    filters = {"restaurant_id": restaurant_id, "weekday": day.weekday()}
+    if menu_item_id:
+        filters["menu_item_id"] = menu_item_id
+    forecasts = await storage.reads("forecast").collection("forecasts").find(filters, sort=[("hour", 1)])
+
+    items: Dict[str, ItemForecast] = {}
+    hours: Dict[int, HourForecast] = {}
+    for forecast in forecasts:
+        item = items.setdefault(forecast["menu_item_id"], ItemForecast(
+            menu_item_id=forecast["menu_item_id"], menu_item_name=forecast.get("menu_item_name", ""),
+            expected=0, upper=0, hours=[]
+        ))
+        item.hours.append(HourForecast(hour=forecast["hour"], expected=forecast["expected"], upper=forecast["upper"]))
+        item.expected += forecast["expected"]
+        item.upper += forecast["upper"]
+        total = hours.setdefault(forecast["hour"], HourForecast(hour=forecast["hour"], expected=0, upper=0))
+        total.expected += forecast["expected"]
+        total.upper += forecast["upper"]
+    for forecast in list(items.values()) + list(hours.values()):
+        forecast.expected, forecast.upper = round(forecast.expected, 2), round(forecast.upper, 2)
+    return DemandForecast(
+        date=day,
+        weekday=day.weekday(),
+        generated_at=max((forecast["generated_at"] for forecast in forecasts), default=None),
+        items=sorted(items.values(), key=lambda item: -item.expected),
+        hours=sorted(hours.values(), key=lambda hour: hour.hour),
+    )
+
+# Report Endpoints
+@api_router.post("/reports/close-day", response_model=DayReport)
+async def close_business_day(request: Request, body: Optional[CloseDayRequest] = None,
+                             restaurant_id: str = Depends(get_restaurant_id)):
+    """Z-report for a business day; the first call takes the snapshot, later ones return it"""
+    settings = request.app.state.settings
+    today = datetime.now(local_timezone).date()
+    day = (body.day if body else None) or today
+    if day > today:
+        raise HTTPException(status_code=400, detail="Cannot close a day that has not started")
+    if day == today and not (body and body.force):
+        # The snapshot is final, orders placed later today would never be in it
+        raise HTTPException(status_code=400,
+                            detail="The business day is not over yet; send \"force\": true to close it now")
+    report, _ = await close_day(storage, restaurant_id, day, settings.timezone,
+                                settings.invoice_tax_rates, settings.invoice_prices_include_tax)
+    return DayReport(**report)
+
+@api_router.get("/reports/days", response_model=List[DayReport])
+async def list_day_reports(start: Optional[date] = None, end: Optional[date] = None,
+                           limit: int = Query(31, ge=1, le=366), restaurant_id: str = Depends(get_restaurant_id)):
+    """Closed days, latest first"""
+    filters: Dict[str, Any] = {"restaurant_id": restaurant_id}
+    if start or end:
+        filters["date"] = {}
+        if start:
+            filters["date"]["$gte"] = start.isoformat()
+        if end:
+            filters["date"]["$lte"] = end.isoformat()
+    reports = await storage.collection("day_reports").find(filters, sort=[("date", -1)], limit=limit)
+    return [DayReport(**report) for report in reports]
+
+@api_router.get("/reports/days/{day}", response_model=DayReport)
+async def get_day_report(day: date, restaurant_id: str = Depends(get_restaurant_id)):
+    report = await storage.collection("day_reports").find_one({"restaurant_id": restaurant_id, "date": day.isoformat()})
+    if not report:
+        raise HTTPException(status_code=404, detail="Day not closed")
+    return DayReport(**report)
+
+# Analytics Endpoints, served from order_events
+@api_router.get("/analytics/heatmap", response_model=OrderHeatmap)
+async def get_order_heatmap(weeks: int = Query(4, ge=1, le=156), status: OrderStatus = OrderStatus.PENDING,
+                            table_number: Optional[str] = None, restaurant_id: str = Depends(get_restaurant_id)):
+    """Orders reaching ``status`` (pending: placed) per weekday and hour over the last ``weeks``"""
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(weeks=weeks)
+    counts = await order_events.heatmap(restaurant_id, start, end, local_timezone.key, status.value, table_number)
+    return OrderHeatmap(timezone=local_timezone.key, status=status, table_number=table_number,
+                        start=start, end=end, counts=counts)
+
+@api_router.get("/analytics/throughput", response_model=Throughput)
+async def get_throughput(hours: float = Query(3, gt=0, le=48), bucket_minutes: int = Query(15, ge=1, le=60),
+                         restaurant_id: str = Depends(get_restaurant_id)):
+    """Orders reaching each status per interval over the last ``hours``, for the operations screen"""
+    if 60 % bucket_minutes:
+        raise HTTPException(status_code=400, detail="bucket_minutes must divide an hour")
+    return Throughput(**await order_events.throughput(restaurant_id, hours, bucket_minutes))
+
 # Dashboard Endpoints
 @api_router.get("/dashboard", response_model=DashboardStats)
-async def get_dashboard_stats():
-    # Today's date range
-    today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    today_end = today_start.replace(hour=23, minute=59, second=59)
+async def get_dashboard_stats(restaurant_id: str = Depends(get_restaurant_id)):
+    return await read_coalescer.do(("dashboard", restaurant_id), lambda: compute_dashboard_stats(restaurant_id))
+
+async def compute_dashboard_stats(restaurant_id: str) -> DashboardStats:
+    # Analytical reads, may be served by a replica set secondary
+    orders = storage.reads("dashboard").orders
+
+    # Today's date range, in the restaurant's timezone
+    today_start, today_end = day_window(datetime.now(local_timezone).date(), local_timezone.key)
     
     # Today's orders
-    today_orders = await db.orders.count_documents({
+    today_orders = await orders.count({
+        "restaurant_id": restaurant_id,
         "created_at": {
             "$gte": today_start.isoformat(),
-            "$lte": today_end.isoformat()
+            "$lt": today_end.isoformat()
         }
     })
     
     # Today's revenue
-    today_revenue_pipeline = [
-        {
-            "$match": {
-                "created_at": {
-                    "$gte": today_start.isoformat(),
-                    "$lte": today_end.isoformat()
-                },
-                "payment_status": "paid"
-            }
+    today_revenue = await orders.sum("total_amount", {
+        "restaurant_id": restaurant_id,
+        "created_at": {
+            "$gte": today_start.isoformat(),
+            "$lt": today_end.isoformat()
         },
-        {
-            "$group": {
-                "_id": None,
-                "total": {"$sum": "$total_amount"}
-            }
-        }
-    ]
-    
-    revenue_result = await db.orders.aggregate(today_revenue_pipeline).to_list(length=1)
-    today_revenue = revenue_result[0]["total"] if revenue_result else 0
+        "payment_status": "paid"
+    })
     
     # Order status counts
-    pending_orders = await db.orders.count_documents({"status": "pending"})
-    cooking_orders = await db.orders.count_documents({"status": "cooking"})
-    ready_orders = await db.orders.count_documents({"status": "ready"})
-    served_orders = await db.orders.count_documents({
+    pending_orders = await orders.count({"restaurant_id": restaurant_id, "status": "pending"})
+    cooking_orders = await orders.count({"restaurant_id": restaurant_id, "status": "cooking"})
+    ready_orders = await orders.count({"restaurant_id": restaurant_id, "status": "ready"})
+    served_orders = await orders.count({
+        "restaurant_id": restaurant_id,
         "status": "served",
         "created_at": {
             "$gte": today_start.isoformat(),
-            "$lte": today_end.isoformat()
+            "$lt": today_end.isoformat()
         }
     })
     
     # Pending payments
-    pending_payments = await db.orders.count_documents({"payment_status": "pending"})
+    pending_payments = await orders.count({"restaurant_id": restaurant_id, "payment_status": "pending"})
     
     # Kitchen status logic
     kitchen_status = KitchenStatus.ACTIVE
@@ -389,88 +1329,156 @@ async def get_dashboard_stats():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now(timezone.utc)}
 
+# Runtime metrics for this worker process
+@api_router.get("/metrics")
+async def get_metrics():
+    return {
+        "pid": os.getpid(),
+        "read_coalescing": read_coalescer.stats(),
+        "outbox": outbox.stats(),
+        "invoices": invoice_renderer.stats(),
+        "eta": eta_estimator.stats(),
+        "inventory": inventory.stats(),
+        "order_events": order_events.stats(),
+        "queries": query_guard.stats(),
+        "tracing": tracer.stats(),
+        "printing": print_service.stats()["printers"] if print_service is not None else {},
+    }
+
+# Sampled request traces kept by this worker process, newest first
+@api_router.get("/admin/traces")
+async def get_traces(limit: int = Query(50, ge=1, le=500), min_ms: float = Query(0, ge=0),
+                     path: Optional[str] = None):
+    return {"traces": tracer.traces(limit, min_ms, path), **tracer.stats()}
+
+@api_router.get("/admin/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    trace = tracer.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found, or no longer kept by this worker")
+    return trace
+
 # Table Management Endpoints
 @api_router.post("/tables", response_model=RestaurantTable)
-async def create_table(table_data: TableCreate):
-    table = RestaurantTable(**table_data.dict())
+async def create_table(table_data: TableCreate, restaurant_id: str = Depends(get_restaurant_id)):
+    table = RestaurantTable(**table_data.dict(), restaurant_id=restaurant_id)
     table_dict = prepare_for_mongo(table.dict())
-    await db.tables.insert_one(table_dict)
+    await storage.tables.insert_one(table_dict)
+    reservations.forget(restaurant_id)
+    table_allocator.forget(restaurant_id)
+    await floor_changed(restaurant_id)
     return table
 
 @api_router.get("/tables", response_model=List[RestaurantTable])
-async def get_tables():
-    tables = await db.tables.find().sort("table_number", 1).to_list(length=None)
+async def get_tables(restaurant_id: str = Depends(get_restaurant_id)):
+    return await read_coalescer.do(("tables", restaurant_id), lambda: load_tables(restaurant_id))
+
+async def load_tables(restaurant_id: str) -> List[RestaurantTable]:
+    tables = await capped(storage.tables, {"restaurant_id": restaurant_id}, sort=[("table_number", 1)])
     return [RestaurantTable(**parse_from_mongo(table)) for table in tables]
 
 @api_router.put("/tables/{table_id}", response_model=RestaurantTable)
-async def update_table(table_id: str, update_data: TableUpdate):
+async def update_table(table_id: str, update_data: TableUpdate, restaurant_id: str = Depends(get_restaurant_id)):
     update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
     
-    result = await db.tables.update_one(
-        {"id": table_id},
-        {"$set": update_dict}
+    matched = await storage.tables.update_one(
+        {"restaurant_id": restaurant_id, "id": table_id},
+        set=update_dict
     )
     
-    if result.matched_count == 0:
+    if matched == 0:
         raise HTTPException(status_code=404, detail="Table not found")
+    await floor_changed(restaurant_id)
     
-    updated_table = await db.tables.find_one({"id": table_id})
+    updated_table = await storage.tables.find_one({"restaurant_id": restaurant_id, "id": table_id})
+    table_allocator.table_saved(restaurant_id, dict(updated_table))
     return RestaurantTable(**parse_from_mongo(updated_table))
 
+@api_router.get("/tables/allocate", response_model=List[RestaurantTable])
+async def suggest_tables(party_size: int = Query(..., ge=1), restaurant_id: str = Depends(get_restaurant_id)):
+    """Best free table for a walk-in party, or neighbouring tables to join; empty when nothing fits"""
+    book = await reservations.book_for(restaurant_id)
+    now = datetime.now(timezone.utc).timestamp()
+    until = now + table_allocator.sitting_minutes * 60
+    tables = await table_allocator.allocate(
+        restaurant_id, party_size,
+        lambda table: table["id"] not in book.schedules or book.schedules[table["id"]].is_free(now, until)
+    )
+    return [RestaurantTable(**parse_from_mongo(dict(table))) for table in tables or []]
+
 @api_router.get("/tables/{table_number}/orders")
-async def get_table_orders(table_number: str):
-    orders = await db.orders.find({"table_number": table_number}).sort("created_at", -1).to_list(length=None)
+async def get_table_orders(table_number: str, restaurant_id: str = Depends(get_restaurant_id)):
+    orders = await capped(
+        storage.reads("order_history").orders,
+        {"restaurant_id": restaurant_id, "table_number": table_number}, sort=[("created_at", -1)]
+    )
     return [Order(**parse_from_mongo(order)) for order in orders]
 
 @api_router.post("/tables/{table_number}/assign-order/{order_id}")
-async def assign_order_to_table(table_number: str, order_id: str):
+async def assign_order_to_table(table_number: str, order_id: str,
+                                restaurant_id: str = Depends(get_restaurant_id)):
     # Update table with current order
-    table_result = await db.tables.update_one(
-        {"table_number": table_number},
-        {"$set": {"current_order_id": order_id, "status": "occupied"}}
+    table_matched = await storage.tables.update_one(
+        {"restaurant_id": restaurant_id, "table_number": table_number},
+        set={"current_order_id": order_id, "status": "occupied"}
     )
+    table_allocator.set_status(restaurant_id, table_number, "occupied")
     
-    # Update order with table number
-    order_result = await db.orders.update_one(
-        {"id": order_id},
-        {"$set": {"table_number": table_number}}
+    # Update order with table number; a new updated_at also retires its cached invoice
+    order_matched = await storage.orders.update_one(
+        {"restaurant_id": restaurant_id, "id": order_id},
+        set={"table_number": table_number, "updated_at": datetime.now(timezone.utc).isoformat()}
     )
     
-    if table_result.matched_count == 0:
+    if table_matched == 0:
         raise HTTPException(status_code=404, detail="Table not found")
-    if order_result.matched_count == 0:
+    await floor_changed(restaurant_id)
+    if order_matched == 0:
         raise HTTPException(status_code=404, detail="Order not found")
     
     return {"message": "Order assigned to table successfully"}
 
 @api_router.post("/tables/{table_number}/clear")
-async def clear_table(table_number: str):
-    """Clear a table after payment is complete"""
-    table_result = await db.tables.update_one(
-        {"table_number": table_number},
-        {"$set": {"status": "available", "current_order_id": None}}
-    )
-    
-    if table_result.matched_count == 0:
+async def clear_table(table_number: str, restaurant_id: str = Depends(get_restaurant_id)):
+    """Clear a table after payment is complete, along with any tables joined to it"""
+    table = await storage.tables.find_one({"restaurant_id": restaurant_id, "table_number": table_number})
+    if table is None:
         raise HTTPException(status_code=404, detail="Table not found")
     
+    if table.get("current_order_id"):
+        cleared = await storage.tables.find(
+            {"restaurant_id": restaurant_id, "current_order_id": table["current_order_id"]}
+        )
+        table_numbers = {table_number} | {other["table_number"] for other in cleared}
+    else:
+        table_numbers = {table_number}
+    await storage.tables.update_many(
+        {"restaurant_id": restaurant_id, "table_number": {"$in": sorted(table_numbers)}},
+        set={"status": "available", "current_order_id": None}
+    )
+    for number in table_numbers:
+        table_allocator.set_status(restaurant_id, number, "available")
+    await floor_changed(restaurant_id)
+    
     return {"message": "Table cleared successfully"}
 
 @api_router.delete("/tables/{table_id}")
-async def delete_table(table_id: str):
+async def delete_table(table_id: str, restaurant_id: str = Depends(get_restaurant_id)):
     """Delete a table"""
     # Check if table has any active orders
-    active_orders = await db.orders.count_documents({
+    active_orders = await storage.orders.count({
+        "restaurant_id": restaurant_id,
         "table_number": {"$exists": True},
         "status": {"$in": ["pending", "cooking", "ready"]}
     })
     
-    table = await db.tables.find_one({"id": table_id})
+    table = await storage.tables.find_one({"restaurant_id": restaurant_id, "id": table_id})
     if not table:
         raise HTTPException(status_code=404, detail="Table not found")
     
     # Check if this specific table has active orders
-    table_orders = await db.orders.count_documents({
+    table_orders = await storage.orders.count({
+        "restaurant_id": restaurant_id,
         "table_number": table["table_number"],
         "status": {"$in": ["pending", "cooking", "ready"]}
     })
@@ -481,16 +1489,19 @@ async def delete_table(table_id: str):
             detail=f"Cannot delete table {table['table_number']} - it has active orders"
         )
     
-    result = await db.tables.delete_one({"id": table_id})
-    if result.deleted_count == 0:
+    deleted = await storage.tables.delete_one({"restaurant_id": restaurant_id, "id": table_id})
+    if deleted == 0:
         raise HTTPException(status_code=404, detail="Table not found")
+    reservations.forget(restaurant_id)
+    table_allocator.forget(restaurant_id)
+    await floor_changed(restaurant_id)
     
     return {"message": f"Table {table['table_number']} deleted successfully"}
 
 @api_router.post("/tables/initialize-default")
-async def initialize_default_tables():
+async def initialize_default_tables(restaurant_id: str = Depends(get_restaurant_id)):
     # Check if tables already exist
-    existing_count = await db.tables.count_documents({})
+    existing_count = await storage.tables.count({"restaurant_id": restaurant_id})
     if existing_count > 0:
         return {"message": f"Tables already exist ({existing_count} tables)"}
     
@@ -506,23 +1517,253 @@ async def initialize_default_tables():
     
     created_tables = []
     for table_data in default_tables:
-        table = RestaurantTable(**table_data)
+        table = RestaurantTable(**table_data, restaurant_id=restaurant_id)
         table_dict = prepare_for_mongo(table.dict())
-        await db.tables.insert_one(table_dict)
+        await storage.tables.insert_one(table_dict)
         created_tables.append(table)
+    reservations.forget(restaurant_id)
+    table_allocator.forget(restaurant_id)
+    await floor_changed(restaurant_id)
     
     return {"message": f"Created {len(created_tables)} default tables", "tables": created_tables}
 
-# Include the router in the main app
-app.include_router(api_router)
+# Reservation Endpoints
+def reservation_window(start_at: datetime, end_at: Optional[datetime], request: Request) -> Tuple[datetime, datetime]:
+    start = as_utc(start_at)
+    end = as_utc(end_at) if end_at else start + timedelta(minutes=request.app.state.settings.reservation_duration_minutes)
+    if end <= start:
+        raise HTTPException(status_code=422, detail="end_at must be after start_at")
+    return start, end
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@api_router.post("/reservations", response_model=Reservation)
+async def create_reservation(reservation_data: ReservationCreate, request: Request,
+                             restaurant_id: str = Depends(get_restaurant_id)):
+    start, end = reservation_window(reservation_data.start_at, reservation_data.end_at, request)
+    book = await reservations.book_for(restaurant_id)
+    if reservation_data.table_number:
+        table = book.table(reservation_data.table_number)
+        if table is None:
+            raise HTTPException(status_code=404, detail="Table not found")
+        if table.get("capacity", 0) < reservation_data.party_size:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Table {table['table_number']} seats {table.get('capacity', 0)}"
+            )
+        candidates = [table]
+    else:
+        candidates = await reservations.best_fit(restaurant_id, reservation_data.party_size, start, end)
+        if not candidates:
+            raise HTTPException(status_code=409, detail="No table is free for that party and time")
+
+    for table in candidates:
+        reservation = Reservation(
+            **reservation_data.dict(exclude={"table_number", "start_at", "end_at"}),
+            restaurant_id=restaurant_id,
+            table_id=table["id"],
+            table_number=table["table_number"],
+            start_at=start,
+            end_at=end
+        )
+        try:
+            await reservations.create(prepare_for_mongo(reservation.dict()))
+            return reservation
+        except ReservationConflict as exc:
+            # Someone else just took it; try the next best table
+            conflict = exc
+    raise HTTPException(status_code=409, detail=str(conflict))
+
+@api_router.get("/reservations", response_model=List[Reservation])
+async def get_reservations(start: Optional[datetime] = None, end: Optional[datetime] = None,
+                           table_number: Optional[str] = None, status: Optional[ReservationStatus] = None,
+                           restaurant_id: str = Depends(get_restaurant_id)):
+    """Reservations overlapping [start, end), upcoming ones by default"""
+    filter_query: Dict[str, Any] = {
+        "restaurant_id": restaurant_id,
+        "end_at": {"$gt": as_utc(start or datetime.now(timezone.utc)).isoformat()},
+    }
+    if end:
+        filter_query["start_at"] = {"$lt": as_utc(end).isoformat()}
+    if table_number:
+        filter_query["table_number"] = table_number
+    if status:
+        filter_query["status"] = status
+    found = await storage.collection("reservations").find(filter_query, sort=[("start_at", 1)], limit=500)
+    return [Reservation(**parse_from_mongo(reservation)) for reservation in found]
+
+@api_router.get("/reservations/best-fit", response_model=List[RestaurantTable])
+async def get_best_fit_tables(request: Request, party_size: int = Query(..., ge=1), start_at: datetime = Query(...),
+                              end_at: Optional[datetime] = None, limit: int = Query(3, ge=1, le=20),
+                              restaurant_id: str = Depends(get_restaurant_id)):
+    """Free tables for a party and time window, best fit first"""
+    start, end = reservation_window(start_at, end_at, request)
+    tables = await reservations.best_fit(restaurant_id, party_size, start, end, limit)
+    return [RestaurantTable(**parse_from_mongo(dict(table))) for table in tables]
+
+@api_router.put("/reservations/{reservation_id}", response_model=Reservation)
+async def update_reservation(reservation_id: str, update_data: ReservationUpdate,
+                             restaurant_id: str = Depends(get_restaurant_id)):
+    try:
+        reservation = await reservations.set_status(restaurant_id, reservation_id, update_data.status.value)
+    except ReservationConflict as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    if reservation is None:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    return Reservation(**parse_from_mongo(reservation))
+
+# Floor plan
+# restaurant_id -> (floor version, tables joined with their current order)
+floor_cache: Dict[str, Tuple[int, List[Dict[str, Any]]]] = {}
+
+async def floor_version(restaurant_id: str) -> int:
+    counter = await storage.collection("counters").find_one({"restaurant_id": restaurant_id, "name": "floor"})
+    return counter["value"] if counter else 0
+
+async def load_floor(restaurant_id: str) -> List[Dict[str, Any]]:
+    tables = await storage.tables.lookup(
+        {"restaurant_id": restaurant_id},
+        "current_order_id",
+        storage.orders,
+        "id",
+        "current_order",
+        foreign_filters={"restaurant_id": restaurant_id},
+        sort=[("table_number", 1)]
+    )
+    floor = []
+    for table in tables:
+        order = table.pop("current_order", None)
+        if order:
+            table["current_order"] = {
+                "id": order["id"],
+                "customer_name": order.get("customer_name", ""),
+                "items_count": sum(item.get("quantity", 0) for item in order.get("items", [])),
+                "total_amount": order.get("total_amount", 0),
+                "status": order["status"],
+                "payment_status": order["payment_status"],
+                "created_at": order["created_at"],
+            }
+        floor.append(parse_from_mongo(table))
+    return floor
+
+@api_router.get("/floor", response_model=FloorPlan)
+async def get_floor(restaurant_id: str = Depends(get_restaurant_id)):
+    """Every table with a summary of the order currently on it"""
+    # While writes sit in the journal the version counter lags behind, so rebuild
+    cacheable = journal is None or (journal.online and journal.pending_count == 0)
+    version = await floor_version(restaurant_id) if cacheable else -1
+    cached = floor_cache.get(restaurant_id)
+    if cached is not None and cached[0] == version and cacheable:
+        tables = cached[1]
+    else:
+        tables = await read_coalescer.do(("floor", restaurant_id, version), lambda: load_floor(restaurant_id))
+        if cacheable:
+            floor_cache[restaurant_id] = (version, tables)
+
+    now = datetime.now(timezone.utc)
+    floor = []
+    for table in tables:
+        table = FloorTable(**table)
+        if table.current_order is not None:
+            elapsed = now - table.current_order.created_at
+            table.current_order.elapsed_minutes = max(0, int(elapsed.total_seconds() // 60))
+        floor.append(table)
+    return FloorPlan(version=version, tables=floor)
+
+# Export Endpoints
+def export_response(request: Request, restaurant_id: str, collection: str, columns: List[str],
+                    start: datetime, end: Optional[datetime], format: ExportFormat, gzip: bool,
+                    status: Optional[OrderStatus]) -> StreamingResponse:
+    """Stream every document created in [start, end) straight from the cursor"""
+    start = as_utc(start)
+    end = as_utc(end or datetime.now(timezone.utc))
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    filter_query: Dict[str, Any] = {
+        "restaurant_id": restaurant_id,
+        "created_at": {"$gte": start.isoformat(), "$lt": end.isoformat()},
+    }
+    if status:
+        filter_query["status"] = status
+    docs = storage.reads("exports").collection(collection).iterate(
+        filter_query, sort=[("created_at", 1)], batch_size=request.app.state.settings.export_batch_size
+    )
+    name = export_filename(f"{collection}-{start:%Y%m%d}-{end:%Y%m%d}", format.value, gzip)
+    return StreamingResponse(
+        stream_rows(docs, format.value, columns, gzip),
+        media_type=export_media_type(format.value, gzip),
+        headers={"Content-Disposition": f'attachment; filename="{name}"'}
+    )
+
+@api_router.get("/export/orders")
+async def export_orders(request: Request, start: datetime, end: Optional[datetime] = None,
+                        format: ExportFormat = ExportFormat.CSV, gzip: bool = False,
+                        status: Optional[OrderStatus] = None, restaurant_id: str = Depends(get_restaurant_id)):
+    return export_response(request, restaurant_id, "orders", ORDER_COLUMNS, start, end, format, gzip, status)
+
+@api_router.get("/export/kots")
+async def export_kots(request: Request, start: datetime, end: Optional[datetime] = None,
+                      format: ExportFormat = ExportFormat.CSV, gzip: bool = False,
+                      status: Optional[OrderStatus] = None, restaurant_id: str = Depends(get_restaurant_id)):
+    return export_response(request, restaurant_id, "kots", KOT_COLUMNS, start, end, format, gzip, status)
+
+# Outbox handlers; each may run more than once, see outbox.py
+async def deduct_stock(restaurant_id: str, payload: Dict[str, Any]) -> None:
+    """Take what a new order uses off the ingredient stock"""
+    # Claimed before deducting: a retry after a failure in between skips the order rather
+    # than deducting it twice, the next stock count corrects it
+    order = await storage.orders.find_one_and_update(
+        {"restaurant_id": restaurant_id, "id": payload["order_id"], "stock_deducted_at": {"$exists": False}},
+        set={"stock_deducted_at": datetime.now(timezone.utc).isoformat()}
+    )
+    if order is None:
+        if await storage.orders.count({"restaurant_id": restaurant_id, "id": payload["order_id"]}) == 0:
+            raise LookupError(f"Order {payload['order_id']} is not stored yet")
+        return
+    await inventory.deduct(restaurant_id, order["items"])
+
+async def occupy_tables(restaurant_id: str, payload: Dict[str, Any]) -> None:
+    """Mark the tables of a new order occupied"""
+    order = await storage.orders.find_one({"restaurant_id": restaurant_id, "id": payload["order_id"]})
+    if order is None:
+        # Written through the offline journal and not replayed yet
+        raise LookupError(f"Order {payload['order_id']} is not stored yet")
+    if order.get("payment_status") == PaymentStatus.PAID or order.get("status") == OrderStatus.CANCELLED:
+        # A late retry must not seat an order whose table was already cleared
+        return
+    ops = [
+        {
+            "collection": "tables",
+            "op": "update",
+            "filter": {"restaurant_id": restaurant_id, "table_number": table_number},
+            "set": {"status": "occupied", "current_order_id": payload["order_id"]}
+        }
+        for table_number in payload["table_numbers"]
+    ]
+    await apply_ops(storage, ops + [floor_version_op(restaurant_id)])
+    invalidate_reads()
+
+async def print_kot_tickets(restaurant_id: str, payload: Dict[str, Any]) -> None:
+    """Send a new KOT to its printers; a retry skips the printers that already have it"""
+    kot = await storage.kots.find_one({"restaurant_id": restaurant_id, "order_id": payload["order_id"]})
+    if kot is None:
+        raise LookupError(f"KOT {payload['kot_id']} is not stored yet")
+    if kot["id"] != payload["kot_id"]:
+        # A concurrent generate_kot stored its KOT first; that one's entry prints it
+        return
+    printed = kot.get("printed_on", [])
+    results = await print_service.print_kot(kot, await item_categories(restaurant_id, kot["items"]),
+                                            station_map.station_for, skip=printed)
+    failed = failed_printers(results)
+    succeeded = [printer for printer in results if printer not in failed]
+    if succeeded:
+        await storage.kots.update_one({"restaurant_id": restaurant_id, "id": kot["id"]},
+                                      set={"printed_on": printed + succeeded})
+    if failed:
+        raise OSError(f"KOT {kot['order_number']} not printed on {', '.join(failed)}")
+
+def dispatch_replayed(ops: List[Dict[str, Any]]) -> None:
+    """Run outbox entries of writes the journal replays, without waiting for the sweeper"""
+    if outbox is not None:
+        outbox.dispatch([op["doc"] for op in ops if op["collection"] == "outbox" and op["op"] == "insert"])
 
 # Configure logging
 logging.basicConfig(
@@ -531,6 +1772,141 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    """Build the API application; each worker process opens its own database connection"""
+    global query_guard, tracer
+    settings = settings or Settings.from_env()
+    query_guard = QueryGuard(settings.query_time_limits_ms, settings.query_max_results, lambda: storage)
+    tracer = Tracer(settings.trace_sample_rate, settings.trace_buffer_size, settings.trace_file)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        global storage, journal, idempotency, read_coalescer, menu_search, reservations, table_allocator, outbox
+        global station_map, print_service, invoice_renderer, eta_estimator, local_timezone, inventory, order_events
+        storage = create_storage(settings, event_listeners=[command_listener()])
+        local_timezone = ZoneInfo(settings.timezone)
+        read_coalescer = SingleFlight(ttl_seconds=settings.read_coalesce_ttl_ms / 1000)
+        menu_search = MenuSearch(storage, refresh_interval=settings.menu_search_refresh_s)
+        inventory = Inventory(storage, refresh_interval=settings.inventory_refresh_s)
+        order_events = OrderEvents(storage)
+        eta_estimator = EtaEstimator(
+            storage,
+            refresh_interval=settings.eta_refresh_s,
+            history_days=settings.eta_history_days,
+            max_samples=settings.eta_max_samples,
+            min_samples=settings.eta_min_samples,
+            kitchen_capacity=settings.eta_kitchen_capacity,
+            cold_start_minutes=settings.eta_cold_start_minutes,
+        )
+        floor_cache.clear()
+        reservations = Reservations(
+            storage,
+            slot_minutes=settings.reservation_slot_minutes,
+            refresh_interval=settings.reservation_refresh_s,
+        )
+        table_allocator = TableAllocator(
+            storage,
+            refresh_interval=settings.table_allocator_refresh_s,
+            max_join=settings.table_join_max,
+            sitting_minutes=settings.walk_in_sitting_minutes,
+        )
+        await storage.connect()
+        if storage.backend == "mongo":
+            logger.info(
+                "Mongo client ready (maxPoolSize=%s, minPoolSize=%s, read preferences %s, maxStalenessSeconds=%s)",
+                settings.mongo_max_pool_size, settings.mongo_min_pool_size,
+                settings.read_preferences or "primary only", settings.read_max_staleness_s
+            )
+        try:
+            await storage.assign_default_tenant(settings.default_restaurant_id)
+            await storage.fold_customer_names()
+            await storage.ensure_indexes()
+        except Exception as exc:
+            logger.warning("Could not prepare %s collections: %s", storage.backend, exc)
+        if settings.journal_enabled:
+            journal = WriteJournal(
+                settings.journal_dir,
+                storage,
+                apply_timeout=settings.journal_apply_timeout_ms / 1000,
+                replay_interval=settings.journal_replay_interval_s,
+                on_replayed=dispatch_replayed,
+            )
+            await journal.open()
+        idempotency = IdempotencyStore(
+            storage.collection("idempotency_keys"),
+            ttl_seconds=settings.idempotency_ttl_s,
+            lease_seconds=settings.idempotency_lease_s,
+            is_online=lambda: journal is None or journal.online,
+        )
+        try:
+            await idempotency.ensure_indexes()
+        except Exception as exc:
+            logger.warning("Could not ensure idempotency key indexes: %s", exc)
+        outbox = Outbox(
+            storage,
+            workers=settings.outbox_workers,
+            poll_interval=settings.outbox_poll_s,
+            lease_seconds=settings.outbox_lease_s,
+            max_attempts=settings.outbox_max_attempts,
+        )
+        outbox.register("tables.occupy", occupy_tables)
+        outbox.register("inventory.deduct", deduct_stock)
+        outbox.register("order_events.record", order_events.record)
+        station_map = StationMap(settings.kitchen_stations, settings.default_station)
+        invoice_renderer = InvoiceRenderer(
+            workers=settings.invoice_workers,
+            cache_size=settings.invoice_cache_size,
+            header=settings.invoice_header,
+            tax_id=settings.invoice_tax_id,
+            rates=settings.invoice_tax_rates,
+            prices_include_tax=settings.invoice_prices_include_tax,
+            tz=settings.timezone,
+        )
+        print_service = create_print_service(settings)
+        if print_service is not None:
+            print_service.start()
+            outbox.register("kots.print", print_kot_tickets)
+        outbox.start()
+        try:
+            yield
+        finally:
+            # Queued side effects may still need the journal, the database and the printers
+            await outbox.close()
+            if print_service is not None:
+                await print_service.close()
+                print_service = None
+            await invoice_renderer.close()
+            await menu_search.close()
+            await eta_estimator.close()
+            await inventory.close()
+            await reservations.close()
+            if journal is not None:
+                await journal.close()
+                journal = None
+            await storage.close()
+            storage = None
+            tracer.close()
+
+    # Create the main app without a prefix
+    app = FastAPI(title="Taste Paradise API", version="1.0.0", lifespan=lifespan)
+    app.state.settings = settings
+
+    # Include the router in the main app
+    app.include_router(api_router)
+    app.add_exception_handler(QueryTimeoutError, query_guard.timeout_response)
+    app.add_exception_handler(QueryCancelledError, query_guard.cancelled_response)
+
+    # Added before CORS so CORS stays outermost and its headers are on guardrail errors too
+    app.add_middleware(QueryGuardMiddleware, guard=query_guard)
+    # Outside the guard, so a trace includes a query timeout's error response
+    app.add_middleware(TracingMiddleware, tracer=tracer)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=settings.cors_origins,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    return app
+
+app = create_app()
\ No newline at end of file
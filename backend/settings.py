@@ -0,0 +1,261 @@
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT_DIR = Path(__file__).parent
+
+# Restaurant used when a request carries no X-Restaurant-Id header
+DEFAULT_RESTAURANT_ID = "default"
+
+
+def env_int(name: str, default: Optional[int]) -> Optional[int]:
+    """Read an integer environment variable, falling back to a default"""
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    return int(value)
+
+
+def env_float(name: str, default: float) -> float:
+    """Read a float environment variable, falling back to a default"""
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    return float(value)
+
+
+def env_bool(name: str, default: bool) -> bool:
+    """Read a true/false environment variable, falling back to a default"""
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_list(name: str, default: str) -> List[str]:
+    """Read a comma separated environment variable as a list"""
+    return [part.strip() for part in os.environ.get(name, default).split(',') if part.strip()]
+
+
+def env_map(name: str, default: Dict[str, str]) -> Dict[str, str]:
+    """Read a comma separated list of key=value pairs, falling back to a default"""
+    if not os.environ.get(name, "").strip():
+        return dict(default)
+    pairs = (part.split('=', 1) for part in env_list(name, ""))
+    return {key.strip(): value.strip() for key, value in pairs}
+
+
+# GST on restaurant service, split between the central and state share
+DEFAULT_TAX_RATES = {"CGST": 2.5, "SGST": 2.5}
+
+# Analytical reads that may be served by a replica set secondary
+DEFAULT_READ_PREFERENCES = {
+    "dashboard": "secondaryPreferred",
+    "order_history": "secondaryPreferred",
+    "exports": "secondaryPreferred",
+    "forecast": "secondaryPreferred",
+    "analytics": "secondaryPreferred",
+}
+
+# Server-side time limit of each read, in ms, per endpoint (route function name); 0 for none.
+# Exports stream for as long as the range takes, so they are left unbounded.
+DEFAULT_QUERY_TIME_LIMITS = {
+    "default": 5000,
+    "close_business_day": 30000,
+    "export_orders": 0,
+    "export_kots": 0,
+}
+
+
+@dataclass(frozen=True)
+class Settings:
+    mongo_url: Optional[str] = None
+    db_name: Optional[str] = None
+    cors_origins: List[str] = field(default_factory=lambda: ["*"])
+    # mongo, sqlite or memory
+    storage_backend: str = "mongo"
+    sqlite_path: str = str(ROOT_DIR / "taste_paradise.db")
+    # Connection pool tuning, applied per worker process
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 0
+    mongo_max_idle_time_ms: Optional[int] = None
+    mongo_server_selection_timeout_ms: int = 30000
+    mongo_connect_timeout_ms: int = 20000
+    # Read preference per endpoint, see storage.Storage.reads(); writes always go to the primary
+    read_preferences: Dict[str, str] = field(default_factory=lambda: dict(DEFAULT_READ_PREFERENCES))
+    read_max_staleness_s: int = 90
+    # Local write journal for orders and KOTs, see journal.py
+    journal_enabled: bool = False
+    journal_dir: str = str(ROOT_DIR / "journal")
+    journal_apply_timeout_ms: int = 2000
+    journal_replay_interval_s: float = 2.0
+    # How long Idempotency-Key responses are kept
+    idempotency_ttl_s: int = 24 * 3600
+    # How long a retry waits on an unfinished first attempt before taking its key over
+    idempotency_lease_s: int = 60
+    # Micro-cache for coalesced dashboard/orders/tables reads, 0 only shares in-flight calls
+    read_coalesce_ttl_ms: int = 250
+    # How stale another worker's view of the menu search index may get
+    menu_search_refresh_s: float = 30.0
+    # How stale another worker's view of ingredient stock may get, see inventory.py
+    inventory_refresh_s: float = 30.0
+    # Order ETAs, see eta.py: how often the learned kitchen times are refreshed and from how far back
+    eta_refresh_s: float = 60.0
+    eta_history_days: int = 14
+    eta_max_samples: int = 5000
+    # Finished orders needed before the queue wait is fitted instead of guessed
+    eta_min_samples: int = 20
+    # Orders the kitchen cooks at once, for the wait guess
+    eta_kitchen_capacity: int = 4
+    # Least estimate until then, the fixed ETA orders had before it was learned
+    eta_cold_start_minutes: float = 30.0
+    # Reservations hold tables in slots of this length, see reservations.py
+    reservation_slot_minutes: int = 15
+    reservation_duration_minutes: int = 90
+    reservation_refresh_s: float = 30.0
+    # Walk-in table assignment, see table_allocator.py
+    walk_in_sitting_minutes: int = 60
+    table_join_max: int = 3
+    table_allocator_refresh_s: float = 5.0
+    # Documents fetched per cursor round trip by /api/export
+    export_batch_size: int = 500
+    # Menu items upserted per database round trip by /api/menu/import
+    menu_import_batch_size: int = 500
+    # Background side effects of order writes, see outbox.py
+    outbox_workers: int = 4
+    outbox_poll_s: float = 2.0
+    outbox_lease_s: float = 30.0
+    outbox_max_attempts: int = 10
+
+    # Menu category -> kitchen station; KOT items are split into one ticket per station
+    kitchen_stations: Dict[str, str] = field(default_factory=dict)
+    default_station: str = "kitchen"
+
+    # Printer name -> tcp://host:port or file path; no printers means KOTs are not printed server side
+    printers: Dict[str, str] = field(default_factory=dict)
+    # Menu category -> printer name; categories without a route go to the default printer
+    print_routes: Dict[str, str] = field(default_factory=dict)
+    print_default_printer: Optional[str] = None
+    print_bill_printer: Optional[str] = None
+    print_retries: int = 3
+    print_timeout_s: float = 5.0
+    # Characters per line: 48 on 80 mm paper, 32 on 58 mm
+    print_width: int = 48
+    print_header: str = "Taste Paradise"
+    # Processes rendering invoice PDFs; None means one per CPU
+    invoice_workers: Optional[int] = None
+    invoice_cache_size: int = 256
+    invoice_header: str = "Taste Paradise"
+    # GSTIN printed on invoices
+    invoice_tax_id: str = ""
+    # Tax name -> rate in percent
+    invoice_tax_rates: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_TAX_RATES))
+    # Menu prices already include the taxes, which are then backed out of the total
+    invoice_prices_include_tax: bool = True
+    # Local time of the restaurant, for days and hours in forecasts and reports
+    timezone: str = "Asia/Kolkata"
+    # Demand forecasts, see forecast.py: days of history and how fast old weeks lose weight
+    forecast_history_days: int = 365
+    forecast_half_life_weeks: float = 8.0
+    # Query guardrails, see query_guard.py
+    query_time_limits_ms: Dict[str, int] = field(default_factory=lambda: dict(DEFAULT_QUERY_TIME_LIMITS))
+    # Most documents a list endpoint returns
+    query_max_results: int = 1000
+    # Request tracing, see tracing.py: share of requests traced, traces kept for
+    # /api/admin/traces and a JSONL file every trace is also appended to
+    trace_sample_rate: float = 0.0
+    trace_buffer_size: int = 200
+    trace_file: Optional[str] = None
+    # Tenant for requests without X-Restaurant-Id and for data from before multi-restaurant support
+    default_restaurant_id: str = DEFAULT_RESTAURANT_ID
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        storage_backend = os.environ.get('STORAGE_BACKEND', 'mongo').lower()
+        return cls(
+            # Only the Mongo backend needs a server to talk to
+            mongo_url=os.environ['MONGO_URL'] if storage_backend == 'mongo' else os.environ.get('MONGO_URL'),
+            db_name=os.environ['DB_NAME'] if storage_backend == 'mongo' else os.environ.get('DB_NAME'),
+            cors_origins=env_list('CORS_ORIGINS', '*'),
+            storage_backend=storage_backend,
+            sqlite_path=os.environ.get('SQLITE_PATH', str(ROOT_DIR / "taste_paradise.db")),
+            mongo_max_pool_size=env_int('MONGO_MAX_POOL_SIZE', 100),
+            mongo_min_pool_size=env_int('MONGO_MIN_POOL_SIZE', 0),
+            mongo_max_idle_time_ms=env_int('MONGO_MAX_IDLE_TIME_MS', None),
+            mongo_server_selection_timeout_ms=env_int('MONGO_SERVER_SELECTION_TIMEOUT_MS', 30000),
+            mongo_connect_timeout_ms=env_int('MONGO_CONNECT_TIMEOUT_MS', 20000),
+            read_preferences=env_map('MONGO_READ_PREFERENCES', DEFAULT_READ_PREFERENCES),
+            read_max_staleness_s=env_int('MONGO_MAX_STALENESS_S', 90),
+            # Embedded backends are already local, the journal only pays off in front of Mongo
+            journal_enabled=env_bool('JOURNAL_ENABLED', storage_backend == 'mongo'),
+            journal_dir=os.environ.get('JOURNAL_DIR', str(ROOT_DIR / "journal")),
+            journal_apply_timeout_ms=env_int('JOURNAL_APPLY_TIMEOUT_MS', 2000),
+            journal_replay_interval_s=env_float('JOURNAL_REPLAY_INTERVAL_S', 2.0),
+            idempotency_ttl_s=env_int('IDEMPOTENCY_TTL_S', 24 * 3600),
+            idempotency_lease_s=env_int('IDEMPOTENCY_LEASE_S', 60),
+            read_coalesce_ttl_ms=env_int('READ_COALESCE_TTL_MS', 250),
+            menu_search_refresh_s=env_float('MENU_SEARCH_REFRESH_S', 30.0),
+            inventory_refresh_s=env_float('INVENTORY_REFRESH_S', 30.0),
+            eta_refresh_s=env_float('ETA_REFRESH_S', 60.0),
+            eta_history_days=env_int('ETA_HISTORY_DAYS', 14),
+            eta_max_samples=env_int('ETA_MAX_SAMPLES', 5000),
+            eta_min_samples=env_int('ETA_MIN_SAMPLES', 20),
+            eta_kitchen_capacity=env_int('ETA_KITCHEN_CAPACITY', 4),
+            eta_cold_start_minutes=env_float('ETA_COLD_START_MINUTES', 30.0),
+            reservation_slot_minutes=env_int('RESERVATION_SLOT_MINUTES', 15),
+            reservation_duration_minutes=env_int('RESERVATION_DURATION_MINUTES', 90),
+            reservation_refresh_s=env_float('RESERVATION_REFRESH_S', 30.0),
+            walk_in_sitting_minutes=env_int('WALK_IN_SITTING_MINUTES', 60),
+            table_join_max=env_int('TABLE_JOIN_MAX', 3),
+            table_allocator_refresh_s=env_float('TABLE_ALLOCATOR_REFRESH_S', 5.0),
+            export_batch_size=env_int('EXPORT_BATCH_SIZE', 500),
+            menu_import_batch_size=env_int('MENU_IMPORT_BATCH_SIZE', 500),
+            outbox_workers=env_int('OUTBOX_WORKERS', 4),
+            outbox_poll_s=env_float('OUTBOX_POLL_S', 2.0),
+            outbox_lease_s=env_float('OUTBOX_LEASE_S', 30.0),
+            outbox_max_attempts=env_int('OUTBOX_MAX_ATTEMPTS', 10),
+            kitchen_stations=env_map('KITCHEN_STATIONS', {}),
+            default_station=os.environ.get('DEFAULT_STATION', "kitchen"),
+            printers=env_map('PRINTERS', {}),
+            print_routes=env_map('PRINT_ROUTES', {}),
+            print_default_printer=os.environ.get('PRINT_DEFAULT_PRINTER') or None,
+            print_bill_printer=os.environ.get('PRINT_BILL_PRINTER') or None,
+            print_retries=env_int('PRINT_RETRIES', 3),
+            print_timeout_s=env_float('PRINT_TIMEOUT_S', 5.0),
+            print_width=env_int('PRINT_WIDTH', 48),
+            print_header=os.environ.get('PRINT_HEADER', "Taste Paradise"),
+            invoice_workers=env_int('INVOICE_WORKERS', None),
+            invoice_cache_size=env_int('INVOICE_CACHE_SIZE', 256),
+            invoice_header=os.environ.get('INVOICE_HEADER', "Taste Paradise"),
+            invoice_tax_id=os.environ.get('INVOICE_TAX_ID', ""),
+            invoice_tax_rates={
+                name: float(rate) for name, rate in env_map('INVOICE_TAX_RATES', DEFAULT_TAX_RATES).items()
+            },
+            invoice_prices_include_tax=env_bool('INVOICE_PRICES_INCLUDE_TAX', True),
+            timezone=os.environ.get('TIMEZONE', "Asia/Kolkata"),
+            forecast_history_days=env_int('FORECAST_HISTORY_DAYS', 365),
+            forecast_half_life_weeks=env_float('FORECAST_HALF_LIFE_WEEKS', 8.0),
+            query_time_limits_ms={
+                # Listed endpoints replace the defaults one by one
+                **DEFAULT_QUERY_TIME_LIMITS,
+                **{name: int(ms) for name, ms in env_map('QUERY_TIME_LIMITS_MS', {}).items()},
+            },
+            query_max_results=env_int('QUERY_MAX_RESULTS', 1000),
+            trace_sample_rate=env_float('TRACE_SAMPLE_RATE', 0.0),
+            trace_buffer_size=env_int('TRACE_BUFFER_SIZE', 200),
+            trace_file=os.environ.get('TRACE_FILE') or None,
+            default_restaurant_id=os.environ.get('DEFAULT_RESTAURANT_ID', DEFAULT_RESTAURANT_ID),
+        )
+
+    def mongo_client_options(self) -> dict:
+        """Keyword arguments for AsyncIOMotorClient"""
+        options = {
+            "maxPoolSize": self.mongo_max_pool_size,
+            "minPoolSize": self.mongo_min_pool_size,
+            "serverSelectionTimeoutMS": self.mongo_server_selection_timeout_ms,
+            "connectTimeoutMS": self.mongo_connect_timeout_ms,
+        }
+        if self.mongo_max_idle_time_ms is not None:
+            options["maxIdleTimeMS"] = self.mongo_max_idle_time_ms
+        return options
@@ -0,0 +1,101 @@
+"""
+Single-flight coalescing for hot read endpoints.
+
+When the dashboard, the kitchen display and several tablets poll at the same
+moment, identical requests share one in-flight database call instead of each
+running their own. An optional micro-TTL keeps the finished result for a few
+hundred milliseconds so polling bursts are absorbed as well.
+
+Writes call :meth:`SingleFlight.invalidate`, so a client never gets a result
+computed before its own write from this worker. Other workers may serve a
+result at most ``ttl`` seconds old.
+"""
+
+import asyncio
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+@dataclass
+class FlightStats:
+    requests: int = 0
+    executions: int = 0
+    coalesced: int = 0
+    cache_hits: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        requests = self.requests or 1
+        return {
+            "requests": self.requests,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "cache_hits": self.cache_hits,
+            "hit_ratio": round(self.cache_hits / requests, 4),
+            "coalesce_ratio": round(self.coalesced / requests, 4),
+            "saved_ratio": round(1 - self.executions / requests, 4) if self.requests else 0.0,
+        }
+
+
+class SingleFlight:
+    def __init__(self, ttl_seconds: float = 0.0):
+        self.ttl = ttl_seconds
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._cache: Dict[Hashable, Tuple[float, Any]] = {}
+        self._generation = 0
+        # Counters per endpoint, i.e. the first element of the key
+        self._stats: Dict[str, FlightStats] = defaultdict(FlightStats)
+
+    async def do(self, key: Tuple, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Return fn()'s result, sharing it with identical concurrent calls"""
+        stats = self._stats[str(key[0])]
+        stats.requests += 1
+
+        cached = self._cache.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                stats.cache_hits += 1
+                return cached[1]
+            del self._cache[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            stats.executions += 1
+            task = asyncio.ensure_future(self._run(key, fn, self._generation))
+            # Nobody may be left waiting if every caller disconnected
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        else:
+            stats.coalesced += 1
+        # A caller that disconnects must not cancel the call others are waiting on
+        return await asyncio.shield(task)
+
+    async def _run(self, key: Tuple, fn: Callable[[], Awaitable[Any]], generation: int) -> Any:
+        try:
+            result = await fn()
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+        if self.ttl > 0 and generation == self._generation:
+            self._cache[key] = (time.monotonic() + self.ttl, result)
+        return result
+
+    def invalidate(self) -> None:
+        """Forget cached and in-flight results after a write"""
+        self._generation += 1
+        self._cache.clear()
+        self._inflight.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = FlightStats()
+        for stats in self._stats.values():
+            total.requests += stats.requests
+            total.executions += stats.executions
+            total.coalesced += stats.coalesced
+            total.cache_hits += stats.cache_hits
+        return {
+            "ttl_ms": int(self.ttl * 1000),
+            "total": total.as_dict(),
+            "endpoints": {name: stats.as_dict() for name, stats in sorted(self._stats.items())},
+        }
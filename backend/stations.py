@@ -0,0 +1,57 @@
+"""
+Kitchen stations and the tickets they work from.
+
+A KOT is split into one station ticket per station its items are cooked at,
+by menu category (``KITCHEN_STATIONS``, e.g. ``Tandoor=tandoor,Beverages=bar``).
+Each station works through its own queue with its own running ticket numbers,
+and the order follows along: cooking as soon as any station starts, ready once
+every station is done.
+"""
+
+from typing import Any, Dict, List, Optional
+
+# Ticket and order statuses in the order they move through
+PROGRESS = ["pending", "cooking", "ready", "served"]
+CANCELLED = "cancelled"
+OPEN = ["pending", "cooking"]
+
+
+class StationMap:
+    def __init__(self, routes: Dict[str, str], default: str = "kitchen"):
+        # Categories are matched case-insensitively, station names are kept as configured
+        self.routes = {category.strip().lower(): station for category, station in routes.items()}
+        self.default = default
+
+    @property
+    def stations(self) -> List[str]:
+        return sorted({self.default, *self.routes.values()})
+
+    def station_for(self, category: Optional[str]) -> str:
+        return self.routes.get((category or "").strip().lower(), self.default)
+
+    def split(self, items: List[Dict[str, Any]], categories: Dict[str, str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Items grouped per station in their original order; ``categories`` maps menu item id to category"""
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for item in items:
+            groups.setdefault(self.station_for(categories.get(item["menu_item_id"])), []).append(item)
+        return groups
+
+
+def derive_status(ticket_statuses: List[str]) -> Optional[str]:
+    """Status of an order from those of its station tickets; None when all were cancelled"""
+    active = [PROGRESS.index(status) for status in ticket_statuses if status != CANCELLED]
+    if not active:
+        return None
+    if min(active) >= PROGRESS.index("ready"):
+        # Served only once every station's food is out
+        return PROGRESS[min(active)]
+    return "cooking" if max(active) >= PROGRESS.index("cooking") else "pending"
+
+
+def advances(current: Optional[str], derived: Optional[str]) -> bool:
+    """Whether the derived status moves an order forward; orders never go back or leave cancelled"""
+    if derived is None or current == CANCELLED:
+        return False
+    if current not in PROGRESS:
+        return True
+    return PROGRESS.index(derived) > PROGRESS.index(current)
@@ -0,0 +1,45 @@
+"""Storage backends for the Taste Paradise API.
+
+``server.py`` only talks to the :class:`Storage` / :class:`Repository`
+interface; the backend is picked with the ``STORAGE_BACKEND`` setting:
+
+* ``mongo``  - MongoDB through Motor (default, production)
+* ``sqlite`` - embedded single-file database for single-terminal outlets
+* ``memory`` - process-local, for tests and demos
+"""
+
+from typing import Any, Sequence
+
+from .base import (
+    ASCENDING, DESCENDING, INDEXES, TIME_SERIES, DuplicateKeyError, QueryCancelledError,
+    QueryLimits, QueryTimeoutError, Repository, Storage, StorageUnavailableError, Update, Upsert, as_datetime,
+    current_query_limits, query_limits,
+)
+from .memory import MemoryStorage
+from .sqlite import SQLiteStorage
+
+
+def create_storage(settings, event_listeners: Sequence[Any] = ()) -> Storage:
+    """``event_listeners`` are pymongo monitoring listeners, only used by the mongo backend"""
+    backend = settings.storage_backend
+    if backend == "mongo":
+        from .mongo import MongoStorage
+
+        options = settings.mongo_client_options()
+        if event_listeners:
+            options["event_listeners"] = list(event_listeners)
+        return MongoStorage(
+            settings.mongo_url, settings.db_name, options,
+            read_preferences=settings.read_preferences, max_staleness_s=settings.read_max_staleness_s,
+        )
+    if backend == "sqlite":
+        return SQLiteStorage(settings.sqlite_path)
+    if backend == "memory":
+        return MemoryStorage()
+    raise ValueError(f"Unknown STORAGE_BACKEND {backend!r} (expected mongo, sqlite or memory)")
+
+
+__all__ = [
+    "ASCENDING", "DESCENDING", "INDEXES", "DuplicateKeyError", "Repository", "Storage", "StorageUnavailableError",
+    "Upsert", "QueryLimits", "QueryTimeoutError", "QueryCancelledError", "MemoryStorage", "SQLiteStorage", "create_storage",
+]
@@ -0,0 +1,587 @@
+import asyncio
+import copy
+import logging
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+
+Filters = Dict[str, Any]
+SortSpec = Sequence[Tuple[str, int]]
+IndexKeys = Sequence[Tuple[str, int]]
+# (filters, fields to set, fields to set only when inserting), see Repository.bulk_upsert
+Upsert = Tuple[Filters, Dict[str, Any], Dict[str, Any]]
+# (filters, fields to set, fields to increment), see Repository.bulk_update
+Update = Tuple[Filters, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+logger = logging.getLogger(__name__)
+
+ASCENDING = 1
+DESCENDING = -1
+
+
+class DuplicateKeyError(Exception):
+    """Raised when a write violates a unique index"""
+
+
+class StorageUnavailableError(Exception):
+    """Raised when the database cannot be reached"""
+
+
+class QueryTimeoutError(Exception):
+    """Raised when a read runs past its time limit, see QueryLimits"""
+
+
+class QueryCancelledError(Exception):
+    """Raised when a read is stopped because the client that asked for it went away"""
+
+
+@dataclass
+class QueryLimits:
+    """Guardrails for the reads made while serving one request.
+
+    ``max_time_ms`` bounds every read on the server side (0 for none), and
+    ``max_results`` is what list endpoints return at most. Reads issued by
+    ``task`` are tagged with ``comment`` and stop once ``cancelled`` is set;
+    reads other tasks make on its behalf, e.g. a coalesced read shared with
+    other requests, keep running.
+    """
+    endpoint: str
+    max_time_ms: int = 0
+    max_results: int = 0
+    comment: Optional[str] = None
+    task: Optional[asyncio.Task] = None
+    cancelled: bool = False
+    truncated: bool = False
+
+    def owned(self) -> bool:
+        """Whether the current task is the request's own, whose reads may be cancelled"""
+        try:
+            return self.task is not None and asyncio.current_task() is self.task
+        except RuntimeError:
+            return False
+
+
+_query_limits: ContextVar[Optional[QueryLimits]] = ContextVar("query_limits", default=None)
+
+
+def current_query_limits() -> Optional[QueryLimits]:
+    return _query_limits.get()
+
+
+@contextmanager
+def query_limits(limits: Optional[QueryLimits]) -> Iterator[Optional[QueryLimits]]:
+    """Apply ``limits`` to the reads made in this context, including tasks started from it"""
+    token = _query_limits.set(limits)
+    try:
+        yield limits
+    finally:
+        _query_limits.reset(token)
+
+
+# Index definitions shared by every backend. Every collection is partitioned by
+# restaurant_id, so it leads each index and is the natural shard key prefix.
+TENANT_COLLECTIONS = ("menu_items", "orders", "tables", "kots")
+
+INDEXES: Dict[str, List[Dict[str, Any]]] = {
+    "menu_items": [
+        {"keys": [("restaurant_id", ASCENDING), ("id", ASCENDING)], "unique": True},
+        # Also the natural key of menu imports
+        {"keys": [("restaurant_id", ASCENDING), ("category", ASCENDING), ("name", ASCENDING)]},
+    ],
+    "orders": [
+        {"keys": [("restaurant_id", ASCENDING), ("id", ASCENDING)], "unique": True},
+        # $lookup from tables.current_order_id matches on id alone
+        {"keys": [("id", ASCENDING)]},
+        {"keys": [("restaurant_id", ASCENDING), ("created_at", DESCENDING)]},
+        {"keys": [("restaurant_id", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING)]},
+        {"keys": [("restaurant_id", ASCENDING), ("payment_status", ASCENDING), ("created_at", DESCENDING)]},
+        {"keys": [("restaurant_id", ASCENDING), ("table_number", ASCENDING), ("created_at", DESCENDING)]},
+        # Order search by customer name prefix, on the casefolded copy of the name
+        {"keys": [("restaurant_id", ASCENDING), ("customer_name_lc", ASCENDING), ("created_at", DESCENDING)]},
+        # Incremental refreshes of the ETA model
+        {"keys": [("restaurant_id", ASCENDING), ("ready_at", ASCENDING), ("id", ASCENDING)]},
+    ],
+    "tables": [
+        {"keys": [("restaurant_id", ASCENDING), ("id", ASCENDING)], "unique": True},
+        {"keys": [("restaurant_id", ASCENDING), ("table_number", ASCENDING)]},
+    ],
+    "kots": [
+        {"keys": [("restaurant_id", ASCENDING), ("id", ASCENDING)], "unique": True},
+        {"keys": [("restaurant_id", ASCENDING), ("created_at", DESCENDING)]},
+        # One KOT per order, guards against retried or concurrent generate_kot calls
+        {"keys": [("restaurant_id", ASCENDING), ("order_id", ASCENDING)], "unique": True},
+    ],
+    # A KOT's share for one kitchen station, see stations.py
+    "station_tickets": [
+        {"keys": [("restaurant_id", ASCENDING), ("id", ASCENDING)], "unique": True},
+        # A station's queue: its open tickets, oldest first
+        {"keys": [("restaurant_id", ASCENDING), ("station", ASCENDING), ("status", ASCENDING),
+                  ("created_at", ASCENDING)]},
+        # Like kots, guards against tickets from a concurrent generate_kot call that lost
+        {"keys": [("restaurant_id", ASCENDING), ("order_id", ASCENDING), ("station", ASCENDING)], "unique": True},
+    ],
+    "reservations": [
+        {"keys": [("restaurant_id", ASCENDING), ("id", ASCENDING)], "unique": True},
+        {"keys": [("restaurant_id", ASCENDING), ("start_at", ASCENDING)]},
+        {"keys": [("restaurant_id", ASCENDING), ("status", ASCENDING), ("end_at", ASCENDING)]},
+    ],
+    # One document per table and time slot a reservation holds, see reservations.py
+    "reservation_slots": [
+        {"keys": [("restaurant_id", ASCENDING), ("table_id", ASCENDING), ("slot", ASCENDING)], "unique": True},
+        {"keys": [("restaurant_id", ASCENDING), ("reservation_id", ASCENDING)]},
+    ],
+    # Side effects waiting to run, see outbox.py
+    "outbox": [
+        {"keys": [("restaurant_id", ASCENDING), ("id", ASCENDING)], "unique": True},
+        # The sweeper looks for due entries of every restaurant at once
+        {"keys": [("status", ASCENDING), ("available_at", ASCENDING)]},
+    ],
+    # Ingredient stock, see inventory.py
+    "inventory": [
+        {"keys": [("restaurant_id", ASCENDING), ("id", ASCENDING)], "unique": True},
+        {"keys": [("restaurant_id", ASCENDING), ("name", ASCENDING)]},
+    ],
+    # Order creation and status events behind the heatmaps, see order_events.py
+    "order_events": [
+        {"keys": [("meta.restaurant_id", ASCENDING), ("at", ASCENDING)]},
+    ],
+    # One immutable Z-report per business day
+    "day_reports": [
+        {"keys": [("restaurant_id", ASCENDING), ("date", DESCENDING)], "unique": True},
+    ],
+    # Expected demand per menu item, weekday and hour, see forecast.py
+    "forecasts": [
+        {"keys": [("restaurant_id", ASCENDING), ("weekday", ASCENDING), ("hour", ASCENDING),
+                  ("menu_item_id", ASCENDING)], "unique": True},
+    ],
+    # Per-restaurant sequences such as the KOT number
+    "counters": [
+        {"keys": [("restaurant_id", ASCENDING), ("name", ASCENDING)], "unique": True},
+    ],
+}
+
+
+# Collections created as MongoDB time-series collections: documents are bucketed
+# by metaField and time, which keeps them small and range scans over time fast.
+# Other backends store them as ordinary collections.
+TIME_SERIES: Dict[str, Dict[str, Any]] = {
+    "order_events": {"time_field": "at", "meta_field": "meta", "granularity": "minutes"},
+}
+
+
+def as_datetime(value: Any) -> datetime:
+    """A stored timestamp (datetime or ISO string) as an aware UTC datetime"""
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def plain(value: Any) -> Any:
+    """Unwrap enums so values compare and serialize like the stored documents"""
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def get_path(doc: Dict[str, Any], path: str) -> Tuple[bool, Any]:
+    """Resolve a dotted field path, returning (found, value)"""
+    current: Any = doc
+    for part in path.split('.'):
+        if not isinstance(current, dict) or part not in current:
+            return False, None
+        current = current[part]
+    return True, current
+
+
+def _compare(value: Any, operator: str, operand: Any) -> bool:
+    if value is None or operand is None:
+        return False
+    try:
+        if operator == "$gt":
+            return value > operand
+        if operator == "$gte":
+            return value >= operand
+        if operator == "$lt":
+            return value < operand
+        if operator == "$lte":
+            return value <= operand
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported operator {operator}")
+
+
+def matches(doc: Dict[str, Any], filters: Optional[Filters]) -> bool:
+    """Evaluate the Mongo filter subset used by the API against a document"""
+    for key, condition in (filters or {}).items():
+        if key == "$or":
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+            continue
+        if key == "$and":
+            if not all(matches(doc, sub) for sub in condition):
+                return False
+            continue
+
+        found, value = get_path(doc, key)
+        if isinstance(condition, dict) and condition and all(op.startswith('$') for op in condition):
+            for operator, operand in condition.items():
+                operand = plain(operand)
+                if operator == "$eq":
+                    if value != operand:
+                        return False
+                elif operator == "$ne":
+                    if value == operand:
+                        return False
+                elif operator == "$in":
+                    if value not in [plain(o) for o in operand]:
+                        return False
+                elif operator == "$nin":
+                    if value in [plain(o) for o in operand]:
+                        return False
+                elif operator == "$exists":
+                    if found != bool(operand):
+                        return False
+                elif operator in ("$gt", "$gte", "$lt", "$lte"):
+                    if not _compare(value, operator, operand):
+                        return False
+                else:
+                    raise ValueError(f"Unsupported operator {operator}")
+        elif value != plain(condition):
+            return False
+    return True
+
+
+def apply_update(doc: Dict[str, Any], set_fields: Optional[Dict[str, Any]] = None,
+                 inc_fields: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Apply $set / $inc style changes to a document in place"""
+    for key, value in (set_fields or {}).items():
+        doc[key] = plain(value)
+    for key, value in (inc_fields or {}).items():
+        doc[key] = (doc.get(key) or 0) + value
+    return doc
+
+
+def upsert_document(filters: Optional[Filters], set_fields: Optional[Dict[str, Any]] = None,
+                    inc_fields: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Build the document inserted by an upsert that matched nothing"""
+    doc = {
+        key: plain(value) for key, value in (filters or {}).items()
+        if not key.startswith('$') and not isinstance(value, dict)
+    }
+    return apply_update(doc, set_fields, inc_fields)
+
+
+def sort_documents(docs: List[Dict[str, Any]], sort: Optional[SortSpec]) -> List[Dict[str, Any]]:
+    """Sort documents in place following a Mongo style sort spec"""
+    def sort_value(doc: Dict[str, Any], field: str) -> Tuple[bool, Any]:
+        # Missing values sort before everything else, like in MongoDB
+        value = get_path(doc, field)[1]
+        return (value is not None, value if value is not None else 0)
+
+    for field, direction in reversed(list(sort or [])):
+        docs.sort(key=lambda doc: sort_value(doc, field), reverse=direction < 0)
+    return docs
+
+
+def clone(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return copy.deepcopy(doc)
+
+
+class Repository(ABC):
+    """Document repository for one collection.
+
+    The method names and filter syntax follow Motor so Mongo stays the
+    reference behaviour; embedded backends implement the subset used by the API.
+    """
+
+    name: str
+
+    @abstractmethod
+    async def insert_one(self, doc: Dict[str, Any]) -> None: ...
+
+    @abstractmethod
+    async def insert_many(self, docs: List[Dict[str, Any]]) -> None: ...
+
+    @abstractmethod
+    async def find_one(self, filters: Optional[Filters] = None,
+                       sort: Optional[SortSpec] = None) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def find(self, filters: Optional[Filters] = None, sort: Optional[SortSpec] = None,
+                   limit: Optional[int] = None, skip: int = 0) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def iterate(self, filters: Optional[Filters] = None, sort: Optional[SortSpec] = None,
+                batch_size: int = 500) -> AsyncIterator[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def update_one(self, filters: Filters, set: Optional[Dict[str, Any]] = None,
+                         inc: Optional[Dict[str, Any]] = None, upsert: bool = False) -> int:
+        """Update the first matching document and return the matched count"""
+
+    @abstractmethod
+    async def update_many(self, filters: Filters, set: Optional[Dict[str, Any]] = None,
+                          inc: Optional[Dict[str, Any]] = None) -> int: ...
+
+    @abstractmethod
+    async def find_one_and_update(self, filters: Filters, set: Optional[Dict[str, Any]] = None,
+                                  inc: Optional[Dict[str, Any]] = None,
+                                  upsert: bool = False) -> Optional[Dict[str, Any]]:
+        """Atomically update a document and return it after the change"""
+
+    @abstractmethod
+    async def replace_one(self, filters: Filters, doc: Dict[str, Any], upsert: bool = False) -> int: ...
+
+    @abstractmethod
+    async def delete_one(self, filters: Filters) -> int: ...
+
+    @abstractmethod
+    async def delete_many(self, filters: Filters) -> int: ...
+
+    @abstractmethod
+    async def count(self, filters: Optional[Filters] = None) -> int: ...
+
+    @abstractmethod
+    async def distinct(self, field: str, filters: Optional[Filters] = None) -> List[Any]: ...
+
+    @abstractmethod
+    async def sum(self, field: str, filters: Optional[Filters] = None) -> float: ...
+
+    @abstractmethod
+    async def create_index(self, keys: IndexKeys, unique: bool = False, **options) -> None: ...
+
+    async def bulk_upsert(self, updates: List[Upsert]) -> Tuple[int, int]:
+        """Apply many upserts, in one round trip where the backend allows it.
+
+        Each update works like an UpdateOne with ``$set``, ``$setOnInsert`` and
+        ``upsert=True``. Returns (matched, inserted).
+        """
+        matched = 0
+        for filters, set_fields, on_insert in updates:
+            if await self.update_one(filters, set=set_fields):
+                matched += 1
+            else:
+                await self.update_one(filters, set={**on_insert, **set_fields}, upsert=True)
+        return matched, len(updates) - matched
+
+    async def bulk_update(self, updates: List[Update]) -> int:
+        """Apply many single-document updates, in one round trip where the backend allows it.
+
+        Each update works like an UpdateOne with ``$set`` and ``$inc``. Returns the
+        number that matched a document.
+        """
+        matched = 0
+        for filters, set_fields, inc_fields in updates:
+            matched += await self.update_one(filters, set=set_fields, inc=inc_fields)
+        return matched
+
+    async def lookup(self, filters: Optional[Filters], local_field: str, foreign: "Repository",
+                     foreign_field: str, as_field: str, foreign_filters: Optional[Filters] = None,
+                     sort: Optional[SortSpec] = None) -> List[Dict[str, Any]]:
+        """Matching documents with ``as_field`` set to the first ``foreign`` document
+        whose ``foreign_field`` equals their ``local_field`` (or None), like a $lookup.
+
+        ``foreign_filters`` are equality conditions the joined document must also meet.
+        """
+        docs = await self.find(filters, sort=sort)
+        keys = list({doc[local_field] for doc in docs if doc.get(local_field) is not None})
+        joined: Dict[Any, Dict[str, Any]] = {}
+        if keys:
+            for other in await foreign.find({**(foreign_filters or {}), foreign_field: {"$in": keys}}):
+                joined.setdefault(other.get(foreign_field), other)
+        for doc in docs:
+            doc[as_field] = joined.get(doc.get(local_field))
+        return docs
+
+    async def hourly_item_quantities(self, filters: Optional[Filters], time_field: str = "created_at",
+                                     tz: str = "UTC", batch_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """Quantity of each ``items.menu_item_id`` per local day and hour of ``time_field``,
+        like an $unwind + $group, as {menu_item_id, day: "YYYY-MM-DD", hour, quantity}
+
+        Only the running totals are held in memory, never the matching documents.
+        """
+        zone = ZoneInfo(tz)
+        totals: Dict[Tuple[str, str, int], float] = defaultdict(float)
+        async for doc in self.iterate(filters, batch_size=batch_size):
+            at = doc.get(time_field)
+            if at is None:
+                continue
+            local = as_datetime(at).astimezone(zone)
+            for item in doc.get("items", []):
+                totals[(item["menu_item_id"], local.date().isoformat(), local.hour)] += item.get("quantity", 1)
+        for (menu_item_id, day, hour), quantity in totals.items():
+            yield {"menu_item_id": menu_item_id, "day": day, "hour": hour, "quantity": quantity}
+
+    async def weekday_hour_counts(self, filters: Optional[Filters], time_field: str, tz: str = "UTC",
+                                  batch_size: int = 500) -> List[Dict[str, Any]]:
+        """Matching documents per local weekday (0 is Monday) and hour of ``time_field``,
+        as {weekday, hour, count}
+        """
+        zone = ZoneInfo(tz)
+        counts: Dict[Tuple[int, int], int] = defaultdict(int)
+        async for doc in self.iterate(filters, batch_size=batch_size):
+            found, at = get_path(doc, time_field)
+            if found and at is not None:
+                local = as_datetime(at).astimezone(zone)
+                counts[(local.weekday(), local.hour)] += 1
+        return [{"weekday": weekday, "hour": hour, "count": count} for (weekday, hour), count in counts.items()]
+
+    async def interval_counts(self, filters: Optional[Filters], time_field: str, minutes: int,
+                              group_field: Optional[str] = None, batch_size: int = 500) -> List[Dict[str, Any]]:
+        """Matching documents per ``minutes``-long interval of ``time_field`` (and value of
+        ``group_field``), like a $group on $dateTrunc, as {start, key, count}
+        """
+        width = minutes * 60
+        counts: Dict[Tuple[float, Any], int] = defaultdict(int)
+        async for doc in self.iterate(filters, batch_size=batch_size):
+            found, at = get_path(doc, time_field)
+            if found and at is not None:
+                start = as_datetime(at).timestamp() // width * width
+                counts[(start, get_path(doc, group_field)[1] if group_field else None)] += 1
+        return [{"start": datetime.fromtimestamp(start, timezone.utc), "key": key, "count": count}
+                for (start, key), count in counts.items()]
+
+    async def sales_totals(self, filters: Optional[Filters], batch_size: int = 500) -> Dict[str, List[Dict[str, Any]]]:
+        """Order totals for a sales report, like one $facet of two $groups:
+
+        ``orders``: {cancelled, paid, payment_method, count, amount} per combination seen
+        ``items``: {menu_item_id, menu_item_name, quantity, amount} over orders not cancelled
+
+        Only the running totals are held in memory, never the matching documents.
+        """
+        orders: Dict[Tuple[bool, bool, Optional[str]], List[float]] = defaultdict(lambda: [0, 0.0])
+        items: Dict[str, Dict[str, Any]] = {}
+        async for doc in self.iterate(filters, batch_size=batch_size):
+            cancelled = doc.get("status") == "cancelled"
+            totals = orders[(cancelled, doc.get("payment_status") == "paid", doc.get("payment_method"))]
+            totals[0] += 1
+            totals[1] += doc.get("total_amount") or 0
+            if cancelled:
+                continue
+            for item in doc.get("items", []):
+                sold = items.setdefault(item["menu_item_id"], {
+                    "menu_item_id": item["menu_item_id"], "menu_item_name": item.get("menu_item_name", ""),
+                    "quantity": 0, "amount": 0.0,
+                })
+                sold["quantity"] += item.get("quantity", 1)
+                sold["amount"] += item.get("quantity", 1) * item.get("price", 0)
+        return {
+            "orders": [{"cancelled": cancelled, "paid": paid, "payment_method": method, "count": count, "amount": amount}
+                       for (cancelled, paid, method), (count, amount) in orders.items()],
+            "items": list(items.values()),
+        }
+
+
+class Storage(ABC):
+    """A set of repositories backed by one database"""
+
+    backend: str
+
+    def __init__(self):
+        self._repositories: Dict[str, Repository] = {}
+
+    @abstractmethod
+    def _make_repository(self, name: str) -> Repository: ...
+
+    def collection(self, name: str) -> Repository:
+        if name not in self._repositories:
+            self._repositories[name] = self._make_repository(name)
+        return self._repositories[name]
+
+    @property
+    def menu_items(self) -> Repository:
+        return self.collection("menu_items")
+
+    @property
+    def orders(self) -> Repository:
+        return self.collection("orders")
+
+    @property
+    def tables(self) -> Repository:
+        return self.collection("tables")
+
+    @property
+    def kots(self) -> Repository:
+        return self.collection("kots")
+
+    @property
+    def station_tickets(self) -> Repository:
+        return self.collection("station_tickets")
+
+    def reads(self, endpoint: str) -> "Storage":
+        """Storage to serve an endpoint's read-only queries from.
+
+        Only Mongo replica sets have other copies to read from; everything else
+        reads where it writes.
+        """
+        return self
+
+    async def connect(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def ping(self) -> bool:
+        return True
+
+    async def cancel_queries(self, comment: str) -> int:
+        """Stop the reads still running on the server that are tagged with ``comment``;
+        backends that check ``QueryLimits.cancelled`` themselves have nothing to do
+        """
+        return 0
+
+    async def assign_default_tenant(self, restaurant_id: str) -> None:
+        """Move documents written before multi-restaurant support into the default restaurant"""
+        for name in TENANT_COLLECTIONS:
+            moved = await self.collection(name).update_many(
+                {"restaurant_id": {"$exists": False}}, set={"restaurant_id": restaurant_id}
+            )
+            if moved:
+                logger.info("Assigned %d %s to restaurant %s", moved, name, restaurant_id)
+
+    async def fold_customer_names(self, batch_size: int = 1000) -> None:
+        """Give orders placed before order search the casefolded name it matches on"""
+        folded = 0
+        while True:
+            orders = await self.orders.find({"customer_name_lc": {"$exists": False}}, limit=batch_size)
+            if not orders:
+                break
+            for order in orders:
+                await self.orders.update_one({"restaurant_id": order.get("restaurant_id"), "id": order["id"]},
+                                             set={"customer_name_lc": order.get("customer_name", "").casefold()})
+            folded += len(orders)
+        if folded:
+            logger.info("Folded the customer names of %d orders", folded)
+
+    async def create_time_series(self, name: str, time_field: str, meta_field: str, granularity: str) -> None:
+        """Create a collection as a time-series collection where the backend has them"""
+
+    async def ensure_indexes(self) -> None:
+        # Before any index, which would create them as ordinary collections
+        for name, options in TIME_SERIES.items():
+            try:
+                await self.create_time_series(name, **options)
+            except StorageUnavailableError:
+                raise
+            except Exception as exc:
+                logger.warning("Could not create time-series collection %s: %s", name, exc)
+        for name, indexes in INDEXES.items():
+            for index in indexes:
+                options = {k: v for k, v in index.items() if k != "keys"}
+                try:
+                    await self.collection(name).create_index(index["keys"], **options)
+                except StorageUnavailableError:
+                    raise
+                except Exception as exc:
+                    # e.g. existing duplicates blocking a unique index; keep serving and say why
+                    logger.warning("Could not create index %s on %s: %s", index["keys"], name, exc)
@@ -0,0 +1,196 @@
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from .base import (
+    DuplicateKeyError, Filters, IndexKeys, Repository, SortSpec, Storage,
+    apply_update, clone, get_path, matches, plain, sort_documents, upsert_document,
+)
+
+
+class MemoryRepository(Repository):
+    """Process-local collection, used for tests and throwaway demo terminals"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._docs: List[Dict[str, Any]] = []
+        # Unique indexes double as hash lookups: fields -> key values -> document
+        self._unique: Dict[Tuple[str, ...], Dict[Tuple[Any, ...], Dict[str, Any]]] = {}
+        # Leading fields of the other indexes (e.g. restaurant_id) bucket the documents:
+        # field -> value -> {id(doc): doc}, so a filter on one tenant never scans the rest
+        self._groups: Dict[str, Dict[Any, Dict[int, Dict[str, Any]]]] = {}
+
+    @staticmethod
+    def _key(doc: Dict[str, Any], fields: Tuple[str, ...]) -> Tuple[Any, ...]:
+        return tuple(get_path(doc, f)[1] for f in fields)
+
+    def _check_unique(self, doc: Dict[str, Any], ignore: Optional[Dict[str, Any]] = None):
+        for fields, index in self._unique.items():
+            existing = index.get(self._key(doc, fields))
+            if existing is not None and existing is not ignore:
+                raise DuplicateKeyError(f"Duplicate key {self._key(doc, fields)} for {self.name}.{fields}")
+
+    def _index(self, doc: Dict[str, Any], group_fields: Optional[List[str]] = None) -> None:
+        for fields, index in self._unique.items():
+            index[self._key(doc, fields)] = doc
+        for field in self._groups if group_fields is None else group_fields:
+            self._groups[field].setdefault(get_path(doc, field)[1], {})[id(doc)] = doc
+
+    def _unindex(self, doc: Dict[str, Any], group_fields: Optional[List[str]] = None) -> None:
+        for fields, index in self._unique.items():
+            if index.get(self._key(doc, fields)) is doc:
+                del index[self._key(doc, fields)]
+        for field in self._groups if group_fields is None else group_fields:
+            groups = self._groups[field]
+            value = get_path(doc, field)[1]
+            group = groups.get(value)
+            if group is not None:
+                group.pop(id(doc), None)
+                if not group:
+                    del groups[value]
+
+    def _candidates(self, filters: Optional[Filters]) -> List[Dict[str, Any]]:
+        """Use a unique index when the filter pins all of its fields, else a bucket"""
+        if not filters:
+            return self._docs
+        for fields, index in self._unique.items():
+            if all(f in filters and not isinstance(filters[f], dict) for f in fields):
+                doc = index.get(tuple(plain(filters[f]) for f in fields))
+                return [doc] if doc is not None else []
+        for field, groups in self._groups.items():
+            if field in filters and not isinstance(filters[field], dict):
+                return list(groups.get(plain(filters[field]), {}).values())
+        return self._docs
+
+    def _matching(self, filters: Optional[Filters], sort: Optional[SortSpec] = None) -> List[Dict[str, Any]]:
+        docs = [doc for doc in self._candidates(filters) if matches(doc, filters)]
+        return sort_documents(docs, sort) if sort else docs
+
+    async def insert_one(self, doc: Dict[str, Any]) -> None:
+        stored = {key: plain(value) for key, value in clone(doc).items()}
+        self._check_unique(stored)
+        self._docs.append(stored)
+        self._index(stored)
+
+    async def insert_many(self, docs: List[Dict[str, Any]]) -> None:
+        for doc in docs:
+            await self.insert_one(doc)
+
+    async def find_one(self, filters: Optional[Filters] = None,
+                       sort: Optional[SortSpec] = None) -> Optional[Dict[str, Any]]:
+        docs = self._matching(filters, sort)
+        return clone(docs[0]) if docs else None
+
+    async def find(self, filters: Optional[Filters] = None, sort: Optional[SortSpec] = None,
+                   limit: Optional[int] = None, skip: int = 0) -> List[Dict[str, Any]]:
+        docs = self._matching(filters, sort)[skip:]
+        if limit:
+            docs = docs[:limit]
+        return [clone(doc) for doc in docs]
+
+    async def iterate(self, filters: Optional[Filters] = None, sort: Optional[SortSpec] = None,
+                      batch_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        for doc in self._matching(filters, sort):
+            yield clone(doc)
+
+    def _update(self, doc: Dict[str, Any], set_fields, inc_fields) -> None:
+        self._replace(doc, apply_update(clone(doc), set_fields, inc_fields))
+
+    def _replace(self, doc: Dict[str, Any], replacement: Dict[str, Any]) -> None:
+        self._check_unique(replacement, ignore=doc)
+        # Only move between buckets when the value changes, keeping insertion order
+        moved = [f for f in self._groups if get_path(doc, f)[1] != get_path(replacement, f)[1]]
+        self._unindex(doc, moved)
+        doc.clear()
+        doc.update(replacement)
+        self._index(doc, moved)
+
+    async def update_one(self, filters: Filters, set: Optional[Dict[str, Any]] = None,
+                         inc: Optional[Dict[str, Any]] = None, upsert: bool = False) -> int:
+        docs = self._matching(filters)
+        if docs:
+            self._update(docs[0], set, inc)
+            return 1
+        if upsert:
+            await self.insert_one(upsert_document(filters, set, inc))
+        return 0
+
+    async def update_many(self, filters: Filters, set: Optional[Dict[str, Any]] = None,
+                          inc: Optional[Dict[str, Any]] = None) -> int:
+        docs = self._matching(filters)
+        for doc in docs:
+            self._update(doc, set, inc)
+        return len(docs)
+
+    async def find_one_and_update(self, filters: Filters, set: Optional[Dict[str, Any]] = None,
+                                  inc: Optional[Dict[str, Any]] = None,
+                                  upsert: bool = False) -> Optional[Dict[str, Any]]:
+        docs = self._matching(filters)
+        if docs:
+            self._update(docs[0], set, inc)
+            return clone(docs[0])
+        if upsert:
+            doc = upsert_document(filters, set, inc)
+            await self.insert_one(doc)
+            return clone(doc)
+        return None
+
+    async def replace_one(self, filters: Filters, doc: Dict[str, Any], upsert: bool = False) -> int:
+        docs = self._matching(filters)
+        if docs:
+            self._replace(docs[0], {key: plain(value) for key, value in clone(doc).items()})
+            return 1
+        if upsert:
+            await self.insert_one(doc)
+        return 0
+
+    async def delete_one(self, filters: Filters) -> int:
+        docs = self._matching(filters)
+        if not docs:
+            return 0
+        self._unindex(docs[0])
+        self._docs = [doc for doc in self._docs if doc is not docs[0]]
+        return 1
+
+    async def delete_many(self, filters: Filters) -> int:
+        docs = self._matching(filters)
+        removed = {id(doc) for doc in docs}
+        for doc in docs:
+            self._unindex(doc)
+        self._docs = [doc for doc in self._docs if id(doc) not in removed]
+        return len(docs)
+
+    async def count(self, filters: Optional[Filters] = None) -> int:
+        return len(self._matching(filters))
+
+    async def distinct(self, field: str, filters: Optional[Filters] = None) -> List[Any]:
+        values: List[Any] = []
+        for doc in self._matching(filters):
+            found, value = get_path(doc, field)
+            if found and value not in values:
+                values.append(value)
+        return values
+
+    async def sum(self, field: str, filters: Optional[Filters] = None) -> float:
+        return sum(get_path(doc, field)[1] or 0 for doc in self._matching(filters))
+
+    async def create_index(self, keys: IndexKeys, unique: bool = False, **options) -> None:
+        fields = tuple(field for field, _ in keys)
+        if unique and fields not in self._unique:
+            index: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+            for doc in self._docs:
+                key = self._key(doc, fields)
+                if key in index:
+                    raise DuplicateKeyError(f"Duplicate key {key} for {self.name}.{fields}")
+                index[key] = doc
+            self._unique[fields] = index
+        elif not unique and len(fields) > 1 and fields[0] not in self._groups:
+            groups: Dict[Any, Dict[int, Dict[str, Any]]] = {}
+            for doc in self._docs:
+                groups.setdefault(get_path(doc, fields[0])[1], {})[id(doc)] = doc
+            self._groups[fields[0]] = groups
+
+
+class MemoryStorage(Storage):
+    backend = "memory"
+
+    def _make_repository(self, name: str) -> Repository:
+        return MemoryRepository(name)
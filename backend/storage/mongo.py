@@ -0,0 +1,429 @@
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import SON
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import (
+    BulkWriteError, CollectionInvalid, ConnectionFailure, DuplicateKeyError as MongoDuplicateKeyError,
+    ExecutionTimeout, OperationFailure,
+)
+from pymongo.read_preferences import (
+    Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred, _ServerMode,
+)
+
+from .base import (
+    DuplicateKeyError, Filters, IndexKeys, QueryCancelledError, QueryTimeoutError, Repository, SortSpec, Storage,
+    StorageUnavailableError, Update, Upsert, as_datetime, current_query_limits,
+)
+
+
+NO_ID = {"_id": 0}
+
+READ_MODES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+# The smallest maxStalenessSeconds MongoDB accepts
+MIN_MAX_STALENESS_S = 90
+# Error code of an operation stopped by killOp
+INTERRUPTED = 11601
+
+
+@contextmanager
+def translate_errors():
+    """Map driver errors onto the backend independent storage exceptions"""
+    try:
+        yield
+    except MongoDuplicateKeyError as exc:
+        raise DuplicateKeyError(str(exc)) from exc
+    except BulkWriteError as exc:
+        if any(error.get("code") == 11000 for error in exc.details.get("writeErrors", [])):
+            raise DuplicateKeyError(str(exc)) from exc
+        raise
+    except ExecutionTimeout as exc:
+        raise QueryTimeoutError(str(exc)) from exc
+    except OperationFailure as exc:
+        if exc.code == INTERRUPTED:
+            raise QueryCancelledError(str(exc)) from exc
+        raise
+    except ConnectionFailure as exc:
+        raise StorageUnavailableError(str(exc)) from exc
+
+
+def read_options() -> Dict[str, Any]:
+    """maxTimeMS and comment for a read, from the QueryLimits of the request being served"""
+    limits = current_query_limits()
+    options: Dict[str, Any] = {}
+    if limits is not None:
+        if limits.max_time_ms:
+            options["maxTimeMS"] = limits.max_time_ms
+        if limits.comment and limits.owned():
+            # Lets cancel_queries find the request's own operations
+            options["comment"] = limits.comment
+    return options
+
+
+def read_preference(mode: str, max_staleness_s: Optional[int] = None) -> _ServerMode:
+    """Build a pymongo read preference from its connection string name"""
+    if mode not in READ_MODES:
+        raise ValueError(f"Unknown read preference {mode!r} (expected one of {', '.join(READ_MODES)})")
+    if mode == "primary":
+        return Primary()
+    if max_staleness_s is None or max_staleness_s <= 0:
+        return READ_MODES[mode]()
+    if max_staleness_s < MIN_MAX_STALENESS_S:
+        raise ValueError(f"maxStalenessSeconds must be at least {MIN_MAX_STALENESS_S}, got {max_staleness_s}")
+    return READ_MODES[mode](max_staleness=max_staleness_s)
+
+
+def _update_spec(set_fields: Optional[Dict[str, Any]], inc_fields: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    spec: Dict[str, Any] = {}
+    if set_fields:
+        spec["$set"] = set_fields
+    if inc_fields:
+        spec["$inc"] = inc_fields
+    return spec
+
+
+class MongoRepository(Repository):
+    """Repository backed by a Motor collection"""
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+        self.name = collection.name
+
+    async def insert_one(self, doc: Dict[str, Any]) -> None:
+        with translate_errors():
+            # Motor adds _id to the dict it is given, keep the caller's copy clean
+            await self.collection.insert_one(dict(doc))
+
+    async def insert_many(self, docs: List[Dict[str, Any]]) -> None:
+        if not docs:
+            return
+        with translate_errors():
+            await self.collection.insert_many([dict(doc) for doc in docs])
+
+    async def find_one(self, filters: Optional[Filters] = None,
+                       sort: Optional[SortSpec] = None) -> Optional[Dict[str, Any]]:
+        options = read_options()
+        with translate_errors():
+            return await self.collection.find_one(filters or {}, NO_ID, sort=list(sort) if sort else None,
+                                                  max_time_ms=options.get("maxTimeMS"), comment=options.get("comment"))
+
+    def _cursor(self, filters: Optional[Filters], sort: Optional[SortSpec],
+                limit: Optional[int] = None, skip: int = 0):
+        options = read_options()
+        cursor = self.collection.find(filters or {}, NO_ID,
+                                      max_time_ms=options.get("maxTimeMS"), comment=options.get("comment"))
+        if sort:
+            cursor = cursor.sort(list(sort))
+        if skip:
+            cursor = cursor.skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
+        return cursor
+
+    async def find(self, filters: Optional[Filters] = None, sort: Optional[SortSpec] = None,
+                   limit: Optional[int] = None, skip: int = 0) -> List[Dict[str, Any]]:
+        with translate_errors():
+            return await self._cursor(filters, sort, limit, skip).to_list(length=limit)
+
+    async def iterate(self, filters: Optional[Filters] = None, sort: Optional[SortSpec] = None,
+                      batch_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        with translate_errors():
+            async for doc in self._cursor(filters, sort).batch_size(batch_size):
+                yield doc
+
+    async def update_one(self, filters: Filters, set: Optional[Dict[str, Any]] = None,
+                         inc: Optional[Dict[str, Any]] = None, upsert: bool = False) -> int:
+        with translate_errors():
+            result = await self.collection.update_one(filters, _update_spec(set, inc), upsert=upsert)
+        return result.matched_count
+
+    async def update_many(self, filters: Filters, set: Optional[Dict[str, Any]] = None,
+                          inc: Optional[Dict[str, Any]] = None) -> int:
+        with translate_errors():
+            result = await self.collection.update_many(filters, _update_spec(set, inc))
+        return result.matched_count
+
+    async def find_one_and_update(self, filters: Filters, set: Optional[Dict[str, Any]] = None,
+                                  inc: Optional[Dict[str, Any]] = None,
+                                  upsert: bool = False) -> Optional[Dict[str, Any]]:
+        with translate_errors():
+            return await self.collection.find_one_and_update(
+                filters, _update_spec(set, inc), projection=NO_ID,
+                upsert=upsert, return_document=ReturnDocument.AFTER
+            )
+
+    async def replace_one(self, filters: Filters, doc: Dict[str, Any], upsert: bool = False) -> int:
+        with translate_errors():
+            result = await self.collection.replace_one(filters, dict(doc), upsert=upsert)
+        return result.matched_count
+
+    async def bulk_upsert(self, updates: List[Upsert]) -> Tuple[int, int]:
+        if not updates:
+            return 0, 0
+        requests = []
+        for filters, set_fields, on_insert in updates:
+            spec = _update_spec(set_fields, None)
+            if on_insert:
+                spec["$setOnInsert"] = on_insert
+            requests.append(UpdateOne(filters, spec, upsert=True))
+        with translate_errors():
+            result = await self.collection.bulk_write(requests, ordered=False)
+        return result.matched_count, result.upserted_count
+
+    async def bulk_update(self, updates: List[Update]) -> int:
+        if not updates:
+            return 0
+        requests = [
+            UpdateOne(filters, _update_spec(set_fields, inc_fields)) for filters, set_fields, inc_fields in updates
+        ]
+        with translate_errors():
+            result = await self.collection.bulk_write(requests, ordered=False)
+        return result.matched_count
+
+    async def delete_one(self, filters: Filters) -> int:
+        with translate_errors():
+            result = await self.collection.delete_one(filters)
+        return result.deleted_count
+
+    async def delete_many(self, filters: Filters) -> int:
+        with translate_errors():
+            result = await self.collection.delete_many(filters)
+        return result.deleted_count
+
+    async def count(self, filters: Optional[Filters] = None) -> int:
+        with translate_errors():
+            return await self.collection.count_documents(filters or {}, **read_options())
+
+    async def distinct(self, field: str, filters: Optional[Filters] = None) -> List[Any]:
+        with translate_errors():
+            return await self.collection.distinct(field, filters or {}, **read_options())
+
+    async def sum(self, field: str, filters: Optional[Filters] = None) -> float:
+        pipeline = [
+            {"$match": filters or {}},
+            {"$group": {"_id": None, "total": {"$sum": f"${field}"}}},
+        ]
+        with translate_errors():
+            result = await self.collection.aggregate(pipeline, **read_options()).to_list(length=1)
+        return result[0]["total"] if result else 0
+
+    async def lookup(self, filters: Optional[Filters], local_field: str, foreign: Repository,
+                     foreign_field: str, as_field: str, foreign_filters: Optional[Filters] = None,
+                     sort: Optional[SortSpec] = None) -> List[Dict[str, Any]]:
+        if not isinstance(foreign, MongoRepository) or foreign.collection.database.name != self.collection.database.name:
+            return await super().lookup(filters, local_field, foreign, foreign_field, as_field, foreign_filters, sort)
+        joined: Any = f"${as_field}"
+        if foreign_filters:
+            joined = {"$filter": {
+                "input": joined,
+                "cond": {"$and": [{"$eq": [f"$$this.{field}", value]} for field, value in foreign_filters.items()]},
+            }}
+        pipeline: List[Dict[str, Any]] = [{"$match": filters or {}}]
+        if sort:
+            pipeline.append({"$sort": SON(list(sort))})
+        pipeline += [
+            {"$lookup": {
+                "from": foreign.collection.name,
+                "localField": local_field,
+                "foreignField": foreign_field,
+                "as": as_field,
+            }},
+            {"$addFields": {as_field: {"$ifNull": [{"$arrayElemAt": [joined, 0]}, None]}}},
+            {"$project": {"_id": 0, f"{as_field}._id": 0}},
+        ]
+        with translate_errors():
+            return await self.collection.aggregate(pipeline, **read_options()).to_list(length=None)
+
+    async def hourly_item_quantities(self, filters: Optional[Filters], time_field: str = "created_at",
+                                     tz: str = "UTC", batch_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        # Timestamps are stored as UTC ISO strings; the first 19 characters parse as UTC
+        at = {"$toDate": {"$substrBytes": [f"${time_field}", 0, 19]}}
+        pipeline = [
+            {"$match": filters or {}},
+            {"$project": {"_id": 0, "items.menu_item_id": 1, "items.quantity": 1, "at": at}},
+            {"$unwind": "$items"},
+            {"$group": {
+                "_id": {
+                    "menu_item_id": "$items.menu_item_id",
+                    "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$at", "timezone": tz}},
+                    "hour": {"$hour": {"date": "$at", "timezone": tz}},
+                },
+                "quantity": {"$sum": {"$ifNull": ["$items.quantity", 1]}},
+            }},
+        ]
+        with translate_errors():
+            async for doc in self.collection.aggregate(pipeline, allowDiskUse=True, batchSize=batch_size,
+                                                         **read_options()):
+                yield {**doc["_id"], "quantity": doc["quantity"]}
+
+    async def weekday_hour_counts(self, filters: Optional[Filters], time_field: str, tz: str = "UTC",
+                                  batch_size: int = 500) -> List[Dict[str, Any]]:
+        at = f"${time_field}"
+        pipeline = [
+            {"$match": filters or {}},
+            {"$group": {
+                "_id": {
+                    # ISO weekdays run from 1 (Monday), Python's from 0
+                    "weekday": {"$subtract": [{"$isoDayOfWeek": {"date": at, "timezone": tz}}, 1]},
+                    "hour": {"$hour": {"date": at, "timezone": tz}},
+                },
+                "count": {"$sum": 1},
+            }},
+        ]
+        with translate_errors():
+            groups = await self.collection.aggregate(pipeline, batchSize=batch_size, **read_options()).to_list(length=None)
+        return [{**group["_id"], "count": group["count"]} for group in groups]
+
+    async def interval_counts(self, filters: Optional[Filters], time_field: str, minutes: int,
+                              group_field: Optional[str] = None, batch_size: int = 500) -> List[Dict[str, Any]]:
+        pipeline = [
+            {"$match": filters or {}},
+            {"$group": {
+                "_id": {
+                    "start": {"$dateTrunc": {"date": f"${time_field}", "unit": "minute", "binSize": minutes}},
+                    "key": f"${group_field}" if group_field else None,
+                },
+                "count": {"$sum": 1},
+            }},
+        ]
+        with translate_errors():
+            groups = await self.collection.aggregate(pipeline, batchSize=batch_size, **read_options()).to_list(length=None)
+        return [{"start": as_datetime(group["_id"]["start"]), "key": group["_id"].get("key"), "count": group["count"]}
+                for group in groups]
+
+    async def sales_totals(self, filters: Optional[Filters], batch_size: int = 500) -> Dict[str, List[Dict[str, Any]]]:
+        quantity = {"$ifNull": ["$items.quantity", 1]}
+        pipeline = [
+            {"$match": filters or {}},
+            # One pass over the day's orders feeds both groups
+            {"$facet": {
+                "orders": [{"$group": {
+                    "_id": {
+                        "cancelled": {"$eq": ["$status", "cancelled"]},
+                        "paid": {"$eq": ["$payment_status", "paid"]},
+                        "payment_method": {"$ifNull": ["$payment_method", None]},
+                    },
+                    "count": {"$sum": 1},
+                    "amount": {"$sum": {"$ifNull": ["$total_amount", 0]}},
+                }}],
+                "items": [
+                    {"$match": {"status": {"$ne": "cancelled"}}},
+                    {"$unwind": "$items"},
+                    {"$group": {
+                        "_id": "$items.menu_item_id",
+                        "menu_item_name": {"$first": "$items.menu_item_name"},
+                        "quantity": {"$sum": quantity},
+                        "amount": {"$sum": {"$multiply": [quantity, {"$ifNull": ["$items.price", 0]}]}},
+                    }},
+                ],
+            }},
+        ]
+        with translate_errors():
+            result = await self.collection.aggregate(pipeline, allowDiskUse=True, **read_options()).to_list(length=1)
+        facets = result[0] if result else {"orders": [], "items": []}
+        return {
+            "orders": [{**group["_id"], "count": group["count"], "amount": group["amount"]}
+                       for group in facets["orders"]],
+            "items": [{"menu_item_id": group["_id"], "menu_item_name": group.get("menu_item_name") or "",
+                       "quantity": group["quantity"], "amount": group["amount"]} for group in facets["items"]],
+        }
+
+    async def create_index(self, keys: IndexKeys, unique: bool = False, **options) -> None:
+        with translate_errors():
+            await self.collection.create_index(list(keys), unique=unique, **options)
+
+
+class MongoReadStorage(Storage):
+    """Read-only view of the database that routes queries with its own read preference"""
+
+    backend = "mongo"
+
+    def __init__(self, db):
+        super().__init__()
+        self.db = db
+
+    def _make_repository(self, name: str) -> Repository:
+        return MongoRepository(self.db[name])
+
+
+class MongoStorage(Storage):
+    backend = "mongo"
+
+    def __init__(self, url: str, db_name: str, client_options: Optional[Dict[str, Any]] = None,
+                 read_preferences: Optional[Dict[str, str]] = None, max_staleness_s: Optional[int] = None):
+        super().__init__()
+        self.url = url
+        self.db_name = db_name
+        self.client_options = client_options or {}
+        # Endpoint name -> read preference mode for its reads, everything else uses the primary
+        self.read_preferences = read_preferences or {}
+        self.max_staleness_s = max_staleness_s
+        self.client: Optional[AsyncIOMotorClient] = None
+        self.db = None
+        self._readers: Dict[str, Storage] = {}
+
+    async def connect(self) -> None:
+        self.client = AsyncIOMotorClient(self.url, **self.client_options)
+        self.db = self.client[self.db_name]
+        for endpoint, mode in self.read_preferences.items():
+            preference = read_preference(mode, self.max_staleness_s)
+            if isinstance(preference, Primary):
+                continue
+            self._readers[endpoint] = MongoReadStorage(
+                self.client.get_database(self.db_name, read_preference=preference)
+            )
+
+    def reads(self, endpoint: str) -> Storage:
+        return self._readers.get(endpoint, self)
+
+    async def close(self) -> None:
+        if self.client is not None:
+            self.client.close()
+        self.client = None
+        self.db = None
+        self._repositories.clear()
+        self._readers.clear()
+
+    async def ping(self) -> bool:
+        try:
+            await self.client.admin.command("ping")
+            return True
+        except Exception:
+            return False
+
+    async def cancel_queries(self, comment: str) -> int:
+        # Only sees operations on the server the admin database is read from, the
+        # primary; reads sent to secondaries run until their time limit
+        pipeline = [
+            {"$currentOp": {}},
+            {"$match": {"$or": [{"command.comment": comment}, {"cursor.originatingCommand.comment": comment}]}},
+        ]
+        killed = 0
+        with translate_errors():
+            for op in await self.client.admin.aggregate(pipeline).to_list(length=None):
+                await self.client.admin.command("killOp", op=op["opid"])
+                killed += 1
+        return killed
+
+    async def create_time_series(self, name: str, time_field: str, meta_field: str, granularity: str) -> None:
+        with translate_errors():
+            if await self.db.list_collection_names(filter={"name": name}):
+                return
+            try:
+                # Needs MongoDB 5.0 or later
+                await self.db.create_collection(name, timeseries={
+                    "timeField": time_field, "metaField": meta_field, "granularity": granularity,
+                })
+            except CollectionInvalid:
+                # Created by another worker in the meantime
+                pass
+
+    def _make_repository(self, name: str) -> Repository:
+        return MongoRepository(self.db[name])
@@ -0,0 +1,405 @@
+import asyncio
+import json
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from enum import Enum
+from functools import partial
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from .base import (
+    DuplicateKeyError, Filters, IndexKeys, QueryCancelledError, QueryTimeoutError, Repository, SortSpec, Storage,
+    Update, Upsert, apply_update, current_query_limits, plain, upsert_document,
+)
+
+
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_.]*$')
+# Virtual machine instructions between checks of a read's time limit
+PROGRESS_STEPS = 10000
+
+
+def _identifier(name: str) -> str:
+    if not IDENTIFIER.match(name):
+        raise ValueError(f"Invalid field or collection name: {name!r}")
+    return name
+
+
+def _field(path: str) -> str:
+    # Must be spelled exactly like the index expressions for SQLite to use them
+    return f"json_extract(doc, '$.{_identifier(path)}')"
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Cannot store {type(value).__name__} in SQLite document")
+
+
+def _dumps(doc: Dict[str, Any]) -> str:
+    return json.dumps(doc, default=_json_default)
+
+
+def _param(value: Any) -> Any:
+    value = plain(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _where(filters: Optional[Filters]) -> Tuple[str, List[Any]]:
+    """Translate the Mongo filter subset into a SQL condition over json_extract"""
+    clauses: List[str] = []
+    params: List[Any] = []
+    for key, condition in (filters or {}).items():
+        if key in ("$or", "$and"):
+            parts = [_where(sub) for sub in condition]
+            joiner = " OR " if key == "$or" else " AND "
+            clauses.append("(" + joiner.join(f"({sql})" for sql, _ in parts) + ")")
+            for _, sub_params in parts:
+                params.extend(sub_params)
+            continue
+
+        expr = _field(key)
+        if isinstance(condition, dict) and condition and all(op.startswith('$') for op in condition):
+            operators = condition.items()
+        else:
+            operators = [("$eq", condition)]
+
+        for operator, operand in operators:
+            if operator == "$eq":
+                if operand is None:
+                    clauses.append(f"{expr} IS NULL")
+                else:
+                    clauses.append(f"{expr} = ?")
+                    params.append(_param(operand))
+            elif operator == "$ne":
+                if operand is None:
+                    clauses.append(f"{expr} IS NOT NULL")
+                else:
+                    clauses.append(f"({expr} IS NULL OR {expr} != ?)")
+                    params.append(_param(operand))
+            elif operator in ("$in", "$nin"):
+                values = [_param(v) for v in operand]
+                if not values:
+                    clauses.append("0" if operator == "$in" else "1")
+                    continue
+                placeholders = ", ".join("?" for _ in values)
+                if operator == "$in":
+                    clauses.append(f"{expr} IN ({placeholders})")
+                else:
+                    clauses.append(f"({expr} IS NULL OR {expr} NOT IN ({placeholders}))")
+                params.extend(values)
+            elif operator in ("$gt", "$gte", "$lt", "$lte"):
+                sql_operator = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}[operator]
+                clauses.append(f"{expr} {sql_operator} ?")
+                params.append(_param(operand))
+            elif operator == "$exists":
+                null_check = "IS NOT NULL" if operand else "IS NULL"
+                clauses.append(f"json_type(doc, '$.{_identifier(key)}') {null_check}")
+            else:
+                raise ValueError(f"Unsupported operator {operator}")
+    return (" AND ".join(clauses) or "1"), params
+
+
+def _order_by(sort: Optional[SortSpec]) -> str:
+    if not sort:
+        return ""
+    parts = [f"{_field(field)} {'DESC' if direction < 0 else 'ASC'}" for field, direction in sort]
+    return " ORDER BY " + ", ".join(parts)
+
+
+class SQLiteRepository(Repository):
+    """Collection stored as JSON documents in one SQLite table"""
+
+    def __init__(self, storage: "SQLiteStorage", name: str):
+        self.storage = storage
+        self.name = _identifier(name)
+        self.table = f'"{self.name}"'
+        self._created = False
+
+    def _ensure_table(self, conn: sqlite3.Connection) -> None:
+        if not self._created:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (pk INTEGER PRIMARY KEY, doc TEXT NOT NULL)")
+            self._created = True
+
+    async def _run(self, fn, *args):
+        return await self.storage.run(fn, *args)
+
+    async def _read(self, fn, *args):
+        return await self.storage.read(fn, *args)
+
+    def _select(self, conn, filters, sort=None, limit=None, skip=0, columns="doc"):
+        self._ensure_table(conn)
+        where, params = _where(filters)
+        sql = f"SELECT {columns} FROM {self.table} WHERE {where}{_order_by(sort)}"
+        if limit or skip:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit or -1, skip]
+        return conn.execute(sql, params)
+
+    def _insert(self, conn, docs: List[Dict[str, Any]]) -> None:
+        self._ensure_table(conn)
+        rows = [(_dumps(doc),) for doc in docs]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(f"INSERT INTO {self.table} (doc) VALUES (?)", rows)
+            conn.execute("COMMIT")
+        except sqlite3.IntegrityError as exc:
+            conn.execute("ROLLBACK")
+            raise DuplicateKeyError(str(exc)) from exc
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def insert_one(self, doc: Dict[str, Any]) -> None:
+        await self._run(self._insert, [doc])
+
+    async def insert_many(self, docs: List[Dict[str, Any]]) -> None:
+        if docs:
+            await self._run(self._insert, list(docs))
+
+    async def find_one(self, filters: Optional[Filters] = None,
+                       sort: Optional[SortSpec] = None) -> Optional[Dict[str, Any]]:
+        def run(conn):
+            row = self._select(conn, filters, sort, limit=1).fetchone()
+            return json.loads(row[0]) if row else None
+        return await self._read(run)
+
+    async def find(self, filters: Optional[Filters] = None, sort: Optional[SortSpec] = None,
+                   limit: Optional[int] = None, skip: int = 0) -> List[Dict[str, Any]]:
+        def run(conn):
+            return [json.loads(row[0]) for row in self._select(conn, filters, sort, limit, skip)]
+        return await self._read(run)
+
+    async def iterate(self, filters: Optional[Filters] = None, sort: Optional[SortSpec] = None,
+                      batch_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        cursor = await self._read(lambda conn: self._select(conn, filters, sort))
+        try:
+            while True:
+                rows = await self._read(lambda conn: cursor.fetchmany(batch_size))
+                if not rows:
+                    break
+                for row in rows:
+                    yield json.loads(row[0])
+        finally:
+            await self._run(lambda conn: cursor.close())
+
+    def _modify(self, conn, filters, set_fields, inc_fields, upsert: bool, many: bool,
+                replacement: Optional[Dict[str, Any]] = None):
+        """Read-modify-write inside one IMMEDIATE transaction; returns (matched, last document)"""
+        self._ensure_table(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._select(conn, filters, limit=None if many else 1, columns="pk, doc").fetchall()
+            last = None
+            for pk, raw in rows:
+                if replacement is not None:
+                    last = {key: plain(value) for key, value in replacement.items()}
+                else:
+                    last = apply_update(json.loads(raw), set_fields, inc_fields)
+                conn.execute(f"UPDATE {self.table} SET doc = ? WHERE pk = ?", (_dumps(last), pk))
+            if not rows and upsert:
+                last = replacement if replacement is not None else upsert_document(filters, set_fields, inc_fields)
+                conn.execute(f"INSERT INTO {self.table} (doc) VALUES (?)", (_dumps(last),))
+            conn.execute("COMMIT")
+        except sqlite3.IntegrityError as exc:
+            conn.execute("ROLLBACK")
+            raise DuplicateKeyError(str(exc)) from exc
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(rows), (json.loads(_dumps(last)) if last is not None else None)
+
+    async def update_one(self, filters: Filters, set: Optional[Dict[str, Any]] = None,
+                         inc: Optional[Dict[str, Any]] = None, upsert: bool = False) -> int:
+        matched, _ = await self._run(self._modify, filters, set, inc, upsert, False)
+        return matched
+
+    async def update_many(self, filters: Filters, set: Optional[Dict[str, Any]] = None,
+                          inc: Optional[Dict[str, Any]] = None) -> int:
+        matched, _ = await self._run(self._modify, filters, set, inc, False, True)
+        return matched
+
+    async def find_one_and_update(self, filters: Filters, set: Optional[Dict[str, Any]] = None,
+                                  inc: Optional[Dict[str, Any]] = None,
+                                  upsert: bool = False) -> Optional[Dict[str, Any]]:
+        _, doc = await self._run(self._modify, filters, set, inc, upsert, False)
+        return doc
+
+    async def replace_one(self, filters: Filters, doc: Dict[str, Any], upsert: bool = False) -> int:
+        matched, _ = await self._run(partial(self._modify, replacement=doc), filters, None, None, upsert, False)
+        return matched
+
+    def _bulk_upsert(self, conn, updates: List[Upsert]) -> Tuple[int, int]:
+        """Every upsert of the batch in one IMMEDIATE transaction"""
+        self._ensure_table(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        matched = 0
+        try:
+            for filters, set_fields, on_insert in updates:
+                row = self._select(conn, filters, limit=1, columns="pk, doc").fetchone()
+                if row is not None:
+                    doc = apply_update(json.loads(row[1]), set_fields, None)
+                    conn.execute(f"UPDATE {self.table} SET doc = ? WHERE pk = ?", (_dumps(doc), row[0]))
+                    matched += 1
+                else:
+                    doc = upsert_document(filters, {**on_insert, **set_fields})
+                    conn.execute(f"INSERT INTO {self.table} (doc) VALUES (?)", (_dumps(doc),))
+            conn.execute("COMMIT")
+        except sqlite3.IntegrityError as exc:
+            conn.execute("ROLLBACK")
+            raise DuplicateKeyError(str(exc)) from exc
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return matched, len(updates) - matched
+
+    async def bulk_upsert(self, updates: List[Upsert]) -> Tuple[int, int]:
+        if not updates:
+            return 0, 0
+        return await self._run(self._bulk_upsert, list(updates))
+
+    def _bulk_update(self, conn, updates: List[Update]) -> int:
+        """Every update of the batch in one IMMEDIATE transaction"""
+        self._ensure_table(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        matched = 0
+        try:
+            for filters, set_fields, inc_fields in updates:
+                row = self._select(conn, filters, limit=1, columns="pk, doc").fetchone()
+                if row is not None:
+                    doc = apply_update(json.loads(row[1]), set_fields, inc_fields)
+                    conn.execute(f"UPDATE {self.table} SET doc = ? WHERE pk = ?", (_dumps(doc), row[0]))
+                    matched += 1
+            conn.execute("COMMIT")
+        except sqlite3.IntegrityError as exc:
+            conn.execute("ROLLBACK")
+            raise DuplicateKeyError(str(exc)) from exc
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return matched
+
+    async def bulk_update(self, updates: List[Update]) -> int:
+        if not updates:
+            return 0
+        return await self._run(self._bulk_update, list(updates))
+
+    def _delete(self, conn, filters, many: bool) -> int:
+        self._ensure_table(conn)
+        where, params = _where(filters)
+        if many:
+            cursor = conn.execute(f"DELETE FROM {self.table} WHERE {where}", params)
+        else:
+            cursor = conn.execute(
+                f"DELETE FROM {self.table} WHERE pk = (SELECT pk FROM {self.table} WHERE {where} LIMIT 1)", params
+            )
+        return cursor.rowcount
+
+    async def delete_one(self, filters: Filters) -> int:
+        return await self._run(self._delete, filters, False)
+
+    async def delete_many(self, filters: Filters) -> int:
+        return await self._run(self._delete, filters, True)
+
+    async def count(self, filters: Optional[Filters] = None) -> int:
+        return await self._read(lambda conn: self._select(conn, filters, columns="COUNT(*)").fetchone()[0])
+
+    async def distinct(self, field: str, filters: Optional[Filters] = None) -> List[Any]:
+        def run(conn):
+            rows = self._select(conn, {"$and": [filters or {}, {field: {"$exists": True}}]},
+                                columns=f"DISTINCT {_field(field)}")
+            return [row[0] for row in rows]
+        return await self._read(run)
+
+    async def sum(self, field: str, filters: Optional[Filters] = None) -> float:
+        return await self._read(lambda conn: self._select(conn, filters, columns=f"TOTAL({_field(field)})").fetchone()[0])
+
+    async def create_index(self, keys: IndexKeys, unique: bool = False, **options) -> None:
+        fields = [field for field, _ in keys]
+        name = f"ix_{self.name}_" + "_".join(f.replace('.', '_') for f in fields)
+        columns = ", ".join(f"{_field(field)} {'DESC' if direction < 0 else 'ASC'}" for field, direction in keys)
+
+        def run(conn):
+            self._ensure_table(conn)
+            try:
+                conn.execute(
+                    f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS "{name}" ON {self.table} ({columns})'
+                )
+            except sqlite3.IntegrityError as exc:
+                raise DuplicateKeyError(str(exc)) from exc
+        await self._run(run)
+
+
+class SQLiteStorage(Storage):
+    """Embedded single-file database for single-terminal outlets.
+
+    All statements run on one dedicated thread so the event loop never blocks
+    on disk I/O; the database runs in WAL mode so readers in other worker
+    processes do not wait for writers.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, self._conn, *args)
+
+    async def read(self, fn, *args):
+        """Run a read under the request's QueryLimits, which the progress handler enforces"""
+        limits = current_query_limits()
+        if limits is None or not (limits.max_time_ms or limits.owned()):
+            return await self.run(fn, *args)
+        deadline = time.monotonic() + limits.max_time_ms / 1000 if limits.max_time_ms else None
+        cancellable = limits.owned()
+
+        def stop() -> int:
+            return int((deadline is not None and time.monotonic() > deadline) or (cancellable and limits.cancelled))
+
+        def guarded(conn, *args):
+            conn.set_progress_handler(stop, PROGRESS_STEPS)
+            try:
+                return fn(conn, *args)
+            except sqlite3.OperationalError as exc:
+                if str(exc) != "interrupted":
+                    raise
+                if cancellable and limits.cancelled:
+                    raise QueryCancelledError("Client disconnected") from exc
+                raise QueryTimeoutError(f"Read ran longer than {limits.max_time_ms} ms") from exc
+            finally:
+                conn.set_progress_handler(None, PROGRESS_STEPS)
+        return await self.run(guarded, *args)
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    async def connect(self) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-storage")
+        loop = asyncio.get_running_loop()
+        self._conn = await loop.run_in_executor(self._executor, self._open)
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self.run(lambda conn: conn.close())
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        self._conn = None
+        self._executor = None
+        self._repositories.clear()
+
+    def _make_repository(self, name: str) -> Repository:
+        return SQLiteRepository(self, name)
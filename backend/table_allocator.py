@@ -0,0 +1,151 @@
+"""
+Best-fit table assignment for walk-ins.
+
+Each worker keeps the floor of every restaurant it serves in memory: table
+capacity, status and grid position (``position_x`` / ``position_y``). A walk-in
+gets the smallest free table that seats the party and is not booked for the
+next sitting. When no single table is big enough, up to ``max_join``
+neighbouring tables (side by side on the grid) are joined.
+
+The in-memory floor follows this worker's table writes and is reloaded from
+the database every ``refresh_interval`` seconds. Claims go through a
+conditional update on ``status: available`` in the database, so two workers
+never seat different parties at the same table.
+"""
+
+import asyncio
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from storage import Storage
+
+AVAILABLE = "available"
+
+
+class FloorLayout:
+    """One restaurant's tables with their grid neighbours"""
+
+    def __init__(self, tables: List[Dict[str, Any]]):
+        self.tables: Dict[str, Dict[str, Any]] = {table["id"]: dict(table) for table in tables}
+        # Smallest first, so the first free table that fits wastes the fewest seats
+        self.by_capacity = sorted(
+            self.tables.values(), key=lambda t: (t.get("capacity", 0), t["table_number"])
+        )
+        at: Dict[Tuple[int, int], List[str]] = defaultdict(list)
+        for table in self.tables.values():
+            at[(table.get("position_x", 0), table.get("position_y", 0))].append(table["id"])
+        self.neighbours: Dict[str, List[str]] = {}
+        for table in self.tables.values():
+            x, y = table.get("position_x", 0), table.get("position_y", 0)
+            self.neighbours[table["id"]] = [
+                other for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)) for other in at.get((x + dx, y + dy), ())
+            ]
+        self.refreshed_at = time.monotonic()
+
+    def by_number(self, table_number: str) -> Optional[Dict[str, Any]]:
+        for table in self.tables.values():
+            if table["table_number"] == table_number:
+                return table
+        return None
+
+    def set_status(self, table_number: str, status: str) -> None:
+        table = self.by_number(table_number)
+        if table is not None:
+            table["status"] = status
+
+    def allocate(self, party_size: int, is_free: Callable[[Dict[str, Any]], bool],
+                 max_join: int = 3) -> Optional[List[Dict[str, Any]]]:
+        """Tables to seat the party at, or None when nothing fits"""
+        free: List[Dict[str, Any]] = []
+        for table in self.by_capacity:
+            if table.get("status", AVAILABLE) != AVAILABLE or not is_free(table):
+                continue
+            if table.get("capacity", 0) >= party_size:
+                return [table]
+            free.append(table)
+        if max_join < 2 or not free:
+            return None
+
+        group = self._join(party_size, {table["id"]: table.get("capacity", 0) for table in free}, max_join)
+        if group is None:
+            return None
+        return sorted((self.tables[table_id] for table_id in group), key=lambda t: t["table_number"])
+
+    def _join(self, party_size: int, seats_of: Dict[str, int], max_join: int) -> Optional[Tuple[str, ...]]:
+        """Grow connected groups of free tables one neighbour at a time; the first
+        size that seats the party wins, with the fewest empty seats"""
+        biggest = max(seats_of.values())
+        best: Optional[Tuple[int, Tuple[str, ...]]] = None
+        seen: Set[FrozenSet[str]] = set()
+        frontier: List[Tuple[str, ...]] = [(table_id,) for table_id in seats_of]
+        for _ in range(max_join - 1):
+            grown: List[Tuple[str, ...]] = []
+            for group in frontier:
+                seats = sum(seats_of[table_id] for table_id in group)
+                # Not even the biggest free tables could make up the difference
+                if seats + biggest * (max_join - len(group)) < party_size:
+                    continue
+                for member in group:
+                    for neighbour in self.neighbours[member]:
+                        if neighbour not in seats_of or neighbour in group:
+                            continue
+                        key = frozenset(group + (neighbour,))
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                        total = seats + seats_of[neighbour]
+                        if total < party_size:
+                            grown.append(group + (neighbour,))
+                        elif total == party_size:
+                            return group + (neighbour,)
+                        elif best is None or total - party_size < best[0]:
+                            best = (total - party_size, group + (neighbour,))
+            if best is not None:
+                return best[1]
+            frontier = grown
+        return None
+
+
+class TableAllocator:
+    """Walk-in table assignment for one worker process"""
+
+    def __init__(self, storage: Storage, refresh_interval: float = 5.0, max_join: int = 3,
+                 sitting_minutes: int = 60):
+        self.storage = storage
+        self.refresh_interval = refresh_interval
+        self.max_join = max_join
+        # How long a walk-in is expected to stay; a table booked sooner than that is skipped
+        self.sitting_minutes = sitting_minutes
+        self._layouts: Dict[str, FloorLayout] = {}
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def layout(self, restaurant_id: str) -> FloorLayout:
+        layout = self._layouts.get(restaurant_id)
+        if layout is not None and time.monotonic() - layout.refreshed_at <= self.refresh_interval:
+            return layout
+        async with self._locks[restaurant_id]:
+            layout = self._layouts.get(restaurant_id)
+            if layout is None or time.monotonic() - layout.refreshed_at > self.refresh_interval:
+                layout = FloorLayout(await self.storage.tables.find({"restaurant_id": restaurant_id}))
+                self._layouts[restaurant_id] = layout
+        return layout
+
+    async def allocate(self, restaurant_id: str, party_size: int,
+                       is_free: Callable[[Dict[str, Any]], bool] = lambda table: True) -> Optional[List[Dict[str, Any]]]:
+        layout = await self.layout(restaurant_id)
+        return layout.allocate(party_size, is_free, self.max_join)
+
+    def set_status(self, restaurant_id: str, table_number: str, status: str) -> None:
+        layout = self._layouts.get(restaurant_id)
+        if layout is not None:
+            layout.set_status(table_number, status)
+
+    def table_saved(self, restaurant_id: str, table: Dict[str, Any]) -> None:
+        layout = self._layouts.get(restaurant_id)
+        if layout is not None and table["id"] in layout.tables:
+            layout.tables[table["id"]].update(table)
+
+    def forget(self, restaurant_id: str) -> None:
+        """Reload on next use, e.g. after tables were added or removed"""
+        self._layouts.pop(restaurant_id, None)
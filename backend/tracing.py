@@ -0,0 +1,363 @@
+"""
+Request tracing: where the time of a slow request went.
+
+A sampled ``/api`` request (``TRACE_SAMPLE_RATE``, or any request sent with
+``X-Trace: 1``) gets a :class:`Trace` holding timed spans:
+
+    http                      the whole request, as the ASGI server sees it
+      validate_request        dependencies, parameters and body validation
+      endpoint                the route function
+        mongo.find ...        every command Motor sends, with its collection
+      validate_response       response_model validation and jsonable_encoder
+      json_encode             rendering the JSON body
+
+Functions decorated with :func:`timed`, such as ``parse_from_mongo``, are
+called too often for a span each; their calls and total time are summed per
+trace instead. Finished traces are kept in a ring buffer for
+``/api/admin/traces`` and, with ``TRACE_FILE``, appended to a JSONL file.
+
+Requests that are not sampled only pay for a context variable lookup at each
+of these points, so tracing can stay on at a low rate during service.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger(__name__)
+
+# Spans kept per trace; a long export makes a getMore per batch
+MAX_SPANS = 1000
+# Requests not traced even when sampled, so viewing traces does not crowd them out
+UNTRACED_PATHS = ("/api/admin/traces",)
+
+
+@dataclass
+class Span:
+    id: int
+    parent: Optional[int]
+    name: str
+    # Milliseconds since the start of the request
+    start_ms: float
+    duration_ms: float = 0.0
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class Trace:
+    id: str
+    method: str
+    path: str
+    started_at: datetime
+    endpoint: Optional[str] = None
+    status: Optional[int] = None
+    duration_ms: float = 0.0
+    spans: List[Span] = field(default_factory=list)
+    # Name -> {"calls", "total_ms"} of timed() functions
+    timers: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    dropped_spans: int = 0
+
+    def __post_init__(self):
+        self._t0 = time.perf_counter()
+        # Where the request is between phases, see TracedRoute
+        self._mark: Tuple[str, float] = ("", self._t0)
+        self._timing: Set[str] = set()
+        # Mongo commands started and not finished yet, by request id
+        self._commands: Dict[int, Tuple[Optional[int], str, Optional[str], str]] = {}
+
+    def add(self, name: str, parent: Optional[int], start: float, end: Optional[float] = None,
+            **attrs) -> Optional[Span]:
+        """Record a span from perf_counter ``start`` to ``end``, or leave it open when ``end`` is None"""
+        if len(self.spans) >= MAX_SPANS:
+            self.dropped_spans += 1
+            return None
+        span = Span(len(self.spans), parent, name, round((start - self._t0) * 1000, 3), attrs=attrs)
+        if end is not None:
+            span.duration_ms = round((end - start) * 1000, 3)
+        # list.append is atomic, Mongo command events arrive from Motor's threads
+        self.spans.append(span)
+        return span
+
+    def close(self, span: Optional[Span]) -> None:
+        if span is not None:
+            span.duration_ms = round((time.perf_counter() - self._t0) * 1000 - span.start_ms, 3)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        timer = self.timers.setdefault(name, {"calls": 0, "total_ms": 0.0})
+        timer["calls"] += 1
+        timer["total_ms"] += seconds * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        trace = asdict(self)
+        for timer in trace["timers"].values():
+            timer["total_ms"] = round(timer["total_ms"], 3)
+        return trace
+
+
+# The trace of the request being served and the span new spans nest under
+_current: ContextVar[Optional[Tuple[Trace, Optional[int]]]] = ContextVar("trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    current = _current.get()
+    return current[0] if current else None
+
+
+class span:
+    """Context manager timing a block as a span of the current trace, if any"""
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        current = _current.get()
+        if current is None:
+            self.token = None
+            return None
+        trace, parent = current
+        self.trace = trace
+        self.span = trace.add(self.name, parent, time.perf_counter(), **self.attrs)
+        self.token = _current.set((trace, self.span.id if self.span else parent))
+        return self.span
+
+    def __exit__(self, *exc_info):
+        if self.token is not None:
+            _current.reset(self.token)
+            self.trace.close(self.span)
+        return False
+
+
+def timed(name: str) -> Callable:
+    """Sum a function's calls and time into the current trace; recursive calls count once"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            trace = current_trace()
+            if trace is None or name in trace._timing:
+                return fn(*args, **kwargs)
+            trace._timing.add(name)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                trace._timing.discard(name)
+                trace.add_time(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+def traced_endpoint(call: Callable) -> Callable:
+    """Wrap a route function to record the request validation before it and the endpoint span"""
+    def enter(trace: Trace) -> None:
+        phase, since = trace._mark
+        if phase == "request":
+            trace.add("validate_request", _current.get()[1], since, time.perf_counter())
+
+    def leave(trace: Trace) -> None:
+        trace._mark = ("response", time.perf_counter())
+
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def endpoint(*args, **kwargs):
+            trace = current_trace()
+            if trace is None:
+                return await call(*args, **kwargs)
+            enter(trace)
+            try:
+                with span("endpoint"):
+                    return await call(*args, **kwargs)
+            finally:
+                leave(trace)
+    else:
+        @functools.wraps(call)
+        def endpoint(*args, **kwargs):
+            trace = current_trace()
+            if trace is None:
+                return call(*args, **kwargs)
+            enter(trace)
+            try:
+                with span("endpoint"):
+                    return call(*args, **kwargs)
+            finally:
+                leave(trace)
+    return endpoint
+
+
+class TracedRoute(APIRoute):
+    """APIRoute marking the phases of a traced request around its route function"""
+
+    def get_route_handler(self) -> Callable:
+        # The signature was analysed already, only the call itself is wrapped
+        self.dependant.call = traced_endpoint(self.dependant.call)
+        handler = super().get_route_handler()
+
+        async def route_handler(request):
+            trace = current_trace()
+            if trace is not None:
+                trace._mark = ("request", time.perf_counter())
+            return await handler(request)
+        return route_handler
+
+
+class TracedJSONResponse(JSONResponse):
+    """JSONResponse recording the response validation before it and the encoding itself"""
+
+    def render(self, content: Any) -> bytes:
+        current = _current.get()
+        if current is None:
+            return super().render(content)
+        trace, parent = current
+        phase, since = trace._mark
+        if phase == "response":
+            trace.add("validate_response", parent, since, time.perf_counter())
+            trace._mark = ("", 0.0)
+        with span("json_encode"):
+            return super().render(content)
+
+
+def command_listener():
+    """pymongo CommandListener adding each command of a traced request as a span"""
+    from pymongo import monitoring
+
+    class CommandTracer(monitoring.CommandListener):
+        # Motor runs commands on its threads in a copy of the caller's context, so the trace is visible here
+
+        def started(self, event) -> None:
+            current = _current.get()
+            if current is None:
+                return
+            trace, parent = current
+            # getMore names the collection separately from its cursor id
+            collection = event.command.get(event.command_name)
+            if not isinstance(collection, str):
+                collection = event.command.get("collection")
+            trace._commands[event.request_id] = (parent, event.command_name, collection, event.database_name)
+
+        def _finish(self, event, **attrs) -> None:
+            trace = current_trace()
+            if trace is None or event.request_id not in trace._commands:
+                return
+            parent, name, collection, database = trace._commands.pop(event.request_id)
+            end = time.perf_counter()
+            trace.add(f"mongo.{name}", parent, end - event.duration_micros / 1e6, end,
+                      collection=collection, database=database, **attrs)
+
+        def succeeded(self, event) -> None:
+            self._finish(event)
+
+        def failed(self, event) -> None:
+            self._finish(event, error=event.failure.get("errmsg") or event.failure.get("code"))
+
+    return CommandTracer()
+
+
+class Tracer:
+    def __init__(self, sample_rate: float = 0.0, buffer_size: int = 200, path: Optional[str] = None):
+        self.sample_rate = sample_rate
+        self.path = path
+        self._traces: Deque[Dict[str, Any]] = deque(maxlen=max(1, buffer_size))
+        self._fd: Optional[int] = None
+        self.traced = 0
+        self.exported = 0
+        self.export_errors = 0
+
+    def sampled(self, scope) -> bool:
+        if scope["path"].startswith(UNTRACED_PATHS):
+            return False
+        for name, value in scope["headers"]:
+            if name == b"x-trace":
+                return value in (b"1", b"true")
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def finish(self, trace: Trace) -> None:
+        record = trace.to_dict()
+        self._traces.append(record)
+        self.traced += 1
+        if self.path:
+            self._export(record)
+
+    def _export(self, record: Dict[str, Any]) -> None:
+        try:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            # One write per line, so lines from several workers appending to the file do not interleave
+            os.write(self._fd, (json.dumps(record, default=str) + "\n").encode())
+            self.exported += 1
+        except OSError as exc:
+            self.export_errors += 1
+            logger.warning("Could not append a trace to %s: %s", self.path, exc)
+
+    def traces(self, limit: int = 50, min_ms: float = 0.0, path: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Kept traces, newest first"""
+        found = []
+        for trace in reversed(self._traces):
+            if trace["duration_ms"] < min_ms or (path and not trace["path"].startswith(path)):
+                continue
+            found.append(trace)
+            if len(found) >= limit:
+                break
+        return found
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        return next((trace for trace in self._traces if trace["id"] == trace_id), None)
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sample_rate": self.sample_rate,
+            "traced": self.traced,
+            "kept": len(self._traces),
+            "exported": self.exported,
+            "export_errors": self.export_errors,
+        }
+
+
+class TracingMiddleware:
+    """ASGI middleware starting a trace for sampled /api requests"""
+
+    def __init__(self, app, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api") or not self.tracer.sampled(scope):
+            await self.app(scope, receive, send)
+            return
+        trace = Trace(uuid.uuid4().hex, scope["method"], scope["path"], datetime.now(timezone.utc))
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-trace-id", trace.id.encode())]}
+            await send(message)
+
+        token = _current.set((trace, None))
+        root = trace.add("http", None, trace._t0)
+        _current.set((trace, root.id))
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _current.reset(token)
+            trace.close(root)
+            trace.duration_ms = root.duration_ms
+            endpoint = scope.get("endpoint")
+            trace.endpoint = getattr(endpoint, "__name__", None)
+            self.tracer.finish(trace)
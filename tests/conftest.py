@@ -0,0 +1,45 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+# Importing server builds its module-level app from the environment
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+import server  # noqa: E402
+from settings import Settings  # noqa: E402
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def app_settings(backend, tmp_path):
+    """Settings for an app on the backend under test, with ``overrides``"""
+    def build(**overrides) -> Settings:
+        return Settings(
+            storage_backend=backend,
+            sqlite_path=str(tmp_path / "taste_paradise.db"),
+            journal_dir=str(tmp_path / "journal"),
+            **overrides,
+        )
+    return build
+
+
+@pytest.fixture
+def client(app_settings):
+    with TestClient(server.create_app(app_settings())) as client:
+        yield client
+
+
+@pytest.fixture
+def menu_item(client):
+    response = client.post("/api/menu", json={"name": "Butter Chicken", "price": 320, "category": "Main",
+                                              "preparation_time": 25})
+    assert response.status_code == 200, response.text
+    return response.json()
@@ -0,0 +1,20 @@
+"""Shared by the API tests"""
+
+import time
+
+
+def order_json(menu_item, quantity=1, **fields):
+    return {
+        "items": [{"menu_item_id": menu_item["id"], "menu_item_name": menu_item["name"], "quantity": quantity,
+                   "price": menu_item["price"]}],
+        **fields,
+    }
+
+
+def wait_for(condition, timeout=3.0):
+    """Side effects run through the outbox just after the response, poll until they are in"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.02)
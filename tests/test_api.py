@@ -0,0 +1,87 @@
+from tests.helpers import order_json, wait_for
+
+
+def table_status(client, table_number):
+    return next(table["status"] for table in client.get("/api/tables").json() if table["table_number"] == table_number)
+
+
+def test_menu_crud(client, menu_item):
+    client.post("/api/menu", json={"name": "Lassi", "price": 80, "category": "Drinks"})
+    assert len(client.get("/api/menu").json()) == 2
+    assert sorted(client.get("/api/menu/categories").json()["categories"]) == ["Drinks", "Main"]
+
+    response = client.put(f"/api/menu/{menu_item['id']}", json={"name": "Butter Chicken", "price": 340,
+                                                                 "category": "Main"})
+    assert response.json()["price"] == 340
+
+    assert client.delete(f"/api/menu/{menu_item['id']}").status_code == 200
+    assert client.delete(f"/api/menu/{menu_item['id']}").status_code == 404
+
+
+def test_order_lifecycle(client, menu_item):
+    response = client.post("/api/orders", json=order_json(menu_item, quantity=2, customer_name="Asha"))
+    assert response.status_code == 200, response.text
+    order = response.json()
+    assert order["total_amount"] == 640
+    assert order["status"] == "pending"
+
+    assert [o["id"] for o in client.get("/api/orders", params={"status": "pending"}).json()] == [order["id"]]
+    assert client.get("/api/orders", params={"status": "cooking"}).json() == []
+
+    response = client.put(f"/api/orders/{order['id']}", json={"status": "cooking", "payment_status": "paid",
+                                                              "payment_method": "cash"})
+    assert response.status_code == 200, response.text
+    assert response.json()["status"] == "cooking"
+    assert response.json()["payment_status"] == "paid"
+    assert client.get(f"/api/orders/{order['id']}").json()["status"] == "cooking"
+
+    dashboard = client.get("/api/dashboard").json()
+    assert dashboard["today_orders"] == 1
+    assert dashboard["today_revenue"] == 640
+    assert dashboard["cooking_orders"] == 1
+
+
+def test_unknown_order(client):
+    assert client.get("/api/orders/missing").status_code == 404
+    assert client.put("/api/orders/missing", json={"status": "cooking"}).status_code == 404
+
+
+def test_table_flow(client, menu_item):
+    assert client.post("/api/tables/initialize-default").status_code == 200
+    tables = client.get("/api/tables").json()
+    assert len(tables) == 6
+
+    order = client.post("/api/orders", json=order_json(menu_item, table_number="T1")).json()
+    wait_for(lambda: table_status(client, "T1") == "occupied")
+    assert [o["id"] for o in client.get("/api/tables/T1/orders").json()] == [order["id"]]
+
+    t1 = next(table for table in tables if table["table_number"] == "T1")
+    # Still has an open order
+    assert client.delete(f"/api/tables/{t1['id']}").status_code == 400
+
+    client.put(f"/api/orders/{order['id']}", json={"status": "served"})
+    assert client.post("/api/tables/T1/clear").status_code == 200
+    assert table_status(client, "T1") == "available"
+
+    assert client.delete(f"/api/tables/{t1['id']}").status_code == 200
+    assert client.delete(f"/api/tables/{t1['id']}").status_code == 404
+    assert client.put(f"/api/tables/{t1['id']}", json={"capacity": 2}).status_code == 404
+
+
+def test_kot_flow(client, menu_item):
+    order = client.post("/api/orders", json=order_json(menu_item, quantity=3, table_number="T2")).json()
+
+    response = client.post(f"/api/kot/{order['id']}")
+    assert response.status_code == 200, response.text
+    kot = response.json()
+    assert kot["order_number"] == "ORD-0001"
+    assert kot["items"][0]["quantity"] == 3
+
+    # One KOT per order
+    assert client.post(f"/api/kot/{order['id']}").json()["id"] == kot["id"]
+    assert [k["id"] for k in client.get("/api/kot").json()] == [kot["id"]]
+    assert client.get(f"/api/orders/{order['id']}").json()["kot_generated"] is True
+
+    second = client.post("/api/orders", json=order_json(menu_item)).json()
+    assert client.post(f"/api/kot/{second['id']}").json()["order_number"] == "ORD-0002"
+    assert client.post("/api/kot/missing").status_code == 404
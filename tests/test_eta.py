@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from eta import EtaEstimator, KitchenModel, _medians
+from storage import MemoryStorage
+
+START = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(hours=6)
+
+
+def finished_order(index, items, wait, cook, queue_depth=0, ready_at=None):
+    created = START + timedelta(minutes=index)
+    cooking = created + timedelta(minutes=wait)
+    return {
+        "restaurant_id": "default",
+        "id": f"order-{index:04d}",
+        "items": [{"menu_item_id": item} for item in items],
+        "created_at": created.isoformat(),
+        "cooking_at": cooking.isoformat(),
+        "ready_at": ready_at or (cooking + timedelta(minutes=cook)).isoformat(),
+        "queue_depth": queue_depth,
+    }
+
+
+def test_medians_need_enough_samples():
+    medians = _medians(np.array([0, 1, 0, 0, 1]), np.array([4.0, 9.0, 6.0, 5.0, 9.0]), 3)
+    assert medians[0] == 5.0
+    assert np.isnan(medians[1]) and np.isnan(medians[2])
+
+
+def test_orders_are_credited_to_their_slowest_item():
+    model = KitchenModel()
+    model.add([finished_order(i, ["curry"], 0, 20) for i in range(3)]
+              + [finished_order(i, ["naan"], 0, 5) for i in range(3, 6)]
+              + [finished_order(i, ["curry", "naan"], 0, 20) for i in range(6, 9)])
+    # Over every order it was in, naan would take 12.5 minutes
+    model.fit(min_samples=20)
+    assert model.item_minutes == {"curry": 20.0, "naan": 5.0}
+    # Too few orders to learn the wait from, so it scales with the queue
+    assert model.wait_line is None
+    assert model.estimate(["naan"], {}, queue_depth=4, kitchen_capacity=4) == 10.0
+
+
+def test_wait_follows_the_queue_depth():
+    model = KitchenModel()
+    model.add([finished_order(i, ["curry"], 2 + 3 * (i % 5), 20, queue_depth=i % 5) for i in range(30)])
+    model.fit(min_samples=20)
+    intercept, slope = model.wait_line
+    assert intercept == pytest.approx(2.0) and slope == pytest.approx(3.0)
+    assert model.estimate(["curry"], {}, queue_depth=2, kitchen_capacity=4) == pytest.approx(28.0)
+
+
+def estimate(estimator, item_ids, prep_minutes):
+    return asyncio.run(estimator.estimate("default", item_ids, prep_minutes, 0))
+
+
+def test_cold_start_floor():
+    storage = MemoryStorage()
+    assert estimate(EtaEstimator(storage, cold_start_minutes=30), ["dal"], {"dal": 10}) == 30
+    assert estimate(EtaEstimator(storage, cold_start_minutes=30, min_samples=0), ["dal"], {"dal": 10}) == 10
+
+
+def test_refresh_pages_through_orders_ready_at_the_same_time():
+    storage = MemoryStorage()
+    ready_at = (START + timedelta(hours=1)).isoformat()
+    orders = [finished_order(i, [f"item-{i}"], 0, 10, ready_at=ready_at) for i in range(5)]
+    asyncio.run(storage.orders.insert_many(orders))
+    estimator = EtaEstimator(storage, max_samples=2)
+    model = asyncio.run(estimator.model("default"))
+    assert model.samples == 2
+    assert model.items == [("item-3",), ("item-4",)]
+    assert model.watermark == (ready_at, "order-0004")
@@ -0,0 +1,83 @@
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from forecast import demand_cube, forecast_cube, run_forecast
+from storage import MemoryStorage
+
+MONDAY = date(2026, 1, 5)
+FOREVER = 1e9
+
+
+def test_demand_cube():
+    counts = pd.DataFrame([
+        ("dal", "2026-01-05", 12, 2),
+        ("dal", "2026-01-05", 12, 1),
+        ("naan", "2026-01-07", 19, 4),
+        # Outside the window
+        ("naan", "2026-01-04", 19, 9),
+    ], columns=["menu_item_id", "day", "hour", "quantity"])
+    items, cube, first_sale = demand_cube(counts, MONDAY, 14)
+    assert cube.shape == (2, 14, 24)
+    assert cube[items.index("dal"), 0, 12] == 3
+    assert cube[items.index("naan"), 2, 19] == 4 and cube.sum() == 7
+    assert first_sale[items.index("naan")] == 2
+
+
+def test_steady_demand():
+    cube = np.zeros((1, 14, 24))
+    cube[0, :, 12] = 4
+    forecast = forecast_cube(cube, np.array([0]), MONDAY, FOREVER)
+    assert (forecast["expected"][0, :, 12] == 4).all()
+    assert np.allclose(forecast["upper"][0, :, 12], 4)
+    assert (forecast["weeks"][0] == 2).all()
+    assert forecast["expected"][0, :, 11].sum() == 0
+
+
+def test_days_before_the_first_sale_do_not_count():
+    # First sold on the second Monday
+    cube = np.zeros((1, 14, 24))
+    cube[0, 7:, 19] = 6
+    forecast = forecast_cube(cube, np.array([7]), MONDAY, FOREVER)
+    assert forecast["expected"][0, 0, 19] == 6
+    assert forecast["weeks"][0, 0] == 1
+
+
+def test_recent_weeks_count_most():
+    cube = np.zeros((1, 14, 24))
+    cube[0, 0, 12], cube[0, 7, 12] = 2, 4
+    forecast = forecast_cube(cube, np.array([0]), MONDAY, half_life_weeks=1)
+    # The later Monday weighs twice as much
+    assert forecast["expected"][0, 0, 12] == pytest.approx(10 / 3)
+    assert forecast["upper"][0, 0, 12] > forecast["expected"][0, 0, 12]
+
+
+def test_run_forecast_replaces_the_previous_run():
+    storage = MemoryStorage()
+
+    def sold(day, quantity, item="dal"):
+        created = datetime.combine(day, datetime.min.time(), timezone.utc) + timedelta(hours=13)
+        return {"restaurant_id": "default", "id": f"{item}-{day}", "status": "served",
+                "created_at": created.isoformat(), "items": [{"menu_item_id": item, "quantity": quantity}]}
+
+    async def run():
+        await storage.menu_items.insert_one({"restaurant_id": "default", "id": "dal", "name": "Dal"})
+        await storage.orders.insert_many([sold(MONDAY + timedelta(days=day), 3) for day in range(14)])
+        await run_forecast(storage, "default", history_days=14, today=MONDAY + timedelta(days=14))
+        first = await storage.collection("forecasts").find({"restaurant_id": "default"})
+        await storage.orders.delete_many({})
+        await storage.orders.insert_many([sold(MONDAY + timedelta(days=day), 1, "naan") for day in range(14)])
+        summary = await run_forecast(storage, "default", history_days=14, today=MONDAY + timedelta(days=14))
+        second = await storage.collection("forecasts").find({"restaurant_id": "default"})
+        return first, summary, second
+
+    first, summary, second = asyncio.run(run())
+    assert len(first) == 7
+    assert {(doc["menu_item_name"], doc["hour"], doc["expected"], doc["weeks"]) for doc in first} == {
+        ("Dal", 13, 3.0, 2)
+    }
+    assert summary["removed"] == 7
+    assert {doc["menu_item_id"] for doc in second} == {"naan"}
@@ -0,0 +1,63 @@
+from fastapi.testclient import TestClient
+
+import server
+from idempotency import fingerprint
+from tests.helpers import order_json
+
+
+def test_retry_returns_the_first_response(client, menu_item):
+    headers = {"Idempotency-Key": "order-1"}
+    first = client.post("/api/orders", json=order_json(menu_item), headers=headers)
+    retry = client.post("/api/orders", json=order_json(menu_item), headers=headers)
+    assert retry.status_code == 200
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.json()["id"] == first.json()["id"]
+    assert len(client.get("/api/orders").json()) == 1
+
+
+def test_key_reused_for_another_body(client, menu_item):
+    headers = {"Idempotency-Key": "order-1"}
+    client.post("/api/orders", json=order_json(menu_item), headers=headers)
+    assert client.post("/api/orders", json=order_json(menu_item, quantity=2), headers=headers).status_code == 422
+
+
+def test_keys_are_scoped_per_restaurant(client, menu_item):
+    client.post("/api/orders", json=order_json(menu_item), headers={"Idempotency-Key": "k"})
+    other = client.post("/api/orders", json=order_json(menu_item),
+                        headers={"Idempotency-Key": "k", "X-Restaurant-Id": "other"})
+    assert "Idempotent-Replayed" not in other.headers
+    assert len(client.get("/api/orders", headers={"X-Restaurant-Id": "other"}).json()) == 1
+
+
+def test_kot_retry(client, menu_item):
+    order = client.post("/api/orders", json=order_json(menu_item)).json()
+    headers = {"Idempotency-Key": "kot-1"}
+    first = client.post(f"/api/kot/{order['id']}", headers=headers).json()
+    retry = client.post(f"/api/kot/{order['id']}", headers=headers)
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first
+
+
+def abandon_kot_key(client, key, order_id):
+    """Reserve a key the way a worker killed mid-request leaves it"""
+    ident = {"restaurant_id": "default", "scope": "kot", "key": key}
+    assert client.portal.call(server.idempotency._reserve, ident, fingerprint({"order_id": order_id})) is None
+
+
+def test_unfinished_attempt_blocks_retries_during_its_lease(client, menu_item):
+    order = client.post("/api/orders", json=order_json(menu_item)).json()
+    abandon_kot_key(client, "kot-1", order["id"])
+    assert client.post(f"/api/kot/{order['id']}", headers={"Idempotency-Key": "kot-1"}).status_code == 409
+
+
+def test_retry_takes_over_a_lapsed_lease(app_settings):
+    with TestClient(server.create_app(app_settings(idempotency_lease_s=0))) as client:
+        menu_item = client.post("/api/menu", json={"name": "Dal", "price": 150, "category": "Main"}).json()
+        order = client.post("/api/orders", json=order_json(menu_item)).json()
+        abandon_kot_key(client, "kot-1", order["id"])
+        response = client.post(f"/api/kot/{order['id']}", headers={"Idempotency-Key": "kot-1"})
+        assert response.status_code == 200, response.text
+        assert "Idempotent-Replayed" not in response.headers
+        retry = client.post(f"/api/kot/{order['id']}", headers={"Idempotency-Key": "kot-1"})
+        assert retry.headers["Idempotent-Replayed"] == "true"
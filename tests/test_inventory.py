@@ -0,0 +1,59 @@
+import pytest
+
+import server
+from inventory import StockBook
+from tests.helpers import order_json, wait_for
+
+
+@pytest.fixture
+def paneer(client):
+    return client.post("/api/inventory", json={"name": "Paneer", "unit": "kg", "quantity": 0.5}).json()
+
+
+@pytest.fixture
+def paneer_tikka(client, paneer):
+    item = client.post("/api/menu", json={"name": "Paneer Tikka", "price": 240, "category": "Starters"}).json()
+    response = client.put(f"/api/menu/{item['id']}/recipe", json=[{"ingredient_id": paneer["id"], "quantity": 0.2}])
+    assert response.status_code == 200, response.text
+    return item
+
+
+def available(client, item):
+    return {menu_item["id"]: menu_item["is_available"] for menu_item in client.get("/api/menu").json()}[item["id"]]
+
+
+def stock(client, ingredient):
+    return {row["id"]: row["quantity"] for row in client.get("/api/inventory").json()}[ingredient["id"]]
+
+
+def test_running_out_and_restocking(client, paneer, paneer_tikka):
+    assert available(client, paneer_tikka)
+    client.post("/api/orders", json=order_json(paneer_tikka, quantity=2))
+    wait_for(lambda: stock(client, paneer) == pytest.approx(0.1))
+    # Not enough left for another portion
+    assert not available(client, paneer_tikka)
+    client.post(f"/api/inventory/{paneer['id']}/restock", json={"quantity": 1})
+    assert available(client, paneer_tikka)
+
+
+def test_items_switched_off_by_hand_stay_off(client, paneer, paneer_tikka):
+    client.portal.call(lambda: server.storage.menu_items.update_one({"id": paneer_tikka["id"]},
+                                                                    set={"is_available": False}))
+    client.post(f"/api/inventory/{paneer['id']}/restock", json={"quantity": 1})
+    assert not available(client, paneer_tikka)
+
+
+def test_unknown_ingredients_are_rejected(client, paneer_tikka):
+    response = client.put(f"/api/menu/{paneer_tikka['id']}/recipe", json=[{"ingredient_id": "nope", "quantity": 1}])
+    assert response.status_code == 400
+
+
+def test_only_tracked_ingredients_are_needed():
+    book = StockBook()
+    book.load([{"id": "naan", "recipe": [{"ingredient_id": "flour", "quantity": 0.1},
+                                         {"ingredient_id": "salt", "quantity": 0.01}]}],
+              [{"id": "flour", "quantity": 0.15}])
+    assert book.needed([{"menu_item_id": "naan", "quantity": 3}]) == {"flour": pytest.approx(0.3)}
+    assert book.available == {"naan": True}
+    assert book.set_levels({"flour": 0.05}) == (["naan"], [])
+    assert book.set_levels({"flour": 2}) == ([], ["naan"])
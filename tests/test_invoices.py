@@ -0,0 +1,38 @@
+import zlib
+
+import pytest
+
+import server
+from tests.helpers import order_json
+
+
+def page_text(pdf):
+    start = pdf.index(b"stream\n") + len(b"stream\n")
+    return zlib.decompress(pdf[start:pdf.index(b"endstream", start)]).decode("latin-1")
+
+
+@pytest.fixture
+def served_order(client, menu_item):
+    order = client.post("/api/orders", json=order_json(menu_item, table_number="T1")).json()
+    client.put(f"/api/orders/{order['id']}", json={"status": "served"})
+    # 00:30 on the 11th in Asia/Kolkata, the restaurant's timezone
+    client.portal.call(lambda: server.storage.orders.update_one({"id": order["id"]},
+                                                                set={"created_at": "2026-03-10T19:00:00+00:00"}))
+    return order
+
+
+def test_dated_in_the_restaurant_timezone(client, served_order):
+    response = client.get(f"/api/orders/{served_order['id']}/invoice")
+    assert response.status_code == 200, response.text
+    number = f"INV-20260311-{served_order['id'][:8].upper()}"
+    assert f'filename="{number}.pdf"' in response.headers["content-disposition"]
+    text = page_text(response.content)
+    assert number in text
+    assert "Date: 11-03-2026 00:30" in text
+
+
+def test_moving_the_order_to_another_table(client, served_order):
+    assert "Table: T1" in page_text(client.get(f"/api/orders/{served_order['id']}/invoice").content)
+    client.post("/api/tables", json={"table_number": "T2", "capacity": 4})
+    client.post(f"/api/tables/T2/assign-order/{served_order['id']}")
+    assert "Table: T2" in page_text(client.get(f"/api/orders/{served_order['id']}/invoice").content)
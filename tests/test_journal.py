@@ -0,0 +1,80 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import journal
+import server
+from storage import StorageUnavailableError
+from tests.helpers import order_json, wait_for
+
+
+@pytest.fixture
+def outage(monkeypatch):
+    """Database writes fail and pings go unanswered while ``outage["down"]`` is set"""
+    state = {"down": False}
+    apply_ops = journal.apply_ops
+
+    async def failing_apply_ops(storage, ops):
+        if state["down"]:
+            raise StorageUnavailableError("database down")
+        await apply_ops(storage, ops)
+
+    monkeypatch.setattr(journal, "apply_ops", failing_apply_ops)
+    return state
+
+
+@pytest.fixture
+def journaled_client(app_settings, outage, monkeypatch):
+    app = server.create_app(app_settings(journal_enabled=True, journal_replay_interval_s=0.05))
+    with TestClient(app) as client:
+        async def ping():
+            return not outage["down"]
+        monkeypatch.setattr(server.storage, "ping", ping)
+        yield client
+
+
+def test_writes_are_replayed_after_an_outage(journaled_client, outage):
+    client = journaled_client
+    menu_item = client.post("/api/menu", json={"name": "Dal", "price": 150, "category": "Main"}).json()
+    outage["down"] = True
+    orders = [client.post("/api/orders", json=order_json(menu_item)) for _ in range(3)]
+    assert all(response.status_code == 200 for response in orders)
+    assert not server.journal.online
+    assert server.journal.pending_count == 3
+    # Readable from the journal before it reaches the database
+    kot = client.post(f"/api/kot/{orders[0].json()['id']}")
+    assert kot.status_code == 200, kot.text
+
+    outage["down"] = False
+    wait_for(lambda: server.journal.pending_count == 0)
+    assert server.journal.online
+    stored = {order["id"] for order in client.get("/api/orders").json()}
+    assert stored == {response.json()["id"] for response in orders}
+    assert [k["id"] for k in client.get("/api/kot").json()] == [kot.json()["id"]]
+
+
+def test_comes_back_online_with_nothing_pending(journaled_client, outage):
+    # A failed read marks the journal offline without journaling anything
+    outage["down"] = True
+    server.journal.mark_offline()
+    assert server.journal.pending_count == 0
+    outage["down"] = False
+    wait_for(lambda: server.journal.online)
+
+
+def test_failed_writes_are_not_replayed(journaled_client, monkeypatch):
+    client = journaled_client
+    menu_item = client.post("/api/menu", json={"name": "Dal", "price": 150, "category": "Main"}).json()
+
+    async def rejecting_apply_ops(storage, ops):
+        raise ValueError("rejected")
+
+    monkeypatch.setattr(journal, "apply_ops", rejecting_apply_ops)
+    with pytest.raises(ValueError):
+        client.post("/api/orders", json=order_json(menu_item))
+    assert server.journal.pending_count == 0
+    monkeypatch.setattr(journal, "apply_ops", server.apply_ops)
+    # A few replay intervals
+    time.sleep(0.3)
+    assert client.get("/api/orders").json() == []
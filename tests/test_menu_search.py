@@ -0,0 +1,51 @@
+import pytest
+
+
+@pytest.fixture
+def menu(client):
+    ids = {}
+    for name, category, description in [
+        ("Paneer Tikka", "Starters", "Grilled cottage cheese"),
+        ("Chicken Biryani", "Main Course", "Fragrant rice"),
+        ("Chicken Tikka", "Starters", "Smoky chicken"),
+        ("Crème Brûlée", "Desserts", "Vanilla custard"),
+        ("Masala Chai", "Beverages", "Spiced tea"),
+    ]:
+        ids[name] = client.post("/api/menu", json={"name": name, "price": 100, "category": category,
+                                                   "description": description}).json()["id"]
+    return ids
+
+
+def search(client, q, **headers):
+    response = client.get("/api/menu/search", params={"q": q}, headers=headers)
+    assert response.status_code == 200, response.text
+    return [item["name"] for item in response.json()]
+
+
+def test_prefix_and_typos(client, menu):
+    assert set(search(client, "tik")) == {"Paneer Tikka", "Chicken Tikka"}
+    assert set(search(client, "chiken")) == {"Chicken Biryani", "Chicken Tikka"}
+    assert search(client, "panner tika") == ["Paneer Tikka"]
+    assert search(client, "xyz") == []
+
+
+def test_accents_categories_and_descriptions(client, menu):
+    assert search(client, "creme") == ["Crème Brûlée"]
+    assert set(search(client, "start")) == {"Paneer Tikka", "Chicken Tikka"}
+    assert search(client, "tea") == ["Masala Chai"]
+
+
+def test_follows_menu_changes(client, menu):
+    client.put(f"/api/menu/{menu['Masala Chai']}", json={"name": "Ginger Chai", "price": 100, "category": "Beverages"})
+    assert search(client, "chai") == ["Ginger Chai"]
+    assert search(client, "masala") == []
+    client.delete(f"/api/menu/{menu['Masala Chai']}")
+    assert search(client, "chai") == []
+
+
+def test_scoped_to_the_restaurant(client, menu):
+    assert search(client, "tik", **{"X-Restaurant-Id": "other"}) == []
+
+
+def test_query_is_required(client):
+    assert client.get("/api/menu/search").status_code == 422
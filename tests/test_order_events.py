@@ -0,0 +1,56 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from order_events import OrderEvents
+from storage import MemoryStorage, SQLiteStorage
+
+
+def utc(text):
+    return datetime.fromisoformat(text).replace(tzinfo=timezone.utc)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def events(request, tmp_path):
+    storage = MemoryStorage() if request.param == "memory" else SQLiteStorage(str(tmp_path / "events.db"))
+    asyncio.run(storage.connect())
+    yield OrderEvents(storage)
+    asyncio.run(storage.close())
+
+
+def record(events, *events_at, status="pending"):
+    async def run():
+        for index, at in enumerate(events_at):
+            await events.record("default", OrderEvents.payload(f"order-{index}", status, "T1", at))
+    asyncio.run(run())
+
+
+def test_recording_twice_stores_one_event(events):
+    payload = OrderEvents.payload("order-1", "pending", "T1", "2026-03-28T12:00:00+00:00")
+    asyncio.run(events.record("default", payload))
+    asyncio.run(events.record("default", payload))
+    assert events.recorded == 1
+
+
+def test_heatmap_hours_follow_daylight_saving(events):
+    # London moves to summer time at 01:00 UTC on Sunday 29 March 2026
+    record(events, "2026-03-28T12:00:00+00:00", "2026-03-29T00:30:00+00:00", "2026-03-29T01:30:00+00:00",
+           "2026-03-30T12:00:00+00:00")
+    counts = asyncio.run(events.heatmap("default", utc("2026-03-23T00:00:00"), utc("2026-04-06T00:00:00"),
+                                        "Europe/London"))
+    cells = {(weekday, hour): count for weekday, row in enumerate(counts) for hour, count in enumerate(row) if count}
+    # Saturday noon, Sunday 00:30 and 02:30 (there is no 01:30 that night), then 13:00 on Monday
+    assert cells == {(5, 12): 1, (6, 0): 1, (6, 2): 1, (0, 13): 1}
+    assert asyncio.run(events.heatmap("default", utc("2026-03-23T00:00:00"), utc("2026-04-06T00:00:00"),
+                                      "Europe/London", status="ready")) == [[0] * 24 for _ in range(7)]
+
+
+def test_throughput_buckets(events):
+    record(events, "2026-03-29T00:29:00+00:00", "2026-03-29T00:30:00+00:00", "2026-03-29T00:50:00+00:00")
+    record(events, "2026-03-29T01:29:00+00:00", status="ready")
+    result = asyncio.run(events.throughput("default", hours=1, bucket_minutes=15, now=utc("2026-03-29T01:20:00")))
+    assert result["start"] == utc("2026-03-29T00:30:00") and result["end"] == utc("2026-03-29T01:30:00")
+    assert [bucket["counts"] for bucket in result["buckets"]] == [{"pending": 1}, {"pending": 1}, {}, {"ready": 1}]
+    # Over the 50 minutes since the window opened
+    assert result["per_hour"] == {"pending": 2.4, "ready": 1.2}
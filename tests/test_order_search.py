@@ -0,0 +1,76 @@
+import pytest
+
+from tests.helpers import order_json
+
+
+@pytest.fixture
+def orders(client, menu_item):
+    placed = []
+    for index, name in enumerate(["Smith", "smithers", "SMYTHE", "Jones", "smith", "Ann"] * 3):
+        response = client.post("/api/orders", json=order_json(menu_item, customer_name=name,
+                                                              table_number=str(index % 3 + 1)))
+        placed.append(response.json())
+    return placed
+
+
+def search(client, **params):
+    response = client.get("/api/orders/search", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_customer_prefix_ignores_case(client, orders):
+    found = search(client, q="smi")["orders"]
+    assert {order["customer_name"] for order in found} == {"Smith", "smithers", "smith"}
+    assert len(search(client, q="SMY")["orders"]) == 3
+    # Surrounding whitespace is not part of the name
+    assert len(search(client, q="  smi ")["orders"]) == 9
+
+
+def test_unusual_prefixes(client, orders):
+    assert search(client, q="\U0010ffff")["orders"] == []
+    assert len(search(client, q="   ")["orders"]) == len(orders)
+
+
+def test_filters(client, orders):
+    assert len(search(client, table_number="2")["orders"]) == 6
+    assert len(search(client, q="smith", table_number="1")["orders"]) == 3
+    client.put(f"/api/orders/{orders[0]['id']}", json={"payment_status": "paid"})
+    assert [o["id"] for o in search(client, payment_status="paid")["orders"]] == [orders[0]["id"]]
+    assert search(client, end="2000-01-01T00:00:00Z")["orders"] == []
+    assert len(search(client, start="2000-01-01T00:00:00Z")["orders"]) == len(orders)
+
+
+def test_pages_cover_every_order_once(client, orders):
+    seen, cursor = [], None
+    while True:
+        page = search(client, limit=4, **({"cursor": cursor} if cursor else {}))
+        seen += [order["id"] for order in page["orders"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(order["id"] for order in orders)
+    assert len(seen) == len(set(seen))
+
+
+def test_scoped_to_the_restaurant(client, orders):
+    assert client.get("/api/orders/search", params={"q": "smi"},
+                      headers={"X-Restaurant-Id": "Default"}).json()["orders"] == []
+
+
+def test_restaurants_differing_in_case_get_full_pages(client, menu_item):
+    for restaurant_id in ("Acme", "acme"):
+        for _ in range(3):
+            client.post("/api/orders", json=order_json(menu_item, customer_name="Smith"),
+                        headers={"X-Restaurant-Id": restaurant_id})
+    page = client.get("/api/orders/search", params={"q": "smith", "limit": 2},
+                      headers={"X-Restaurant-Id": "acme"}).json()
+    assert len(page["orders"]) == 2
+    assert {order["restaurant_id"] for order in page["orders"]} == {"acme"}
+    last = client.get("/api/orders/search", params={"q": "smith", "limit": 2, "cursor": page["next_cursor"]},
+                      headers={"X-Restaurant-Id": "acme"}).json()
+    assert len(last["orders"]) == 1 and last["next_cursor"] is None
+
+
+def test_invalid_cursor(client):
+    assert client.get("/api/orders/search", params={"cursor": "nonsense"}).status_code == 400
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from storage import QueryLimits, QueryTimeoutError, SQLiteStorage, query_limits
+
+
+@pytest.fixture
+def capped_client(app_settings):
+    with TestClient(server.create_app(app_settings(query_max_results=3))) as client:
+        yield client
+
+
+def test_large_results_are_truncated(capped_client):
+    client = capped_client
+    for index in range(5):
+        client.post("/api/menu", json={"name": f"Tea {index}", "price": 20, "category": "Drinks"})
+    response = client.get("/api/menu")
+    assert len(response.json()) == 3
+    assert response.headers["x-result-truncated"] == "3"
+    assert client.get("/api/metrics").json()["queries"]["get_menu"]["truncated"] == 1
+
+
+def test_results_under_the_cap_are_complete(capped_client):
+    client = capped_client
+    for number in ("1", "2"):
+        client.post("/api/tables", json={"table_number": number, "capacity": 4})
+    response = client.get("/api/tables")
+    assert len(response.json()) == 2
+    assert "x-result-truncated" not in response.headers
+
+
+def test_sqlite_reads_stop_at_the_time_limit(tmp_path):
+    def endless(conn):
+        return conn.execute("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) "
+                            "SELECT count(*) FROM c").fetchone()
+
+    async def read():
+        storage = SQLiteStorage(str(tmp_path / "slow.db"))
+        await storage.connect()
+        try:
+            with query_limits(QueryLimits("slow", max_time_ms=50)):
+                await storage.read(endless)
+        finally:
+            await storage.close()
+
+    with pytest.raises(QueryTimeoutError):
+        asyncio.run(read())
@@ -0,0 +1,73 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+import server
+from tests.helpers import order_json
+
+CLOSED_DAY = date(2026, 3, 10)
+
+
+def place(client, menu_item, created_at, **fields):
+    order = client.post("/api/orders", json=order_json(menu_item)).json()
+    if fields:
+        assert client.put(f"/api/orders/{order['id']}", json=fields).status_code == 200
+    # Orders are stored with UTC timestamps
+    created_at = created_at.astimezone(timezone.utc).isoformat()
+    client.portal.call(lambda: server.storage.orders.update_one({"id": order["id"]}, set={"created_at": created_at}))
+    return order
+
+
+def at(hour, minute=0, day=CLOSED_DAY):
+    return datetime(day.year, day.month, day.day, hour, minute, tzinfo=server.local_timezone)
+
+
+@pytest.fixture
+def trading_day(client, menu_item):
+    place(client, menu_item, at(0, 10), payment_status="paid", payment_method="cash")
+    place(client, menu_item, at(20), payment_status="paid", payment_method="online")
+    place(client, menu_item, at(21), status="cancelled")
+    place(client, menu_item, at(23, 50))
+    # Just past midnight belongs to the next day
+    place(client, menu_item, at(0, day=CLOSED_DAY + timedelta(days=1)), payment_status="paid")
+
+
+def close(client, **body):
+    return client.post("/api/reports/close-day", json=body)
+
+
+def test_closing_a_past_day(client, trading_day):
+    response = close(client, date=CLOSED_DAY.isoformat())
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert report["orders"] == 4
+    assert report["paid"] == {"count": 2, "amount": 640.0}
+    assert report["pending_payments"] == {"count": 1, "amount": 320.0}
+    assert report["cancellations"] == {"count": 1, "amount": 320.0}
+    assert client.get(f"/api/reports/days/{CLOSED_DAY}").json()["id"] == report["id"]
+
+
+def test_a_closed_day_does_not_change(client, menu_item, trading_day):
+    report = close(client, date=CLOSED_DAY.isoformat()).json()
+    place(client, menu_item, at(12))
+    again = close(client, date=CLOSED_DAY.isoformat()).json()
+    assert again["id"] == report["id"]
+    assert again["orders"] == 4
+
+
+def test_today_needs_force(client):
+    today = datetime.now(server.local_timezone).date()
+    assert client.post("/api/reports/close-day").status_code == 400
+    assert close(client, date=today.isoformat()).status_code == 400
+    response = close(client, force=True)
+    assert response.status_code == 200, response.text
+    assert response.json()["date"] == today.isoformat()
+
+
+def test_future_days_cannot_be_closed(client):
+    assert close(client, date="2099-01-01", force=True).status_code == 400
+
+
+def test_days_not_closed(client):
+    assert client.get(f"/api/reports/days/{CLOSED_DAY}").status_code == 404
+    assert client.get("/api/reports/days").json() == []
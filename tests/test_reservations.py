@@ -0,0 +1,64 @@
+import pytest
+
+AT_SEVEN = "2030-01-01T19:00:00Z"
+
+
+@pytest.fixture
+def floor(client):
+    # T1, T2 and T4 seat 4, T3 seats 6, T5 and T6 seat 2
+    assert client.post("/api/tables/initialize-default").status_code == 200
+
+
+def reserve(client, party_size, start_at, **fields):
+    return client.post("/api/reservations", json={"customer_name": "Guest", "party_size": party_size,
+                                                  "start_at": start_at, **fields})
+
+
+def best_fit(client, party_size, start_at):
+    response = client.get("/api/reservations/best-fit", params={"party_size": party_size, "start_at": start_at})
+    return [table["table_number"] for table in response.json()]
+
+
+def test_best_fit_prefers_the_smallest_table(client, floor):
+    assert best_fit(client, 2, AT_SEVEN)[:2] == ["T5", "T6"]
+    assert best_fit(client, 5, AT_SEVEN) == ["T3"]
+    assert best_fit(client, 7, AT_SEVEN) == []
+
+
+def test_booked_slots_are_not_given_twice(client, floor):
+    first = reserve(client, 2, AT_SEVEN).json()
+    assert first["table_number"] == "T5"
+    assert first["end_at"] == "2030-01-01T20:30:00Z"
+    # Overlaps the first booking, so the next best table
+    assert reserve(client, 2, "2030-01-01T19:30:00Z").json()["table_number"] == "T6"
+    assert reserve(client, 2, AT_SEVEN, table_number="T5").status_code == 409
+    # Free again once the first sitting ends
+    assert reserve(client, 2, "2030-01-01T20:30:00Z", table_number="T5").status_code == 200
+
+
+def test_no_table_left(client, floor):
+    assert reserve(client, 6, AT_SEVEN).json()["table_number"] == "T3"
+    assert reserve(client, 6, "2030-01-01T20:00:00Z").status_code == 409
+
+
+def test_cancelling_frees_the_slot(client, floor):
+    reservation = reserve(client, 2, AT_SEVEN, table_number="T5").json()
+    cancelled = client.put(f"/api/reservations/{reservation['id']}", json={"status": "cancelled"})
+    assert cancelled.json()["status"] == "cancelled"
+    assert reserve(client, 2, AT_SEVEN, table_number="T5").status_code == 200
+    # Its table has been given away since
+    assert client.put(f"/api/reservations/{reservation['id']}", json={"status": "booked"}).status_code == 409
+
+
+def test_rejected_requests(client, floor):
+    assert reserve(client, 2, AT_SEVEN, end_at="2030-01-01T18:00:00Z").status_code == 422
+    assert reserve(client, 8, AT_SEVEN, table_number="T5").status_code == 400
+    assert reserve(client, 2, AT_SEVEN, table_number="T99").status_code == 404
+    assert client.put("/api/reservations/missing", json={"status": "cancelled"}).status_code == 404
+
+
+def test_listing(client, floor):
+    reserve(client, 2, AT_SEVEN)
+    reserve(client, 4, AT_SEVEN)
+    assert len(client.get("/api/reservations").json()) == 2
+    assert [r["table_number"] for r in client.get("/api/reservations", params={"table_number": "T5"}).json()] == ["T5"]
@@ -0,0 +1,31 @@
+import asyncio
+
+from printing.printers import TcpPrinter
+from printing.spooler import Spooler
+
+
+async def print_to_printer_keeping_the_socket_open():
+    received = []
+
+    async def printer(reader, writer):
+        # Reads the whole job but never closes its end
+        received.append(await reader.read())
+        await asyncio.sleep(10)
+
+    server = await asyncio.start_server(printer, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    spooler = Spooler([TcpPrinter("kitchen", "127.0.0.1", port, timeout=0.2)], retries=2, timeout=0.2, backoff=0)
+    spooler.start()
+    try:
+        job_id = await asyncio.wait_for(spooler.submit("kitchen", b"KOT-1\n"), 5)
+        return job_id, received, spooler.stats()["kitchen"]
+    finally:
+        await spooler.close()
+        server.close()
+
+
+def test_printer_keeping_the_socket_open_prints_once():
+    job_id, received, stats = asyncio.run(print_to_printer_keeping_the_socket_open())
+    assert job_id == 1
+    assert received == [b"KOT-1\n"]
+    assert stats["printed"] == 1 and stats["retried"] == 0
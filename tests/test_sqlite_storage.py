@@ -0,0 +1,21 @@
+import asyncio
+
+import pytest
+
+from storage import SQLiteStorage
+
+
+def test_a_failed_insert_leaves_no_transaction_open(tmp_path):
+    async def run():
+        storage = SQLiteStorage(str(tmp_path / "storage.db"))
+        await storage.connect()
+        try:
+            with pytest.raises(TypeError):
+                await storage.orders.insert_one({"id": "1", "note": object()})
+            await storage.orders.insert_one({"id": "2"})
+            await storage.orders.update_one({"id": "2"}, set={"status": "ready"})
+            return await storage.orders.find()
+        finally:
+            await storage.close()
+
+    assert asyncio.run(run()) == [{"id": "2", "status": "ready"}]
@@ -0,0 +1,70 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from stations import StationMap, advances, derive_status
+
+ROUTES = {"Tandoor": "tandoor", " beverages ": "bar"}
+
+
+def test_items_are_split_by_category():
+    stations = StationMap(ROUTES)
+    items = [{"menu_item_id": "naan"}, {"menu_item_id": "lassi"}, {"menu_item_id": "dal"},
+             {"menu_item_id": "roti"}]
+    categories = {"naan": "tandoor", "lassi": "Beverages", "dal": "Main", "roti": "Tandoor"}
+    groups = stations.split(items, categories)
+    assert {station: [item["menu_item_id"] for item in group] for station, group in groups.items()} == {
+        "tandoor": ["naan", "roti"], "bar": ["lassi"], "kitchen": ["dal"],
+    }
+    assert stations.stations == ["bar", "kitchen", "tandoor"]
+
+
+@pytest.mark.parametrize("tickets, status", [
+    (["pending", "pending"], "pending"),
+    (["pending", "cooking"], "cooking"),
+    (["ready", "cooking"], "cooking"),
+    (["ready", "served"], "ready"),
+    (["served", "cancelled"], "served"),
+    (["cancelled", "cancelled"], None),
+])
+def test_order_status_follows_its_tickets(tickets, status):
+    assert derive_status(tickets) == status
+
+
+def test_orders_only_move_forward():
+    assert advances("pending", "cooking")
+    assert not advances("ready", "cooking")
+    assert not advances("cancelled", "served")
+    assert not advances("cooking", None)
+
+
+@pytest.fixture
+def kitchen(app_settings):
+    with TestClient(server.create_app(app_settings(kitchen_stations=ROUTES))) as client:
+        items = [client.post("/api/menu", json={"name": name, "price": 100, "category": category}).json()
+                 for name, category in (("Naan", "Tandoor"), ("Lassi", "Beverages"), ("Dal", "Main"))]
+        order = client.post("/api/orders", json={"items": [
+            {"menu_item_id": item["id"], "menu_item_name": item["name"], "quantity": 1, "price": 100}
+            for item in items
+        ]}).json()
+        assert client.post(f"/api/kot/{order['id']}").status_code == 200
+        yield client, order
+
+
+def test_kot_tickets_move_the_order_along(kitchen):
+    client, order = kitchen
+    tickets = {ticket["station"]: ticket for ticket in client.get(f"/api/kot/{order['id']}/tickets").json()}
+    assert {station: [item["menu_item_name"] for item in ticket["items"]] for station, ticket in tickets.items()} == {
+        "bar": ["Lassi"], "kitchen": ["Dal"], "tandoor": ["Naan"],
+    }
+    assert [queue["pending"] for queue in client.get("/api/stations").json()] == [1, 1, 1]
+
+    def set_ticket(station, status):
+        client.put(f"/api/stations/tickets/{tickets[station]['id']}", json={"status": status})
+        return client.get(f"/api/orders/{order['id']}").json()["status"]
+
+    assert set_ticket("tandoor", "cooking") == "cooking"
+    assert set_ticket("tandoor", "ready") == "cooking"
+    assert set_ticket("bar", "ready") == "cooking"
+    assert set_ticket("kitchen", "ready") == "ready"
+    assert client.get("/api/stations/tandoor/tickets").json() == []
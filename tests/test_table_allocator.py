@@ -0,0 +1,76 @@
+import pytest
+
+import server
+from table_allocator import FloorLayout
+from tests.helpers import order_json
+
+# T1 T2 T3 T4   seating 4, 4, 6 and 4
+# T5 T6         seating 2 and 2
+FLOOR = [
+    {"id": "t1", "table_number": "T1", "capacity": 4, "position_x": 0, "position_y": 0},
+    {"id": "t2", "table_number": "T2", "capacity": 4, "position_x": 1, "position_y": 0},
+    {"id": "t3", "table_number": "T3", "capacity": 6, "position_x": 2, "position_y": 0},
+    {"id": "t4", "table_number": "T4", "capacity": 4, "position_x": 3, "position_y": 0},
+    {"id": "t5", "table_number": "T5", "capacity": 2, "position_x": 0, "position_y": 1},
+    {"id": "t6", "table_number": "T6", "capacity": 2, "position_x": 1, "position_y": 1},
+]
+
+
+def allocate(party_size, floor=FLOOR, max_join=3):
+    tables = FloorLayout(floor).allocate(party_size, lambda table: True, max_join)
+    return [table["table_number"] for table in tables] if tables is not None else None
+
+
+def test_smallest_table_that_fits():
+    assert allocate(2) == ["T5"]
+    assert allocate(3) == ["T1"]
+    assert allocate(5) == ["T3"]
+
+
+def test_joins_neighbouring_tables():
+    assert allocate(8) == ["T1", "T2"]
+    assert allocate(10) == ["T2", "T3"]
+    # T6 sits under T2, so it completes a group of three
+    assert allocate(12) == ["T2", "T3", "T6"]
+    assert allocate(15) is None
+    assert allocate(8, max_join=1) is None
+
+
+def test_skips_taken_and_booked_tables():
+    floor = [dict(table, status="occupied") if table["id"] == "t2" else table for table in FLOOR]
+    assert allocate(8, floor) == ["T3", "T4"]
+    layout = FloorLayout(FLOOR)
+    tables = layout.allocate(2, lambda table: table["table_number"] != "T5")
+    assert [table["table_number"] for table in tables] == ["T6"]
+
+
+@pytest.fixture
+def floor(client):
+    assert client.post("/api/tables/initialize-default").status_code == 200
+
+
+def tables_by_number(client):
+    return {table["table_number"]: table for table in client.get("/api/tables").json()}
+
+
+def test_walk_in_is_seated_at_joined_tables(client, floor, menu_item):
+    order = client.post("/api/orders", json=order_json(menu_item, party_size=8)).json()
+    assert order["table_number"] == "T1"
+    tables = tables_by_number(client)
+    assert [tables[number]["current_order_id"] for number in ("T1", "T2")] == [order["id"]] * 2
+    assert tables["T3"]["status"] == "available"
+
+
+def test_tables_are_released_when_the_order_is_not_stored(client, floor, menu_item, monkeypatch):
+    async def failing_apply_ops(storage, ops):
+        raise RuntimeError("write failed")
+
+    monkeypatch.setattr(server, "apply_ops", failing_apply_ops)
+    with pytest.raises(RuntimeError):
+        client.post("/api/orders", json=order_json(menu_item, party_size=8))
+    monkeypatch.undo()
+    tables = tables_by_number(client)
+    assert {tables[number]["status"] for number in ("T1", "T2")} == {"available"}
+    assert tables["T1"]["current_order_id"] is None
+    # And the next party can have them
+    assert client.post("/api/orders", json=order_json(menu_item, party_size=8)).json()["table_number"] == "T1"
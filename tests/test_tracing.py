@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from tracing import Tracer, TracingMiddleware, span, timed
+
+
+@timed("factorial")
+def factorial(n):
+    return 1 if n <= 1 else n * factorial(n - 1)
+
+
+async def app(scope, receive, send):
+    with span("outer", table="T1"):
+        with span("inner"):
+            factorial(5)
+        factorial(3)
+    await send({"type": "http.response.start", "status": 204, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def call(tracer, path="/api/menu", headers=()):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "headers": list(headers)}
+    asyncio.run(TracingMiddleware(app, tracer)(scope, receive, send))
+    return dict(sent[0]["headers"])
+
+
+def test_spans_nest_and_timers_sum():
+    tracer = Tracer(sample_rate=1.0)
+    trace_id = call(tracer)[b"x-trace-id"].decode()
+    trace = tracer.get(trace_id)
+    spans = [(s["id"], s["parent"], s["name"]) for s in trace["spans"]]
+    assert spans == [(0, None, "http"), (1, 0, "outer"), (2, 1, "inner")]
+    assert trace["spans"][1]["attrs"] == {"table": "T1"}
+    assert trace["status"] == 204
+    # Recursive calls count once
+    assert trace["timers"]["factorial"]["calls"] == 2
+
+
+def test_sampling():
+    never = Tracer(sample_rate=0.0)
+    assert b"x-trace-id" not in call(never)
+    assert b"x-trace-id" in call(never, headers=[(b"x-trace", b"1")])
+    always = Tracer(sample_rate=1.0)
+    assert b"x-trace-id" not in call(always, headers=[(b"x-trace", b"0")])
+    assert b"x-trace-id" not in call(always, path="/api/admin/traces")
+    assert b"x-trace-id" not in call(always, path="/health")
+    assert always.stats()["traced"] == 0 and never.stats()["traced"] == 1
+
+
+def test_nothing_is_recorded_outside_a_trace():
+    with span("loose") as loose:
+        assert loose is None
+    assert factorial(4) == 24
+
+
+def test_request_phases(client, menu_item):
+    response = client.get("/api/menu", headers={"X-Trace": "1"})
+    trace = client.get(f"/api/admin/traces/{response.headers['x-trace-id']}").json()
+    parents = {s["name"]: s["parent"] for s in trace["spans"]}
+    by_id = {s["id"]: s["name"] for s in trace["spans"]}
+    assert by_id[parents["endpoint"]] == "http"
+    assert {"validate_request", "validate_response", "json_encode"} <= set(parents)
+    assert trace["endpoint"] == "get_menu"
+    assert [t["id"] for t in client.get("/api/admin/traces").json()["traces"]] == [trace["id"]]
+    assert client.get("/api/admin/traces/missing").status_code == 404
+
+
+# The file does not depend on the backend
+@pytest.mark.parametrize("backend", ["memory"])
+def test_trace_file(app_settings, tmp_path):
+    path = tmp_path / "traces.jsonl"
+    with TestClient(server.create_app(app_settings(trace_sample_rate=1.0, trace_file=str(path)))) as client:
+        client.get("/api/menu")
+        client.get("/api/tables")
+    assert len(path.read_text().splitlines()) == 2